@@ -11,9 +11,12 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import importlib.util
 import os
+import tempfile
 from dotenv import load_dotenv
 from datetime import timedelta
+from django.core.exceptions import ImproperlyConfigured
 
 # Cargamos las variables de entorno desde el archivo .env
 load_dotenv()
@@ -34,8 +37,22 @@ ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS').split(',') if os.getenv('ALLOWED_HOST
 CORS_ALLOWED_ORIGINS = os.getenv('CORS_ALLOWED_ORIGINS').split(',') if os.getenv('ALLOWED_HOSTS') else []
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        # JWT con el usuario en caché para no consultarlo en cada petición
+        'users.authentication.CachedJWTAuthentication',
+    ),
+    # JSON con orjson si está instalado; si no, el de DRF (ver users.renderers)
+    'DEFAULT_RENDERER_CLASSES': (
+        'users.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'users.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    # Proxies de confianza delante de la aplicación. Con 0 la IP del cliente es
+    # REMOTE_ADDR y X-Forwarded-For se ignora (lo puede escribir cualquiera)
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 0)),
 }
 
 # Configuracion del JWT
@@ -43,6 +60,8 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=15),  # Duración del token de acceso
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),  # Duración del token de actualización   
 }
+# Segundos que el usuario de un JWT se conserva en caché (cota para cambios sin señales)
+USERS_AUTH_CACHE_TTL = int(os.getenv('USERS_AUTH_CACHE_TTL', 30))
 # Application definition
 
 INSTALLED_APPS = [
@@ -52,14 +71,24 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'drf_yasg',
     'rest_framework',
     'corsheaders',
     'rest_framework_simplejwt',
     'users',  # Aplicación de usuarios
 ]
 
+# Documentación de la API (/swagger/, /redoc/). Desactivarla evita importar drf_yasg en cada worker.
+API_DOCS_ENABLED = os.getenv('API_DOCS_ENABLED', 'True') == 'True'
+if API_DOCS_ENABLED:
+    INSTALLED_APPS.append('drf_yasg')
+
 MIDDLEWARE = [
+    # Primero para medir la petición completa (latencia, SQL, serialización)
+    'users.middleware.InstrumentacionMiddleware',
+    # Lecturas del listado y la exportación en la réplica (si hay una configurada)
+    'users.middleware.ReplicaMiddleware',
+    # Antes del resto para comprimir la respuesta final (Content-Length incluido)
+    'users.middleware.CompresionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     "corsheaders.middleware.CorsMiddleware",
@@ -101,9 +130,44 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
         'PORT': os.getenv('DB_PORT'),
+        # Conexiones persistentes: segundos que se reutiliza una conexión (0 = una por petición)
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 0)),
+        # Verifica la conexión reutilizada antes de usarla (necesario si la BD cierra conexiones inactivas)
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS') == 'True',
     }
 }
 
+# Pool de conexiones nativo de Django (solo PostgreSQL con psycopg 3; exige DB_CONN_MAX_AGE=0)
+if os.getenv('DB_POOL') == 'True':
+    # Con psycopg2 (requirements.txt) Django ignoraría el pool y fallaría al conectar
+    if not (importlib.util.find_spec('psycopg') and importlib.util.find_spec('psycopg_pool')):
+        raise ImproperlyConfigured(
+            "DB_POOL=True requiere psycopg 3 con su pool: pip install 'psycopg[binary,pool]'"
+        )
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+        },
+    }
+
+# Réplica de solo lectura opcional para el listado y la exportación (ver users.routers)
+if os.getenv('DB_REPLICA_HOST') or os.getenv('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': os.getenv('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.getenv('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.getenv('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        # En las pruebas la réplica usa la misma base de datos de pruebas que el primario
+        'TEST': {'MIRROR': 'default'},
+    }
+USERS_READ_REPLICA = 'replica' if 'replica' in DATABASES else None
+DATABASE_ROUTERS = ['users.routers.ReplicaRouter']
+# Retraso máximo esperado de la réplica: tiempo que un cliente lee del primario tras escribir
+DB_REPLICA_MAX_LAG = int(os.getenv('DB_REPLICA_MAX_LAG', 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -124,6 +188,17 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Caché
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Con varios procesos se recomienda un backend compartido (Redis o Memcached)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -149,5 +224,61 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Cambiamos el modelo de login
 AUTH_USER_MODEL = 'users.User'
 
+# Paginación del listado de usuarios
+USERS_PAGE_SIZE = int(os.getenv('USERS_PAGE_SIZE', 50))  # Tamaño de página por defecto
+USERS_MAX_PAGE_SIZE = int(os.getenv('USERS_MAX_PAGE_SIZE', 500))  # Máximo permitido en page_size
+USERS_UNPAGINATED_LIMIT = int(os.getenv('USERS_UNPAGINATED_LIMIT', 1000))  # Tope para clientes sin cursor
+
+USERS_LIST_CACHE_TIMEOUT = int(os.getenv('USERS_LIST_CACHE_TIMEOUT', 300))  # Segundos en caché del listado
+
+# Operaciones masivas de usuarios
+USERS_BULK_MAX_ROWS = int(os.getenv('USERS_BULK_MAX_ROWS', 5000))  # Filas máximas por petición
+USERS_BULK_BATCH_SIZE = int(os.getenv('USERS_BULK_BATCH_SIZE', 500))  # Filas por INSERT
+USERS_HASH_WORKERS = int(os.getenv('USERS_HASH_WORKERS', 0))  # Procesos para hashear (0 = núcleos disponibles)
+USERS_HASH_POOL_MIN = int(os.getenv('USERS_HASH_POOL_MIN', 8))  # Contraseñas mínimas para usar el pool
+
+# Límites del login (/api/token/): token buckets por IP y por email (capacidad 0 = sin bucket),
+# hasheos simultáneos por proceso (0 = núcleos disponibles) y segundos de espera por un lugar
+USERS_LOGIN_IP_BURST = int(os.getenv('USERS_LOGIN_IP_BURST', 20))
+USERS_LOGIN_IP_PER_MINUTE = float(os.getenv('USERS_LOGIN_IP_PER_MINUTE', 30))
+USERS_LOGIN_EMAIL_BURST = int(os.getenv('USERS_LOGIN_EMAIL_BURST', 5))
+USERS_LOGIN_EMAIL_PER_MINUTE = float(os.getenv('USERS_LOGIN_EMAIL_PER_MINUTE', 5))
+USERS_LOGIN_MAX_HASHES = int(os.getenv('USERS_LOGIN_MAX_HASHES', 0))
+USERS_LOGIN_HASH_WAIT = float(os.getenv('USERS_LOGIN_HASH_WAIT', 0.25))
+
+# Importación CSV de usuarios: carpeta y vigencia (segundos) de los reportes de errores
+USERS_IMPORT_DIR = os.getenv('USERS_IMPORT_DIR', os.path.join(tempfile.gettempdir(), 'users_import'))
+USERS_IMPORT_REPORT_TTL = int(os.getenv('USERS_IMPORT_REPORT_TTL', 3600))
+
+# Exportaciones en segundo plano: carpeta de archivos, hilos por proceso y vigencia (segundos)
+USERS_EXPORT_DIR = os.getenv('USERS_EXPORT_DIR', os.path.join(tempfile.gettempdir(), 'users_export'))
+USERS_EXPORT_WORKERS = int(os.getenv('USERS_EXPORT_WORKERS', 2))
+USERS_EXPORT_TTL = int(os.getenv('USERS_EXPORT_TTL', 86400))
+USERS_EXPORT_SYNC = os.getenv('USERS_EXPORT_SYNC') == 'True'  # Ejecutar dentro de la petición (pruebas)
+
+# Sincronización incremental (since=): segundos de margen para transacciones sin confirmar
+USERS_SYNC_LAG = int(os.getenv('USERS_SYNC_LAG', 5))
+
+# Directorio de usuarios en memoria para el listado (ver users.directorio) y segundos máximos
+# entre refrescos aunque la versión del listado no cambie (escrituras de otros procesos)
+USERS_DIRECTORY = os.getenv('USERS_DIRECTORY') == 'True'
+USERS_DIRECTORY_MAX_AGE = float(os.getenv('USERS_DIRECTORY_MAX_AGE', 5))
+
+# Usar las vistas asíncronas de usuarios (despliegue con backend.asgi)
+USERS_ASYNC_VIEWS = os.getenv('USERS_ASYNC_VIEWS') == 'True'
+
+# Métricas de Prometheus en /metrics (si se define, se exige 'Authorization: Bearer <token>')
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
 # Configuración de Swagger
 SWAGGER_USE_COMPAT_RENDERERS = False
+
+# Esquema OpenAPI precalculado: se sirve desde memoria en lugar de generarse en cada petición.
+# Se lee de API_SCHEMA_FILE (comando generar_esquema) o se genera una vez por proceso si no existe.
+API_SCHEMA_PRECOMPUTED = os.getenv('API_SCHEMA_PRECOMPUTED', 'True') == 'True'
+API_SCHEMA_FILE = os.getenv('API_SCHEMA_FILE', str(BASE_DIR / 'openapi.json'))
+
+# Compresión de respuestas de texto según Accept-Encoding (ver users.compresion) y tamaño
+# mínimo en bytes: por debajo los headers pesan más que lo que se ahorra
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'True') == 'True'
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
@@ -14,32 +14,27 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenRefreshView
 from users.views import CustomTokenObtainPairView
-# Documentación Swagger
-from drf_yasg import openapi
-from drf_yasg.views import get_schema_view
-from rest_framework import permissions
+from users.metrics import metricas
+# Documentación Swagger (drf_yasg se importa en la primera petición a estas rutas)
+from users.documentacion import vista_documentacion
 
-schema_view = get_schema_view(
-   openapi.Info(
-      title="API Documentation",
-      default_version='v1',
-      description="API description",
-   ),
-   public=True,
-   permission_classes=(permissions.AllowAny,),
-)
- 
 
 urlpatterns = [
     #path('admin/', admin.site.urls),
     path('api/token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/v1/', include('users.urls')),  # Incluimos las URLs de la aplicación de usuarios
-    
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('metrics', metricas, name='metrics'),  # Métricas en formato Prometheus
 ]
+
+if settings.API_DOCS_ENABLED:
+    urlpatterns += [
+        path('swagger.json', vista_documentacion('json'), name='schema-json'),  # Esquema precalculado
+        path('swagger/', vista_documentacion('swagger'), name='schema-swagger-ui'),
+        path('redoc/', vista_documentacion('redoc'), name='schema-redoc'),
+    ]
@@ -0,0 +1,230 @@
+"""
+Vistas asíncronas de usuarios para el despliegue ASGI.
+
+Ofrecen los mismos endpoints y respuestas que ``UserListView`` y ``UserDetailView``
+pero usan el ORM asíncrono de Django, de modo que bajo ASGI las peticiones no se
+envían a un hilo con ``sync_to_async``. El hasheo de contraseñas se ejecuta en un
+hilo aparte para no bloquear el event loop.
+
+Comparten con las vistas de DRF la resolución del usuario del JWT
+(``users.authentication``), los parsers del cuerpo y la caché con ``ETag`` del
+listado (``users.cache``).
+
+Se activan en las rutas principales con ``USERS_ASYNC_VIEWS=True``.
+"""
+from http import HTTPStatus
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.http import HttpResponse, JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings as drf_settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .authentication import ausuario_del_token
+from .cache import CacheListadoUsuarios, obtener_version
+from .models import User
+from .filters import filtrar_usuarios, leer_filtros, aplicar_filtros, campos_solicitados, FiltroInvalido
+from .directorio import directorio
+from .pagination import UserCursorPagination, CursorInvalido
+from .serializers import UserSerializer, FastUserListSerializer
+from .sincronizacion import SincronizacionUsuarios
+from .routers import lecturas_en_replica
+
+
+async def _autenticar(request):
+    """
+    Autentica la petición con el JWT del header ``Authorization``.
+
+    La validación del token no usa la base de datos; el usuario se resuelve con
+    ``ausuario_del_token``, con las mismas comprobaciones y la misma caché que
+    ``CachedJWTAuthentication``.
+    :return: Tupla (usuario, None) o (None, JsonResponse 401).
+    """
+    autenticacion = JWTAuthentication()
+    try:
+        header = autenticacion.get_header(request)
+        raw_token = autenticacion.get_raw_token(header) if header else None
+        if raw_token is None:
+            return None, JsonResponse(
+                {"detail": "Las credenciales de autenticación no se proveyeron."},
+                status=HTTPStatus.UNAUTHORIZED
+            )
+        user = await ausuario_del_token(autenticacion.get_validated_token(raw_token))
+    except APIException as e:
+        return None, JsonResponse({"detail": e.detail}, status=HTTPStatus.UNAUTHORIZED)
+    return user, None
+
+
+def _leer_datos(request):
+    """
+    Lee el cuerpo de la petición con los parsers de DRF (JSON, formulario o
+    multipart), igual que las vistas síncronas.
+    :return: Tupla (datos, None) o (None, JsonResponse 400/415).
+    """
+    try:
+        return Request(request, parsers=[parser() for parser in drf_settings.DEFAULT_PARSER_CLASSES]).data, None
+    except APIException as e:
+        return None, JsonResponse({"detail": e.detail}, status=e.status_code)
+
+
+async def _hashear(password):
+    # PBKDF2 es costoso en CPU: se ejecuta fuera del event loop
+    return await sync_to_async(make_password, thread_sensitive=False)(password)
+
+
+class AsyncAPIView(View):
+    """
+    Vista base asíncrona que exige un JWT válido, igual que ``IsAuthenticated``.
+    """
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # La API se autentica con JWT, no con sesión, igual que las vistas de DRF
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        user, error = await _autenticar(request)
+        if error:
+            return error
+        request.user = user
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class AsyncUserListView(AsyncAPIView):
+    """
+    Versión asíncrona de ``UserListView`` (listado y creación de usuarios).
+    """
+    lecturas_en_replica = True  # GET se lee de la réplica si hay una (ver ReplicaMiddleware)
+
+    async def get(self, request):
+        """
+        Obtiene la lista de usuarios filtrada y paginada por cursor, o los cambios
+        posteriores a ``since``. Comparte la caché y el ``ETag`` de ``UserListView``.
+        """
+        if request.GET.get('since'):
+            return await self._sincronizar(request)
+
+        # obtener_version puede escribir en la caché: se lee fuera del event loop
+        cache_listado = CacheListadoUsuarios(request, version=await sync_to_async(obtener_version)())
+        if cache_listado.no_modificado():
+            return HttpResponse(status=HTTPStatus.NOT_MODIFIED, headers=cache_listado.headers())
+
+        data = await cache_listado.aobtener()
+        if data is None:
+            try:
+                paginacion = UserCursorPagination(request.GET)
+                filtros = leer_filtros(request.GET)
+                campos = campos_solicitados(request.GET, FastUserListSerializer.campos)
+            except (CursorInvalido, FiltroInvalido) as e:
+                return JsonResponse({"mensaje": str(e)}, status=HTTPStatus.BAD_REQUEST)
+
+            serializer = FastUserListSerializer(campos, adicionales=paginacion.orden)
+            if settings.USERS_DIRECTORY:
+                # El refresco del directorio consulta la base de datos de forma síncrona
+                filas = await sync_to_async(directorio.filas)(filtros, paginacion, serializer.columnas)
+            else:
+                queryset = paginacion.get_queryset(serializer.get_queryset(aplicar_filtros(User.objects.all(), filtros)))
+                filas = [fila async for fila in queryset]
+            users, siguiente, anterior = paginacion.get_page(filas)
+            data = paginacion.get_response_data(serializer.serializar(users), siguiente, anterior)
+            await cache_listado.aguardar(data)
+
+        return JsonResponse(data, status=HTTPStatus.OK, headers=cache_listado.headers())
+
+    async def _sincronizar(self, request):
+        try:
+            sincronizacion = SincronizacionUsuarios(request.GET)
+            users = filtrar_usuarios(User.objects.all(), request.GET)
+            campos = campos_solicitados(request.GET, FastUserListSerializer.campos)
+        except (CursorInvalido, FiltroInvalido) as e:
+            return JsonResponse({"mensaje": str(e)}, status=HTTPStatus.BAD_REQUEST)
+
+        serializer = FastUserListSerializer(campos, adicionales=sincronizacion.orden)
+        # Se lee del primario, como en UserListView._sincronizar
+        with lecturas_en_replica(False):
+            queryset = sincronizacion.get_queryset(serializer.get_queryset(users))
+            filas, eliminados, cursor, hay_mas = sincronizacion.get_page(
+                [fila async for fila in queryset],
+                [eliminado async for eliminado in sincronizacion.get_eliminados()],
+            )
+        return JsonResponse(
+            sincronizacion.get_response_data(serializer.serializar(filas), eliminados, cursor, hay_mas),
+            status=HTTPStatus.OK
+        )
+
+    async def post(self, request):
+        """
+        Crea un nuevo usuario.
+        """
+        datos, error = _leer_datos(request)
+        if error:
+            return error
+
+        serializer = UserSerializer(data=datos)
+        # La validación consulta la base de datos (email único)
+        if not await sync_to_async(serializer.is_valid)():
+            return JsonResponse({
+                "mensaje": "Error al crear el usuario",
+                "error": serializer.errors
+            }, status=HTTPStatus.BAD_REQUEST)
+
+        validated_data = dict(serializer.validated_data)
+        password = await _hashear(validated_data.pop('password'))
+        email = User.objects.normalize_email(validated_data.pop('email'))
+        user = await User.objects.acreate(email=email, password=password, **validated_data)
+        return JsonResponse({
+            "mensaje": "El usuario se creó correctamente",
+            "data": UserSerializer(user).data
+        }, status=HTTPStatus.CREATED)
+
+
+class AsyncUserDetailView(AsyncAPIView):
+    """
+    Versión asíncrona de ``UserDetailView`` (actualización y eliminación).
+    """
+    async def put(self, request, id):
+        """
+        Actualiza un usuario existente con las mismas reglas que ``UserSerializer.update``.
+        """
+        try:
+            user = await User.objects.aget(id=id)
+        except User.DoesNotExist:
+            return JsonResponse({"mensaje": "El usuario no existe"}, status=HTTPStatus.NOT_FOUND)
+
+        datos, error = _leer_datos(request)
+        if error:
+            return error
+
+        serializer = UserSerializer(user, data=datos, partial=True)
+        if not await sync_to_async(serializer.is_valid)():
+            return JsonResponse({
+                "mensaje": "Error al actualizar el usuario",
+                "error": serializer.errors
+            }, status=HTTPStatus.BAD_REQUEST)
+
+        validated_data = dict(serializer.validated_data)
+        password = validated_data.pop('password', None)
+        for attr, value in validated_data.items():
+            setattr(user, attr, value)
+        if password:
+            user.password = await _hashear(password)
+        await user.asave()
+        return JsonResponse({
+            "mensaje": "El usuario se actualizó correctamente",
+            "data": UserSerializer(user).data
+        }, status=HTTPStatus.OK)
+
+    async def delete(self, request, id):
+        """
+        Elimina un usuario existente.
+        """
+        try:
+            user = await User.objects.aget(id=id)
+        except User.DoesNotExist:
+            return JsonResponse({"mensaje": "El usuario no existe"}, status=HTTPStatus.NOT_FOUND)
+        await user.adelete()
+        return JsonResponse({"mensaje": "El usuario se eliminó correctamente"}, status=HTTPStatus.NO_CONTENT)
@@ -0,0 +1,109 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import User
+
+# Campos que cambian el resultado de la autenticación
+CAMPOS_AUTENTICACION = frozenset({'password', 'is_active', 'is_staff', 'is_superuser'})
+
+
+def clave_usuario_autenticado(user_id):
+    return f'users:auth:{user_id}'
+
+
+def invalidar_usuario_autenticado(user_id):
+    """
+    Elimina de la caché al usuario resuelto para los JWT, ahora y al confirmar la
+    transacción (por si otra petición lo volvió a cargar antes del commit).
+    """
+    clave = clave_usuario_autenticado(user_id)
+    cache.delete(clave)
+    transaction.on_commit(lambda: cache.delete(clave))
+
+
+def invalidar_usuarios_autenticados(ids):
+    """
+    Igual que ``invalidar_usuario_autenticado`` para varios usuarios, con un solo
+    ``delete_many`` ahora y otro al confirmar la transacción.
+    """
+    claves = [clave_usuario_autenticado(user_id) for user_id in ids]
+    if not claves:
+        return
+    cache.delete_many(claves)
+    transaction.on_commit(lambda: cache.delete_many(claves))
+
+
+def _id_de_usuario(validated_token):
+    try:
+        return validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken(_("Token contained no recognizable user identification"))
+
+
+def _verificar_usuario(user, validated_token):
+    # Las mismas comprobaciones que JWTAuthentication.get_user de simplejwt
+    if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+        raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+    if api_settings.CHECK_REVOKE_TOKEN:
+        if validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(
+                _("The user's password has been changed."), code="password_changed"
+            )
+    return user
+
+
+def usuario_del_token(validated_token):
+    """
+    Usuario de un JWT ya validado, desde la caché o la base de datos.
+    :raises InvalidToken: Si el token no identifica a un usuario.
+    :raises AuthenticationFailed: Si el usuario no existe, está inactivo o cambió
+        su contraseña después de emitir el token (``CHECK_REVOKE_TOKEN``).
+    """
+    user_id = _id_de_usuario(validated_token)
+    clave = clave_usuario_autenticado(user_id)
+    user = cache.get(clave)
+    if user is None:
+        try:
+            user = User.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+        except User.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        cache.set(clave, user, settings.USERS_AUTH_CACHE_TTL)
+    return _verificar_usuario(user, validated_token)
+
+
+async def ausuario_del_token(validated_token):
+    """
+    Igual que ``usuario_del_token`` con la caché y el ORM asíncronos.
+    """
+    user_id = _id_de_usuario(validated_token)
+    clave = clave_usuario_autenticado(user_id)
+    user = await cache.aget(clave)
+    if user is None:
+        try:
+            user = await User.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+        except User.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        await cache.aset(clave, user, settings.USERS_AUTH_CACHE_TTL)
+    return _verificar_usuario(user, validated_token)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    Autenticación JWT que guarda en caché al usuario de cada token.
+
+    Evita la consulta del usuario en cada petición: la entrada dura
+    ``USERS_AUTH_CACHE_TTL`` segundos y se invalida al guardar cambios en la
+    contraseña, ``is_active``, ``is_staff`` o ``is_superuser`` (ver ``users.signals``).
+    Los cambios hechos sin señales (``QuerySet.update``) se aplican al vencer la entrada.
+    """
+    def get_user(self, validated_token):
+        return usuario_del_token(validated_token)
@@ -0,0 +1,865 @@
+"""
+Escenarios de benchmark de la API de usuarios.
+
+Se ejecutan con ``python manage.py benchmark [escenario ...]`` sobre una base de
+datos de pruebas que el comando crea y elimina en cada corrida. Cada escenario
+recibe las opciones del comando y devuelve una lista de resultados (diccionarios
+con ``escenario``, ``caso``, ``filas`` y las métricas medidas).
+"""
+import asyncio
+import csv
+import io
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+from django.core.cache import cache
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import path
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .async_views import AsyncUserListView
+from .compresion import CODIFICACIONES
+from .directorio import DirectorioUsuarios, directorio
+from .importacion import abrir_texto, importar_usuarios_csv
+from .models import User
+from .parsers import ORJSONParser
+from .renderers import ORJSONRenderer, orjson
+from .seeding import generar_usuarios, insertar_usuarios
+from .serializers import FastUserListSerializer, UserSerializer
+from .utils import EXPORTADORES
+from .views import UserListView
+
+ESCENARIOS = {}
+
+PASSWORD_BENCHMARK = 'benchpass123'
+
+
+def escenario(nombre):
+    """
+    Registra una función como escenario de benchmark.
+    """
+    def decorador(func):
+        ESCENARIOS[nombre] = func
+        return func
+    return decorador
+
+
+def percentil(valores, p):
+    """
+    Percentil ``p`` (0-100) por el método del rango más cercano.
+    """
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    indice = max(0, min(len(ordenados) - 1, math.ceil(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def resumir_latencias(latencias, duracion):
+    """
+    Resume una lista de latencias (en segundos) medidas durante ``duracion`` segundos.
+    """
+    return {
+        "peticiones": len(latencias),
+        "rps": round(len(latencias) / duracion, 1) if duracion else 0.0,
+        "p50_ms": round(percentil(latencias, 50) * 1000, 2),
+        "p95_ms": round(percentil(latencias, 95) * 1000, 2),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 2),
+    }
+
+
+def crear_usuarios(cantidad, prefijo='bench'):
+    """
+    Reemplaza la tabla de usuarios por ``cantidad`` usuarios de prueba.
+
+    Todos comparten un hash de contraseña precalculado para no pagar PBKDF2 por fila.
+    :return: Usuario administrador usado para autenticar las peticiones.
+    """
+    User.objects.all().delete()
+    password = make_password(PASSWORD_BENCHMARK)
+    admin = User.objects.create(email=f'{prefijo}-admin@example.com', password=password)
+    insertar_usuarios(generar_usuarios(max(cantidad - 1, 0), password, dominio=f'{prefijo}.example'))
+    return admin
+
+
+def headers_autenticacion(user):
+    """
+    Header ``Authorization`` con un JWT de acceso para ``user``.
+    """
+    return {"Authorization": f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+
+def verificar_respuesta(response):
+    """
+    Evita medir respuestas de error como si fueran peticiones exitosas.
+    """
+    if response.status_code >= 400:
+        raise RuntimeError(f"La petición falló con {response.status_code}: {response.content[:200]!r}")
+    return response
+
+
+class _Rutas:
+    """
+    URLconf mínima para comparar variantes de una misma vista.
+    """
+    def __init__(self, vista_lista):
+        self.urlpatterns = [path('api/v1/users/', vista_lista.as_view(), name='user-list')]
+
+
+def _medir_wsgi(url, params, headers, repeticiones, concurrencia):
+    def peticion(_):
+        client = Client()
+        inicio = time.perf_counter()
+        verificar_respuesta(client.get(url, params, headers=headers))
+        return time.perf_counter() - inicio
+
+    def trabajador(cantidad):
+        try:
+            return [peticion(i) for i in range(cantidad)]
+        finally:
+            connection.close()
+
+    cantidades = [repeticiones // concurrencia + (1 if i < repeticiones % concurrencia else 0)
+                  for i in range(concurrencia)]
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        latencias = [lat for grupo in pool.map(trabajador, cantidades) for lat in grupo]
+    return latencias, time.perf_counter() - inicio
+
+
+def _medir_asgi(url, params, headers, repeticiones, concurrencia):
+    async def correr():
+        client = AsyncClient()
+        semaforo = asyncio.Semaphore(concurrencia)
+
+        async def peticion():
+            async with semaforo:
+                inicio = time.perf_counter()
+                verificar_respuesta(await client.get(url, params, headers=headers))
+                return time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        latencias = await asyncio.gather(*(peticion() for _ in range(repeticiones)))
+        return list(latencias), time.perf_counter() - inicio
+
+    return asyncio.run(correr())
+
+
+@escenario('asgi')
+def benchmark_wsgi_vs_asgi(opciones):
+    """
+    Compara peticiones por segundo y latencia del listado de usuarios entre la vista
+    síncrona servida por el handler WSGI y la vista asíncrona servida por el handler ASGI.
+    """
+    resultados = []
+    url = '/api/v1/users/'
+    params = {'page_size': 50}
+    for filas in opciones['filas']:
+        headers = headers_autenticacion(crear_usuarios(filas))
+        casos = [
+            ('wsgi', _Rutas(UserListView), _medir_wsgi),
+            ('asgi', _Rutas(AsyncUserListView), _medir_asgi),
+        ]
+        for caso, rutas, medir in casos:
+            with override_settings(ROOT_URLCONF=rutas):
+                medir(url, params, headers, opciones['concurrencia'], opciones['concurrencia'])
+                latencias, duracion = medir(
+                    url, params, headers, opciones['repeticiones'], opciones['concurrencia']
+                )
+            resultados.append(dict(
+                escenario='asgi', caso=caso, filas=filas, **resumir_latencias(latencias, duracion)
+            ))
+    return resultados
+
+
+@escenario('serializacion')
+def benchmark_serializacion(opciones):
+    """
+    Filas por segundo al serializar la tabla completa con ``UserSerializer`` y con
+    ``FastUserListSerializer`` (consulta incluida).
+    """
+    def con_drf():
+        return UserSerializer(User.objects.all(), many=True).data
+
+    def rapido():
+        serializer = FastUserListSerializer()
+        return serializer.serializar(list(serializer.get_queryset(User.objects.all())))
+
+    resultados = []
+    for filas in opciones['filas']:
+        crear_usuarios(filas)
+        for caso, funcion in (('drf', con_drf), ('rapido', rapido)):
+            inicio = time.perf_counter()
+            total = len(funcion())
+            duracion = time.perf_counter() - inicio
+            resultados.append(dict(
+                escenario='serializacion', caso=caso, filas=filas,
+                segundos=round(duracion, 3), filas_por_segundo=round(total / duracion)
+            ))
+    return resultados
+
+
+@escenario('login')
+def benchmark_login(opciones):
+    """
+    Logins por segundo y latencia de ``/api/token/``, con el número de verificaciones
+    de contraseña por login. Cada login cuesta un PBKDF2 completo, por eso se mide
+    una décima parte de ``--repeticiones``.
+    """
+    resultados = []
+    repeticiones = max(1, opciones['repeticiones'] // 10)
+    for filas in opciones['filas']:
+        admin = crear_usuarios(filas)
+        client = Client()
+        datos = {'email': admin.email, 'password': PASSWORD_BENCHMARK}
+        # Sin buckets: se mide el costo del login, no el throttle (ver ``login_flood``)
+        with override_settings(USERS_LOGIN_EMAIL_BURST=0, USERS_LOGIN_IP_BURST=0), mock.patch.object(
+            PBKDF2PasswordHasher, 'verify', autospec=True, side_effect=PBKDF2PasswordHasher.verify
+        ) as verify:
+            latencias = []
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                t0 = time.perf_counter()
+                verificar_respuesta(client.post('/api/token/', datos))
+                latencias.append(time.perf_counter() - t0)
+            duracion = time.perf_counter() - inicio
+        resultados.append(dict(
+            escenario='login', caso='token', filas=filas,
+            hasheos_por_login=verify.call_count / repeticiones,
+            **resumir_latencias(latencias, duracion)
+        ))
+    return resultados
+
+
+
+def _inundar_login(detener, concurrencia, una_ip):
+    """
+    Manda logins fallidos desde ``concurrencia`` hilos hasta que se active ``detener``.
+    :return: Lista (llenada por los hilos) con el status de cada intento y los hilos.
+    """
+    estados = []
+
+    def trabajador(n):
+        client = Client()
+        i = 0
+        try:
+            while not detener.is_set():
+                # Credential stuffing distribuido: cada intento con otro email y otra IP
+                ip = '10.255.0.1' if una_ip else f'10.{n}.{i // 250 % 250}.{i % 250 + 1}'
+                response = client.post(
+                    '/api/token/', {'email': f'flood{n}-{i}@example.com', 'password': 'incorrecta'},
+                    REMOTE_ADDR=ip,
+                )
+                estados.append(response.status_code)
+                i += 1
+        finally:
+            connection.close()
+
+    hilos = [threading.Thread(target=trabajador, args=(n,), daemon=True) for n in range(concurrencia)]
+    for hilo in hilos:
+        hilo.start()
+    return estados, hilos
+
+
+@escenario('login_flood')
+def benchmark_login_flood(opciones):
+    """
+    Latencia del listado de usuarios mientras ``--concurrencia`` hilos inundan
+    ``/api/token/`` con logins fallidos (cada uno cuesta un PBKDF2 completo).
+
+    Casos: sin inundación, inundación sin límites (sin buckets ni tope de hasheos),
+    inundación distribuida entre muchas IPs y emails (solo actúa el tope de
+    hasheos) e inundación desde una sola IP (actúa el bucket por IP).
+    """
+    casos = [
+        ('sin_flood', None, {}),
+        ('flood_sin_limites', False, dict(
+            USERS_LOGIN_IP_BURST=0, USERS_LOGIN_EMAIL_BURST=0, USERS_LOGIN_MAX_HASHES=10_000
+        )),
+        ('flood_distribuido', False, {}),
+        ('flood_una_ip', True, {}),
+    ]
+    resultados = []
+    for filas in opciones['filas']:
+        admin = crear_usuarios(filas)
+        headers = headers_autenticacion(admin)
+        for caso, una_ip, ajustes in casos:
+            cache.clear()
+            with override_settings(**ajustes):
+                client = Client(headers=headers)
+                verificar_respuesta(client.get('/api/v1/users/', {'page_size': 50}))
+                detener = threading.Event()
+                estados, hilos = ([], []) if una_ip is None else _inundar_login(
+                    detener, opciones['concurrencia'], una_ip
+                )
+                try:
+                    latencias = []
+                    inicio = time.perf_counter()
+                    for _ in range(opciones['repeticiones']):
+                        t0 = time.perf_counter()
+                        verificar_respuesta(client.get('/api/v1/users/', {'page_size': 50}))
+                        latencias.append(time.perf_counter() - t0)
+                    duracion = time.perf_counter() - inicio
+                finally:
+                    detener.set()
+                    for hilo in hilos:
+                        hilo.join()
+            hasheados = sum(1 for estado in estados if estado == 400)
+            resultados.append(dict(
+                escenario='login_flood', caso=caso, filas=filas,
+                lista_p50_ms=round(percentil(latencias, 50) * 1000, 2),
+                lista_p95_ms=round(percentil(latencias, 95) * 1000, 2),
+                lista_p99_ms=round(percentil(latencias, 99) * 1000, 2),
+                logins_hasheados_s=round(hasheados / duracion, 1),
+                logins_rechazados_s=round((len(estados) - hasheados) / duracion, 1),
+            ))
+    return resultados
+
+def consumir(response):
+    """
+    Lee todo el cuerpo de la respuesta, también si es streaming (bloque por bloque,
+    sin juntarlo en memoria).
+    :return: Tamaño del cuerpo en bytes.
+    """
+    if response.streaming:
+        return sum(len(bloque) for bloque in response.streaming_content)
+    return len(response.content)
+
+
+def medir_endpoint(peticion, repeticiones):
+    """
+    Mide una petición repetida: latencias, consultas SQL por petición y memoria máxima.
+
+    La caché se vacía antes de cada petición para medir el camino completo. La
+    memoria se mide en una pasada aparte porque ``tracemalloc`` altera los tiempos.
+    :param peticion: Función sin argumentos que hace la petición y devuelve la respuesta.
+    """
+    latencias = []
+    consultas = 0
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        cache.clear()
+        with CaptureQueriesContext(connection) as capturadas:
+            t0 = time.perf_counter()
+            consumir(verificar_respuesta(peticion()))
+            latencias.append(time.perf_counter() - t0)
+        consultas += len(capturadas.captured_queries)
+    duracion = sum(latencias) or (time.perf_counter() - inicio)
+
+    cache.clear()
+    tracemalloc.start()
+    try:
+        consumir(peticion())
+        memoria = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return dict(
+        consultas=round(consultas / repeticiones, 2),
+        memoria_kb=round(memoria / 1024),
+        **resumir_latencias(latencias, duracion)
+    )
+
+
+@escenario('endpoints')
+def benchmark_endpoints(opciones):
+    """
+    Latencia (p50/p95/p99), consultas por petición y memoria máxima de los endpoints
+    principales con el cliente de pruebas de Django. Sirve como base de los
+    presupuestos de ``benchmark_budgets.json`` (``manage.py benchmark --verificar``).
+    """
+    resultados = []
+    for filas in opciones['filas']:
+        admin = crear_usuarios(filas)
+        client = Client(headers=headers_autenticacion(admin))
+        casos = [
+            ('lista', lambda: client.get('/api/v1/users/'), opciones['repeticiones']),
+            ('lista_pagina', lambda: client.get('/api/v1/users/', {'page_size': 50}), opciones['repeticiones']),
+            ('export_csv', lambda: client.get('/api/v1/users/export/csv/'), max(1, opciones['repeticiones'] // 10)),
+            ('export_csv_stream', lambda: client.get('/api/v1/users/export/csv/', {'stream': 'true'}),
+             max(1, opciones['repeticiones'] // 10)),
+            # Cada login cuesta un PBKDF2 completo
+            ('token', lambda: Client().post('/api/token/', {
+                'email': admin.email, 'password': PASSWORD_BENCHMARK
+            }), max(1, opciones['repeticiones'] // 20)),
+        ]
+        for caso, peticion, repeticiones in casos:
+            resultados.append(dict(
+                escenario='endpoints', caso=caso, filas=filas, **medir_endpoint(peticion, repeticiones)
+            ))
+    return resultados
+
+
+@escenario('instrumentacion')
+def benchmark_instrumentacion(opciones):
+    """
+    Costo de ``InstrumentacionMiddleware``: latencia de una página del listado y del
+    detalle con y sin el middleware. La caché se vacía en cada petición para que el
+    listado ejecute sus consultas (el middleware envuelve cada una).
+    """
+    sin_middleware = [m for m in settings.MIDDLEWARE if m != 'users.middleware.InstrumentacionMiddleware']
+    resultados = []
+    for filas in opciones['filas']:
+        admin = crear_usuarios(filas)
+        headers = headers_autenticacion(admin)
+        casos = [
+            ('lista_pagina', '/api/v1/users/', {'page_size': 50}),
+            ('detalle', f'/api/v1/users/{admin.id}/', None),
+        ]
+        for caso, url, params in casos:
+            medidas = {}
+            for variante, middleware in (('con', settings.MIDDLEWARE), ('sin', sin_middleware)):
+                with override_settings(MIDDLEWARE=middleware):
+                    client = Client(headers=headers)
+                    if params is None:
+                        peticion = lambda: client.put(url, {'first_name': 'Bench'}, content_type='application/json')
+                    else:
+                        peticion = lambda: client.get(url, params)
+                    # Calentamiento: carga la cadena de middleware y las conexiones
+                    verificar_respuesta(peticion())
+                    medidas[variante] = medir_endpoint(peticion, opciones['repeticiones'])
+            resultados.append(dict(
+                escenario='instrumentacion', caso=caso, filas=filas,
+                p50_con_ms=medidas['con']['p50_ms'], p50_sin_ms=medidas['sin']['p50_ms'],
+                sobrecosto_p50_ms=round(medidas['con']['p50_ms'] - medidas['sin']['p50_ms'], 3),
+                sobrecosto_pct=round(
+                    100 * (medidas['con']['p50_ms'] - medidas['sin']['p50_ms']) / medidas['sin']['p50_ms'], 1
+                ),
+                consultas=medidas['con']['consultas'],
+            ))
+    return resultados
+
+
+def _escribir_csv_importacion(ruta, cantidad):
+    """
+    Escribe un CSV con el formato de la exportación y ``cantidad`` usuarios nuevos.
+    """
+    with open(ruta, 'w', encoding='utf-8', newline='') as archivo:
+        writer = csv.writer(archivo)
+        writer.writerow(['id', 'email', 'first_name', 'last_name', 'phone', 'date_joined'])
+        for usuario in generar_usuarios(cantidad, '', dominio='importacion.example'):
+            writer.writerow([
+                '', usuario.email, usuario.first_name, usuario.last_name, usuario.phone,
+                usuario.date_joined.strftime('%Y-%m-%d %H:%M:%S'),
+            ])
+    return os.path.getsize(ruta)
+
+
+def _importar(ruta, dry_run):
+    with open(ruta, 'rb') as archivo:
+        texto = abrir_texto(archivo)
+        try:
+            return importar_usuarios_csv(texto, dry_run=dry_run)
+        finally:
+            texto.detach()
+
+
+@escenario('importacion')
+def benchmark_importacion(opciones):
+    """
+    Filas por segundo de la importación CSV (validación, ``bulk_create`` en
+    savepoints) con un archivo generado en disco, en modo ``dry_run`` y real. La
+    memoria máxima se mide en una pasada aparte de ``dry_run`` con ``tracemalloc``.
+    Para el caso de referencia usar ``--filas 500000``.
+    """
+    resultados = []
+    for filas in opciones['filas']:
+        crear_usuarios(1)
+        with tempfile.TemporaryDirectory() as carpeta, override_settings(USERS_IMPORT_DIR=carpeta):
+            ruta = os.path.join(carpeta, 'usuarios.csv')
+            tamano = _escribir_csv_importacion(ruta, filas)
+
+            tracemalloc.start()
+            try:
+                _importar(ruta, dry_run=True)
+                memoria = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+            for caso, dry_run in (('dry_run', True), ('importar', False)):
+                inicio = time.perf_counter()
+                resultado = _importar(ruta, dry_run=dry_run)
+                duracion = time.perf_counter() - inicio
+                if resultado['creados'] != filas:
+                    raise RuntimeError(f"Se esperaban {filas} filas válidas: {resultado}")
+                resultados.append(dict(
+                    escenario='importacion', caso=caso, filas=filas,
+                    segundos=round(duracion, 2),
+                    filas_por_segundo=round(filas / duracion),
+                    archivo_mb=round(tamano / 1024 / 1024, 1),
+                    memoria_kb=round(memoria / 1024),
+                ))
+    return resultados
+
+
+def _cargar_con_pyarrow(formato, ruta):
+    # Tabla de Arrow tipada, la misma representación para todos los formatos
+    import pyarrow as pa
+    import pyarrow.csv
+    import pyarrow.json
+    import pyarrow.parquet
+
+    if formato == 'csv':
+        return pyarrow.csv.read_csv(ruta).num_rows
+    if formato == 'ndjson':
+        return pyarrow.json.read_json(ruta).num_rows
+    if formato == 'parquet':
+        return pyarrow.parquet.read_table(ruta).num_rows
+    with pa.memory_map(ruta) as origen:
+        return pa.ipc.open_file(origen).read_all().num_rows
+
+
+def _cargar_sin_pyarrow(formato, ruta):
+    # Lectura con la biblioteca estándar convirtiendo id y date_joined a sus tipos
+    filas = 0
+    with open(ruta, encoding='utf-8', newline='') as archivo:
+        if formato == 'csv':
+            for fila in csv.DictReader(archivo):
+                int(fila['id'])
+                datetime.strptime(fila['date_joined'], '%Y-%m-%d %H:%M:%S').replace(tzinfo=dt_timezone.utc)
+                filas += 1
+        else:
+            for linea in archivo:
+                fila = json.loads(linea)
+                datetime.fromisoformat(fila['date_joined'])
+                filas += 1
+    return filas
+
+
+@escenario('formatos')
+def benchmark_formatos(opciones):
+    """
+    Tiempo de exportación, tamaño del archivo y tiempo de carga de cada formato
+    registrado en ``EXPORTADORES``. La carga usa los lectores de ``pyarrow`` (una
+    tabla tipada, como la que obtiene pandas) o, sin ``pyarrow``, la biblioteca
+    estándar convirtiendo ``id`` y ``date_joined``.
+    """
+    try:
+        import pyarrow  # noqa: F401
+        cargar = _cargar_con_pyarrow
+    except ImportError:
+        cargar = _cargar_sin_pyarrow
+
+    resultados = []
+    for filas in opciones['filas']:
+        crear_usuarios(filas)
+        with tempfile.TemporaryDirectory() as carpeta:
+            for formato, exportador in EXPORTADORES.items():
+                if not exportador.disponible():
+                    continue
+                ruta = os.path.join(carpeta, f'users.{exportador.extension}')
+                inicio = time.perf_counter()
+                with open(ruta, 'wb') as archivo:
+                    for bloque in exportador().bloques(User.objects.all()):
+                        archivo.write(bloque.encode('utf-8') if isinstance(bloque, str) else bloque)
+                exportar = time.perf_counter() - inicio
+
+                inicio = time.perf_counter()
+                cargadas = cargar(formato, ruta)
+                carga = time.perf_counter() - inicio
+                if cargadas != filas:
+                    raise RuntimeError(f"{formato}: se cargaron {cargadas} de {filas} filas")
+
+                tamano = os.path.getsize(ruta)
+                resultados.append(dict(
+                    escenario='formatos', caso=formato, filas=filas,
+                    exportar_s=round(exportar, 3),
+                    cargar_s=round(carga, 3),
+                    archivo_mb=round(tamano / 1024 / 1024, 2),
+                    bytes_por_fila=round(tamano / filas, 1),
+                ))
+    return resultados
+
+
+
+# Se ejecuta en un proceso nuevo: mide la importación del módulo de despliegue y
+# las dos primeras peticiones (la primera carga el URLconf y las vistas)
+_SCRIPT_ARRANQUE = r"""
+import asyncio, io, json, sys, time
+
+inicio = time.perf_counter()
+if sys.argv[1] == 'wsgi':
+    from backend.wsgi import application
+else:
+    from backend.asgi import application
+importar = time.perf_counter() - inicio
+
+
+def peticion_wsgi():
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': sys.argv[2], 'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+        'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+    }
+    estado = []
+    cuerpo = application(environ, lambda status, headers, *args: estado.append(status))
+    b''.join(cuerpo)
+    cuerpo.close()
+    return int(estado[0].split()[0])
+
+
+async def peticion_asgi():
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': sys.argv[2], 'raw_path': sys.argv[2].encode(), 'query_string': b'',
+        'headers': [(b'host', b'localhost')], 'server': ('localhost', 80), 'client': ('127.0.0.1', 0),
+    }
+    mensajes = []
+    terminada = asyncio.Event()
+    cuerpo = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+    async def receive():
+        if cuerpo:
+            return cuerpo.pop()
+        # Después del cuerpo, el cliente solo se desconecta al recibir la respuesta
+        await terminada.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(mensaje):
+        mensajes.append(mensaje)
+        if mensaje['type'] == 'http.response.body' and not mensaje.get('more_body'):
+            terminada.set()
+    await application(scope, receive, send)
+    return mensajes[0]['status']
+
+
+def medir():
+    inicio = time.perf_counter()
+    status = peticion_wsgi() if sys.argv[1] == 'wsgi' else asyncio.run(peticion_asgi())
+    return time.perf_counter() - inicio, status
+
+
+primera, status = medir()
+segunda, _ = medir()
+print(json.dumps({
+    'importar': importar, 'primera': primera, 'segunda': segunda, 'status': status,
+    'drf_yasg': 'drf_yasg' in sys.modules, 'modulos': len(sys.modules),
+}))
+"""
+
+
+def _medir_arranque(modulo, url, docs):
+    entorno = dict(os.environ, API_DOCS_ENABLED=str(docs), ALLOWED_HOSTS='localhost')
+    entorno.setdefault('CORS_ALLOWED_ORIGINS', 'http://localhost')
+    proceso = subprocess.run(
+        [sys.executable, '-c', _SCRIPT_ARRANQUE, modulo, url],
+        env=entorno, cwd=settings.BASE_DIR, capture_output=True, text=True,
+    )
+    if proceso.returncode:
+        raise RuntimeError(f"El proceso de {modulo} falló:\n{proceso.stderr[-2000:]}")
+    return json.loads(proceso.stdout.strip().splitlines()[-1])
+
+
+@escenario('arranque')
+def benchmark_arranque(opciones):
+    """
+    Arranque de un worker: importación de ``backend.wsgi`` / ``backend.asgi`` y
+    latencia de la primera y la segunda petición, con y sin la documentación de la
+    API. Cada medición es un proceso nuevo (mediana de hasta 10 procesos). La
+    petición es el listado sin credenciales (401), que no toca la base de datos.
+    """
+    procesos = max(1, min(opciones['repeticiones'], 10))
+    resultados = []
+    for modulo in ('wsgi', 'asgi'):
+        for docs in (True, False):
+            medidas = [_medir_arranque(modulo, '/api/v1/users/', docs) for _ in range(procesos)]
+            if medidas[0]['status'] != 401:
+                raise RuntimeError(f"La petición de arranque devolvió {medidas[0]['status']}")
+            resultados.append(dict(
+                escenario='arranque', caso=f"{modulo}_{'con' if docs else 'sin'}_docs", filas=0,
+                importar_ms=round(percentil([m['importar'] for m in medidas], 50) * 1000, 1),
+                primera_ms=round(percentil([m['primera'] for m in medidas], 50) * 1000, 1),
+                segunda_ms=round(percentil([m['segunda'] for m in medidas], 50) * 1000, 2),
+                modulos=medidas[0]['modulos'],
+                drf_yasg=medidas[0]['drf_yasg'],
+            ))
+    return resultados
+
+
+@escenario('directorio')
+def benchmark_directorio(opciones):
+    """
+    Directorio en memoria (``USERS_DIRECTORY``): memoria por usuario y tiempo de la
+    carga completa, costo de un refresco incremental según la cantidad de usuarios
+    cambiados, y latencia del listado desde el directorio y desde la base de datos.
+    El listado se mide sin la caché de respuestas para comparar solo la consulta.
+    """
+    resultados = []
+    for filas in opciones['filas']:
+        admin = crear_usuarios(filas)
+
+        inicio = time.perf_counter()
+        DirectorioUsuarios().cargar()
+        carga = time.perf_counter() - inicio
+        tracemalloc.start()
+        try:
+            medido = DirectorioUsuarios()
+            medido.cargar()
+            memoria = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        resultados.append(dict(
+            escenario='directorio', caso='carga', filas=filas,
+            segundos=round(carga, 3),
+            memoria_mb=round(memoria / 1024 / 1024, 1),
+            bytes_por_usuario=round(memoria / filas),
+        ))
+
+        with override_settings(USERS_SYNC_LAG=0):
+            refrescado = DirectorioUsuarios()
+            refrescado.cargar()
+            ids = list(User.objects.order_by('?').values_list('id', flat=True)[:1000])
+            for cambios in (0, 10, 100, 1000):
+                if cambios > len(ids):
+                    break
+                User.objects.filter(id__in=ids[:cambios]).update(
+                    first_name='Refrescado', updated_at=datetime.now(dt_timezone.utc)
+                )
+                inicio = time.perf_counter()
+                aplicados, _ = refrescado.refrescar()
+                duracion = time.perf_counter() - inicio
+                resultados.append(dict(
+                    escenario='directorio', caso=f'refresco_{cambios}', filas=filas,
+                    cambios=aplicados, ms=round(duracion * 1000, 2),
+                ))
+
+        client = Client(headers=headers_autenticacion(admin))
+        casos = [
+            ('lista_pagina', {'page_size': 50}),
+            ('lista_busqueda', {'page_size': 50, 'search': 'ana'}),
+            ('lista_inactivos', {'page_size': 50, 'is_active': 'false'}),
+        ]
+        for caso, params in casos:
+            medidas = {}
+            for variante, activo in (('directorio', True), ('base_de_datos', False)):
+                with override_settings(USERS_DIRECTORY=activo), \
+                        mock.patch('users.views.CacheListadoUsuarios.obtener', return_value=None):
+                    directorio.reiniciar()
+                    verificar_respuesta(client.get('/api/v1/users/', params))
+                    latencias = []
+                    inicio = time.perf_counter()
+                    for _ in range(opciones['repeticiones']):
+                        t0 = time.perf_counter()
+                        verificar_respuesta(client.get('/api/v1/users/', params))
+                        latencias.append(time.perf_counter() - t0)
+                    medidas[variante] = resumir_latencias(latencias, time.perf_counter() - inicio)
+            resultados.append(dict(
+                escenario='directorio', caso=caso, filas=filas,
+                p50_directorio_ms=medidas['directorio']['p50_ms'],
+                p95_directorio_ms=medidas['directorio']['p95_ms'],
+                p50_base_de_datos_ms=medidas['base_de_datos']['p50_ms'],
+                p95_base_de_datos_ms=medidas['base_de_datos']['p95_ms'],
+            ))
+        directorio.reiniciar()
+    return resultados
+
+
+@escenario('json')
+def benchmark_json(opciones):
+    """
+    Renderizado y parseo del listado completo (``{"data": [...]}``) con el
+    ``JSONRenderer``/``JSONParser`` de DRF y con los de ``orjson`` (si está
+    instalado). ``identico`` indica si los dos renderers producen los mismos bytes.
+    """
+    if orjson is None:
+        return []
+    resultados = []
+    for filas in opciones['filas']:
+        crear_usuarios(filas)
+        serializer = FastUserListSerializer()
+        datos = {'data': serializer.serializar(list(serializer.get_queryset(User.objects.order_by('id'))))}
+        repeticiones = max(1, opciones['repeticiones'] // 10)
+        salidas = {}
+        for caso, renderer, parser in (('drf', JSONRenderer(), JSONParser()),
+                                       ('orjson', ORJSONRenderer(), ORJSONParser())):
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                contenido = renderer.render(datos)
+            renderizar = (time.perf_counter() - inicio) / repeticiones
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                parser.parse(io.BytesIO(contenido))
+            parsear = (time.perf_counter() - inicio) / repeticiones
+            salidas[caso] = contenido
+            resultados.append(dict(
+                escenario='json', caso=caso, filas=filas,
+                renderizar_ms=round(renderizar * 1000, 1),
+                parsear_ms=round(parsear * 1000, 1),
+                mb=round(len(contenido) / 1024 / 1024, 2),
+                mb_por_segundo=round(len(contenido) / 1024 / 1024 / renderizar),
+            ))
+        resultados[-1]['identico'] = salidas['orjson'] == salidas['drf']
+    return resultados
+
+
+@escenario('compresion')
+def benchmark_compresion(opciones):
+    """
+    CPU contra bytes ahorrados al comprimir el listado completo en JSON y la
+    exportación CSV con cada codificación disponible y cada uno de sus niveles
+    (``nivel_usado`` marca el que elige ``CompresionMiddleware`` para ese tamaño).
+    El caso ``csv_streaming`` mide la exportación de punta a punta con y sin gzip.
+    """
+    resultados = []
+    for filas in opciones['filas']:
+        admin = crear_usuarios(filas)
+        serializer = FastUserListSerializer()
+        cuerpos = {
+            'json': ORJSONRenderer().render(
+                {'data': serializer.serializar(list(serializer.get_queryset(User.objects.order_by('id'))))}
+            ),
+            'csv': b''.join(
+                bloque.encode('utf-8') if isinstance(bloque, str) else bloque
+                for bloque in EXPORTADORES['csv']().bloques(User.objects.order_by('id'))
+            ),
+        }
+        for tipo, cuerpo in cuerpos.items():
+            for codificacion in CODIFICACIONES.values():
+                if not codificacion.disponible():
+                    continue
+                for nivel in sorted(set(codificacion.niveles)):
+                    with mock.patch.object(codificacion, 'nivel', return_value=nivel):
+                        inicio = time.perf_counter()
+                        comprimido = codificacion(len(cuerpo)).comprimir(cuerpo)
+                        duracion = time.perf_counter() - inicio
+                    ahorrado = len(cuerpo) - len(comprimido)
+                    resultados.append(dict(
+                        escenario='compresion', caso=f'{tipo}_{codificacion.nombre}_{nivel}', filas=filas,
+                        nivel_usado=nivel == codificacion.nivel(len(cuerpo)),
+                        mb=round(len(cuerpo) / 1024 / 1024, 2),
+                        ratio=round(len(comprimido) / len(cuerpo), 3),
+                        cpu_ms=round(duracion * 1000, 1),
+                        mb_por_segundo=round(len(cuerpo) / 1024 / 1024 / duracion),
+                        kb_ahorrados_por_ms=round(ahorrado / 1024 / (duracion * 1000), 1),
+                    ))
+
+        client = Client(headers=headers_autenticacion(admin))
+        for variante, headers in (('sin', {}), ('gzip', {'Accept-Encoding': 'gzip'})):
+            repeticiones = max(1, opciones['repeticiones'] // 10)
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                tamano = consumir(verificar_respuesta(
+                    client.get('/api/v1/users/export/csv/', {'stream': 'true'}, headers=headers)
+                ))
+            duracion = (time.perf_counter() - inicio) / repeticiones
+            resultados.append(dict(
+                escenario='compresion', caso=f'csv_streaming_{variante}', filas=filas,
+                ms=round(duracion * 1000, 1), mb_enviados=round(tamano / 1024 / 1024, 2),
+            ))
+    return resultados
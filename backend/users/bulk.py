@@ -0,0 +1,434 @@
+"""
+Operaciones masivas sobre usuarios.
+
+``bulk_create``, ``bulk_update`` y ``QuerySet.update`` no envían ``post_save``, así
+que cada operación invalida a mano la caché del listado y, si cambió algún campo de
+acceso, la caché de autenticación de los usuarios afectados. Los dos últimos
+tampoco aplican ``auto_now``: ``updated_at`` se asigna explícitamente.
+
+La creación confirma cada lote por separado (puede recibir archivos completos).
+Las actualizaciones y los borrados se aplican en una sola transacción por
+petición: si algo falla no queda nada a medias. ``USERS_BULK_MAX_ROWS`` limita su
+tamaño para que confirme dentro de ``USERS_SYNC_LAG`` (ver ``users.sincronizacion``);
+el hasheo de contraseñas se hace antes de abrirla.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import as_serializer_error
+
+from .authentication import CAMPOS_AUTENTICACION, invalidar_usuarios_autenticados
+from .cache import invalidar_listado
+from .filters import filtrar_usuarios
+from .hashing import hashear_passwords, password_no_utilizable
+from .models import User, UserTombstone
+from .signals import borrado_en_lote
+from .serializers import UserBulkSerializer, UserBulkUpdateSerializer
+
+# Filtros aceptados por las operaciones masivas por filtro: los del listado más ``ids``
+FILTROS_LOTE = frozenset({'ids', 'email', 'search', 'joined_after', 'joined_before', 'is_active'})
+
+# Campos que no pueden recibir el mismo valor para muchos usuarios a la vez
+CAMPOS_POR_ID = frozenset({'email', 'password'})
+
+
+class LoteInvalido(ValueError):
+    """
+    La petición de una operación masiva no es válida en su conjunto.
+    ``errores`` lleva el detalle por campo cuando lo hay.
+    """
+    def __init__(self, mensaje, errores=None):
+        super().__init__(mensaje)
+        self.errores = errores
+
+
+def mensaje_email_duplicado():
+    return User._meta.get_field('email').error_messages['unique']
+
+
+def _emails_existentes(emails, batch_size):
+    """
+    Devuelve el subconjunto de ``emails`` que ya está registrado, consultando por lotes.
+    """
+    existentes = set()
+    emails = list(emails)
+    for inicio in range(0, len(emails), batch_size):
+        existentes.update(
+            User.objects.filter(email__in=emails[inicio:inicio + batch_size])
+            .values_list('email', flat=True)
+        )
+    return existentes
+
+
+def validar_filas(filas, batch_size=None, serializer_class=UserBulkSerializer):
+    """
+    Valida filas de usuarios con las reglas de ``UserSerializer``.
+
+    La unicidad del email se revisa dentro del lote y contra la base de datos con
+    una consulta por cada ``batch_size`` filas, en lugar de una por fila.
+    :param filas: Lista de diccionarios con los datos de cada usuario.
+    :param serializer_class: Serializer que valida cada fila.
+    :return: Tupla (validas, errores): ``validas`` es una lista de
+        ``(indice, datos_validados)`` y ``errores`` un diccionario ``{indice: errores}``.
+    """
+    batch_size = batch_size or settings.USERS_BULK_BATCH_SIZE
+    validas = []
+    errores = {}
+    vistos = set()
+    # Un solo serializer para todo el lote: construir sus campos cuesta más que validar una fila
+    serializer = serializer_class()
+
+    for indice, fila in enumerate(filas):
+        if not isinstance(fila, dict):
+            errores[indice] = {"non_field_errors": ["Se esperaba un objeto con los datos del usuario"]}
+            continue
+        try:
+            datos = dict(serializer.run_validation(fila))
+        except ValidationError as exc:
+            errores[indice] = as_serializer_error(exc)
+            continue
+        datos['email'] = User.objects.normalize_email(datos['email'])
+        if datos['email'] in vistos:
+            errores[indice] = {"email": [mensaje_email_duplicado()]}
+            continue
+        vistos.add(datos['email'])
+        validas.append((indice, datos))
+
+    existentes = _emails_existentes(vistos, batch_size)
+    if existentes:
+        for indice, datos in validas:
+            if datos['email'] in existentes:
+                errores[indice] = {"email": [mensaje_email_duplicado()]}
+        validas = [(indice, datos) for indice, datos in validas if indice not in errores]
+    return validas, errores
+
+
+def _insertar_lote(lote):
+    """
+    Inserta un lote dentro de un savepoint. Si falla por un email creado en paralelo
+    se insertan las filas una por una para identificar las que chocan.
+    :return: Diccionario ``{indice: usuario o errores}``.
+    """
+    try:
+        with transaction.atomic():
+            creados = User.objects.bulk_create([usuario for _, usuario in lote])
+        return {indice: usuario for (indice, _), usuario in zip(lote, creados)}
+    except IntegrityError:
+        resultado = {}
+        for indice, usuario in lote:
+            try:
+                with transaction.atomic():
+                    usuario.save(force_insert=True)
+                resultado[indice] = usuario
+            except IntegrityError:
+                resultado[indice] = {"email": [mensaje_email_duplicado()]}
+        return resultado
+
+
+def crear_usuarios(validas, batch_size=None):
+    """
+    Hashea las contraseñas en paralelo e inserta los usuarios con ``bulk_create``.
+
+    Las filas sin ``password`` quedan con una contraseña no utilizable, como
+    ``create_user(password=None)``. Si una fila trae ``date_joined`` se conserva.
+    :param validas: Lista de ``(indice, datos_validados)`` devuelta por ``validar_filas``.
+    :return: Diccionario ``{indice: usuario creado o errores}``.
+    """
+    batch_size = batch_size or settings.USERS_BULK_BATCH_SIZE
+    con_password = [datos['password'] for _, datos in validas if datos.get('password')]
+    hashes = iter(hashear_passwords(con_password))
+
+    usuarios = []
+    for indice, datos in validas:
+        datos = dict(datos)
+        datos['password'] = next(hashes) if datos.get('password') else password_no_utilizable()
+        usuarios.append((indice, User(**datos)))
+
+    resultado = {}
+    for inicio in range(0, len(usuarios), batch_size):
+        # Una transacción por lote: la creación no tiene el tope de USERS_BULK_MAX_ROWS
+        # y ninguna transacción debe durar más que USERS_SYNC_LAG (ver users.sincronizacion)
+        with transaction.atomic():
+            resultado.update(_insertar_lote(usuarios[inicio:inicio + batch_size]))
+            # bulk_create no envía post_save
+            invalidar_listado()
+    return resultado
+
+
+def crear_usuarios_en_lote(filas):
+    """
+    Valida y crea un lote de usuarios.
+    :param filas: Lista de diccionarios con los datos de cada usuario.
+    :return: Lista con un reporte por fila, en el orden recibido.
+    """
+    validas, errores = validar_filas(filas)
+    creados = crear_usuarios(validas)
+
+    reporte = []
+    for indice in range(len(filas)):
+        resultado = creados.get(indice, errores.get(indice))
+        if isinstance(resultado, User):
+            reporte.append({"fila": indice, "estado": "creado", "id": resultado.id})
+        else:
+            reporte.append({"fila": indice, "estado": "error", "error": resultado})
+    return reporte
+
+
+def _en_lotes(valores, batch_size):
+    valores = list(valores)
+    for inicio in range(0, len(valores), batch_size):
+        yield valores[inicio:inicio + batch_size]
+
+
+def _es_id(valor):
+    return isinstance(valor, int) and not isinstance(valor, bool)
+
+
+def leer_ids(ids):
+    """
+    Valida una lista de ids recibida en el cuerpo de la petición.
+    :return: Lista de ids sin repetidos, en el orden recibido.
+    :raises LoteInvalido: Si no es una lista de enteros o excede ``USERS_BULK_MAX_ROWS``.
+    """
+    if not isinstance(ids, list) or not ids or not all(_es_id(id) for id in ids):
+        raise LoteInvalido("ids debe ser un arreglo de ids enteros")
+    if len(ids) > settings.USERS_BULK_MAX_ROWS:
+        raise LoteInvalido(f"Se permiten como máximo {settings.USERS_BULK_MAX_ROWS} usuarios por petición")
+    return list(dict.fromkeys(ids))
+
+
+def _ids_existentes(ids, batch_size):
+    existentes = set()
+    for lote in _en_lotes(ids, batch_size):
+        existentes.update(User.objects.filter(id__in=lote).values_list('id', flat=True))
+    return existentes
+
+
+def ids_por_filtro(filtro):
+    """
+    Resuelve los ids seleccionados por un filtro con las reglas del listado
+    (``users.filters``) más ``ids``. Debe llamarse dentro de una transacción: las
+    filas quedan bloqueadas hasta que termina la operación.
+    :param filtro: Diccionario con al menos un filtro.
+    :return: Lista de ids ordenada.
+    :raises LoteInvalido: Si el filtro no es válido o selecciona más de
+        ``USERS_BULK_MAX_ROWS`` usuarios.
+    """
+    if not isinstance(filtro, dict) or not filtro:
+        raise LoteInvalido("Se requiere al menos un filtro")
+    desconocidos = sorted(set(filtro) - FILTROS_LOTE)
+    if desconocidos:
+        raise LoteInvalido(f"Filtros no permitidos: {', '.join(desconocidos)}")
+
+    queryset = User.objects.all()
+    if 'ids' in filtro:
+        queryset = queryset.filter(id__in=leer_ids(filtro['ids']))
+    # Los filtros del listado esperan cadenas, como en la query de la URL
+    params = {clave: str(valor) for clave, valor in filtro.items() if clave != 'ids'}
+    try:
+        queryset = filtrar_usuarios(queryset, params)
+    except ValueError as e:
+        raise LoteInvalido(str(e))
+
+    maximo = settings.USERS_BULK_MAX_ROWS
+    ids = list(queryset.select_for_update().order_by('id').values_list('id', flat=True)[:maximo + 1])
+    if len(ids) > maximo:
+        raise LoteInvalido(f"El filtro selecciona más de {maximo} usuarios")
+    return ids
+
+
+def _validar_cambios(datos):
+    """
+    Valida los cambios de un usuario con las reglas de ``UserSerializer`` (parcial).
+    :return: Tupla (cambios validados, errores).
+    """
+    if not isinstance(datos, dict) or not datos:
+        return None, {"non_field_errors": ["No se indicaron cambios"]}
+    serializer = UserBulkUpdateSerializer(data=datos, partial=True)
+    if not serializer.is_valid():
+        return None, serializer.errors
+    cambios = dict(serializer.validated_data)
+    if not cambios:
+        return None, {"non_field_errors": ["No se indicaron cambios"]}
+    if 'email' in cambios:
+        cambios['email'] = User.objects.normalize_email(cambios['email'])
+    return cambios, None
+
+
+def _invalidar_caches(ids, campos):
+    invalidar_listado()
+    if CAMPOS_AUTENTICACION.intersection(campos):
+        invalidar_usuarios_autenticados(ids)
+
+
+def _actualizar_grupo(campos, lote, batch_size):
+    """
+    Actualiza con ``bulk_update`` usuarios que cambian los mismos campos, dentro de
+    un savepoint. Si falla por un email tomado en paralelo se actualizan uno por uno.
+    :param lote: Lista de ``(indice, usuario)``.
+    :return: Diccionario ``{indice: None si se actualizó o errores}``.
+    """
+    # bulk_update no aplica auto_now: updated_at se asigna a mano
+    ahora = timezone.now()
+    for _, usuario in lote:
+        usuario.updated_at = ahora
+    campos = [*campos, 'updated_at']
+    try:
+        with transaction.atomic():
+            User.objects.bulk_update([usuario for _, usuario in lote], campos, batch_size=batch_size)
+        return {indice: None for indice, _ in lote}
+    except IntegrityError:
+        resultado = {}
+        for indice, usuario in lote:
+            try:
+                with transaction.atomic():
+                    User.objects.filter(id=usuario.id).update(
+                        **{campo: getattr(usuario, campo) for campo in campos}
+                    )
+                resultado[indice] = None
+            except IntegrityError:
+                resultado[indice] = {"email": [mensaje_email_duplicado()]}
+        return resultado
+
+
+def actualizar_usuarios_en_lote(items):
+    """
+    Aplica cambios distintos a cada usuario de una lista.
+
+    Cada elemento lleva el ``id`` y los campos a cambiar. Los usuarios que cambian
+    los mismos campos se actualizan juntos con ``bulk_update`` (un ``UPDATE ... CASE``
+    por lote) y todo se aplica en una transacción. Las contraseñas se hashean igual
+    que en ``UserSerializer.update``, en paralelo y antes de abrir la transacción.
+    :param items: Lista de diccionarios ``{"id": ..., <campo>: <valor>, ...}``.
+    :return: Lista con un reporte por elemento, en el orden recibido.
+    """
+    batch_size = settings.USERS_BULK_BATCH_SIZE
+    errores = {}
+    validos = {}
+    emails = {}
+    vistos = set()
+
+    for indice, item in enumerate(items):
+        if not isinstance(item, dict) or not _es_id(item.get('id')):
+            errores[indice] = {"id": ["Se requiere el id entero del usuario"]}
+            continue
+        id = item['id']
+        if id in vistos:
+            errores[indice] = {"id": ["El usuario aparece más de una vez en el lote"]}
+            continue
+        vistos.add(id)
+        cambios, error = _validar_cambios({campo: valor for campo, valor in item.items() if campo != 'id'})
+        if error:
+            errores[indice] = error
+            continue
+        if 'email' in cambios:
+            if cambios['email'] in emails:
+                errores[indice] = {"email": [mensaje_email_duplicado()]}
+                continue
+            emails[cambios['email']] = id
+        validos[indice] = (id, cambios)
+
+    existentes = _ids_existentes([id for id, _ in validos.values()], batch_size)
+    en_uso = {}
+    for lote in _en_lotes(emails, batch_size):
+        en_uso.update(User.objects.filter(email__in=lote).values_list('email', 'id'))
+    for indice, (id, cambios) in list(validos.items()):
+        if id not in existentes:
+            errores[indice] = {"id": ["El usuario no existe"]}
+        elif en_uso.get(cambios.get('email'), id) != id:
+            errores[indice] = {"email": [mensaje_email_duplicado()]}
+        else:
+            continue
+        del validos[indice]
+
+    con_password = [indice for indice, (_, cambios) in validos.items() if 'password' in cambios]
+    hashes = hashear_passwords([validos[indice][1]['password'] for indice in con_password])
+    for indice, password in zip(con_password, hashes):
+        validos[indice][1]['password'] = password
+
+    grupos = defaultdict(list)
+    for indice, (id, cambios) in validos.items():
+        grupos[tuple(sorted(cambios))].append((indice, User(id=id, **cambios)))
+
+    actualizados = {}
+    with transaction.atomic():
+        for campos, usuarios in grupos.items():
+            for lote in _en_lotes(usuarios, batch_size):
+                actualizados.update(_actualizar_grupo(campos, lote, batch_size))
+                _invalidar_caches([usuario.id for _, usuario in lote], campos)
+
+    reporte = []
+    for indice, item in enumerate(items):
+        id = item.get('id') if isinstance(item, dict) else None
+        error = errores.get(indice) or actualizados.get(indice)
+        if error:
+            reporte.append({"fila": indice, "id": id, "estado": "error", "error": error})
+        else:
+            reporte.append({"fila": indice, "id": id, "estado": "actualizado"})
+    return reporte
+
+
+def actualizar_usuarios_por_filtro(filtro, cambios):
+    """
+    Aplica los mismos cambios a todos los usuarios que cumplen un filtro con un solo
+    ``UPDATE`` por lote de ids.
+    :raises LoteInvalido: Si el filtro o los cambios no son válidos. ``email`` y
+        ``password`` solo se pueden cambiar indicando cada id.
+    :return: Lista con un reporte por usuario actualizado.
+    """
+    cambios, errores = _validar_cambios(cambios)
+    if errores:
+        raise LoteInvalido("Los cambios no son válidos", errores)
+    prohibidos = sorted(CAMPOS_POR_ID.intersection(cambios))
+    if prohibidos:
+        raise LoteInvalido(f"{', '.join(prohibidos)} solo se puede cambiar indicando cada id")
+
+    # La misma transacción cubre el bloqueo de ids_por_filtro y la escritura
+    with transaction.atomic():
+        ids = ids_por_filtro(filtro)
+        for lote in _en_lotes(ids, settings.USERS_BULK_BATCH_SIZE):
+            User.objects.filter(id__in=lote).update(**cambios, updated_at=timezone.now())
+            _invalidar_caches(lote, cambios)
+    return [{"id": id, "estado": "actualizado"} for id in ids]
+
+
+def eliminar_usuarios(ids):
+    """
+    Elimina usuarios por lotes de ids, todos en una transacción.
+
+    Cada lote se borra con un ``DELETE ... WHERE id IN (...)``; Django también
+    elimina las relaciones de grupos y permisos. Las marcas de baja se insertan
+    con un ``bulk_create`` y las cachés se invalidan una vez por lote, en lugar de
+    hacerlo los receivers de ``post_delete`` fila por fila.
+    :param ids: Lista de ids validada con ``leer_ids``.
+    :return: Lista con un reporte por id, en el orden recibido.
+    """
+    batch_size = settings.USERS_BULK_BATCH_SIZE
+    existentes = _ids_existentes(ids, batch_size)
+    with transaction.atomic(), borrado_en_lote():
+        for lote in _en_lotes([id for id in ids if id in existentes], batch_size):
+            User.objects.filter(id__in=lote).delete()
+            UserTombstone.objects.bulk_create([UserTombstone(user_id=id) for id in lote])
+            invalidar_listado()
+            invalidar_usuarios_autenticados(lote)
+
+    reporte = []
+    for id in ids:
+        if id in existentes:
+            reporte.append({"id": id, "estado": "eliminado"})
+        else:
+            reporte.append({"id": id, "estado": "error", "error": {"id": ["El usuario no existe"]}})
+    return reporte
+
+
+def eliminar_usuarios_por_filtro(filtro):
+    """
+    Elimina a todos los usuarios que cumplen un filtro (ver ``ids_por_filtro``),
+    en la misma transacción que bloquea las filas.
+    :return: Lista con un reporte por usuario eliminado.
+    """
+    with transaction.atomic():
+        return eliminar_usuarios(ids_por_filtro(filtro))
@@ -0,0 +1,106 @@
+"""
+Caché de las respuestas del listado de usuarios.
+
+Las entradas se guardan bajo una clave que incluye un contador de versión de la
+tabla de usuarios y los parámetros de la petición. Cualquier escritura sobre
+``User`` incrementa la versión (ver ``users.signals``), por lo que las entradas
+anteriores dejan de usarse sin tener que buscarlas ni borrarlas.
+
+Con ``LocMemCache`` la versión vive en cada proceso: para varios workers se debe
+configurar un backend compartido (``CACHE_BACKEND``) para que la invalidación
+llegue a todos.
+
+Las respuestas leídas de la réplica pueden ir atrasadas respecto a la versión: se
+guardan aparte y solo ``DB_REPLICA_MAX_LAG`` segundos, y no llevan ``ETag``.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.http import parse_etags, urlencode
+
+from .routers import alias_lectura
+
+CLAVE_VERSION = 'users:list:version'
+
+
+def obtener_version():
+    """
+    Versión actual de la tabla de usuarios.
+    """
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        # Se parte de un valor basado en el reloj para no reutilizar entradas de
+        # una versión anterior si el contador fue desalojado de la caché
+        cache.add(CLAVE_VERSION, time.time_ns(), timeout=None)
+        version = cache.get(CLAVE_VERSION, 0)
+    return version
+
+
+def incrementar_version():
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        cache.add(CLAVE_VERSION, time.time_ns(), timeout=None)
+
+
+def invalidar_listado():
+    """
+    Invalida las respuestas en caché del listado de usuarios.
+
+    La versión se incrementa de inmediato (para las lecturas dentro de la misma
+    transacción) y otra vez al confirmar la transacción, para descartar lo que otra
+    petición haya guardado mientras la escritura aún no era visible.
+    """
+    incrementar_version()
+    transaction.on_commit(incrementar_version)
+
+
+class CacheListadoUsuarios:
+    """
+    Entrada de caché y ``ETag`` del listado de usuarios para una petición.
+    """
+    def __init__(self, request, version=None):
+        """
+        :param version: Versión ya leída con ``obtener_version`` (las vistas
+            asíncronas la leen fuera del event loop).
+        """
+        self.request = request
+        self.version = obtener_version() if version is None else version
+        parametros = urlencode(sorted(request.GET.lists()), doseq=True)
+        huella = hashlib.sha1(parametros.encode('utf-8')).hexdigest()
+        self.replica = alias_lectura() != DEFAULT_DB_ALIAS
+        self.clave = f"users:list:{self.version}:{huella}{':replica' if self.replica else ''}"
+        self.etag = f'"{self.version}-{huella[:16]}"'
+
+    def no_modificado(self):
+        """
+        True si el cliente ya tiene esta versión (``If-None-Match``).
+        """
+        if self.replica:
+            return False
+        # Comparación débil: CompresionMiddleware envía el ETag como W/"..."
+        etags = [etag.removeprefix('W/') for etag in parse_etags(self.request.headers.get('If-None-Match', ''))]
+        return '*' in etags or self.etag in etags
+
+    def obtener(self):
+        return cache.get(self.clave)
+
+    async def aobtener(self):
+        return await cache.aget(self.clave)
+
+    def guardar(self, data):
+        timeout = settings.DB_REPLICA_MAX_LAG if self.replica else settings.USERS_LIST_CACHE_TIMEOUT
+        cache.set(self.clave, data, timeout)
+
+    async def aguardar(self, data):
+        timeout = settings.DB_REPLICA_MAX_LAG if self.replica else settings.USERS_LIST_CACHE_TIMEOUT
+        await cache.aset(self.clave, data, timeout)
+
+    def headers(self):
+        # Respuesta privada (requiere autenticación) que se revalida en cada uso
+        if self.replica:
+            return {'Cache-Control': 'private, no-cache'}
+        return {'ETag': self.etag, 'Cache-Control': 'private, no-cache'}
@@ -0,0 +1,354 @@
+"""
+Directorio de usuarios en memoria: modelo de lectura del listado.
+
+Con ``USERS_DIRECTORY`` cada proceso guarda los seis campos públicos de todos los
+usuarios en columnas compactas (``array`` para ids y fechas, listas de cadenas
+para el resto). Las columnas se ordenan por ``(date_joined, id)``, el orden de la
+paginación. El listado, los filtros y la paginación por cursor se resuelven sin
+consultar la base de datos:
+
+- ``joined_after`` / ``joined_before`` y el cursor se resuelven con búsqueda binaria sobre las fechas.
+- ``is_active`` salta entre las filas con ``bytearray.find``.
+- ``email`` y ``search`` se evalúan recorriendo desde esa posición hasta llenar la página.
+
+El directorio no se recarga completo. Se refresca con la misma marca que la
+sincronización incremental, con su misma condición sobre la duración de las
+transacciones (ver ``users.sincronizacion``): los usuarios con ``updated_at`` posterior a la marca y
+las bajas de ``UserTombstone``. El refresco ocurre en la siguiente lectura cuando
+cambia la versión del listado (``users.cache``) o cuando pasan
+``USERS_DIRECTORY_MAX_AGE`` segundos, lo que cubre las escrituras de otros procesos
+con una caché local. Cada refresco arma columnas nuevas y las publica de una
+vez, así que las lecturas concurrentes nunca ven un estado a medias.
+
+Las mayúsculas se comparan con ``str.lower()``, que convierte todo Unicode.
+El ``lower()`` de SQLite solo convierte ASCII.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import obtener_version
+from .models import User, UserTombstone
+from .routers import lecturas_en_replica
+
+EPOCA = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSEGUNDO = timedelta(microseconds=1)
+
+# Campos que se leen de la base de datos, en el orden de ``Columnas.agregar``
+CAMPOS_CONSULTA = ('id', 'date_joined', 'is_active', 'email', 'first_name', 'last_name', 'phone')
+
+# A partir de cuántos cambios conviene reordenar todo en lugar de insertar uno por uno
+CAMBIOS_REORDENAR = 256
+
+
+def a_microsegundos(fecha):
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return (fecha - EPOCA) // MICROSEGUNDO
+
+
+def desde_microsegundos(valor):
+    return EPOCA + timedelta(microseconds=valor)
+
+
+def _despues_de(queryset, campo, posicion):
+    fecha, id = posicion
+    # ``__gte`` repite la cota fuera del OR para que la consulta use el índice del campo
+    return queryset.filter(
+        Q(**{f'{campo}__gt': fecha}) | Q(**{campo: fecha, 'id__gt': id}), **{f'{campo}__gte': fecha}
+    )
+
+
+def _avanzar(marca, ultima, limite):
+    # La marca no pasa de ``limite``: los cambios recientes se vuelven a leer en el
+    # siguiente refresco (aplicarlos otra vez no altera nada) por si había
+    # transacciones sin confirmar con un ``updated_at`` anterior
+    tope = (limite, 0)
+    return max(marca, min(ultima, tope) if ultima else tope)
+
+
+class Columnas:
+    """
+    Usuarios del directorio ordenados por ``(date_joined, id)``, un arreglo por campo.
+    """
+    __slots__ = ('ids', 'fechas', 'activos', 'email', 'first_name', 'last_name', 'phone')
+
+    def __init__(self):
+        self.ids = array('q')
+        self.fechas = array('q')  # date_joined en microsegundos desde 1970 (UTC)
+        self.activos = bytearray()
+        self.email = []
+        self.first_name = []
+        self.last_name = []
+        self.phone = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def copia(self):
+        nuevas = Columnas()
+        for campo in self.__slots__:
+            setattr(nuevas, campo, getattr(self, campo)[:])
+        return nuevas
+
+    def agregar(self, fila):
+        """
+        :param fila: Tupla con los valores de ``CAMPOS_CONSULTA``.
+        """
+        id, date_joined, is_active, email, first_name, last_name, phone = fila
+        self.ids.append(id)
+        self.fechas.append(a_microsegundos(date_joined))
+        self.activos.append(is_active)
+        self.email.append(email)
+        self.first_name.append(first_name)
+        self.last_name.append(last_name)
+        self.phone.append(phone)
+
+    def insertar(self, posicion, fila):
+        id, date_joined, is_active, email, first_name, last_name, phone = fila
+        self.ids.insert(posicion, id)
+        self.fechas.insert(posicion, a_microsegundos(date_joined))
+        self.activos.insert(posicion, is_active)
+        self.email.insert(posicion, email)
+        self.first_name.insert(posicion, first_name)
+        self.last_name.insert(posicion, last_name)
+        self.phone.insert(posicion, phone)
+
+    def eliminar(self, posiciones):
+        """
+        Quita las filas de las posiciones indicadas (ordenadas de menor a mayor).
+        """
+        if len(posiciones) < CAMBIOS_REORDENAR:
+            for posicion in reversed(posiciones):
+                for campo in self.__slots__:
+                    del getattr(self, campo)[posicion]
+            return
+        quitar = set(posiciones)
+        self._reordenar([k for k in range(len(self.ids)) if k not in quitar])
+
+    def ordenar(self):
+        ids, fechas = self.ids, self.fechas
+        self._reordenar(sorted(range(len(ids)), key=lambda k: (fechas[k], ids[k])))
+
+    def _reordenar(self, orden):
+        # Construye cada columna con las filas de ``orden`` (permite quitar filas)
+        self.ids = array('q', [self.ids[k] for k in orden])
+        self.fechas = array('q', [self.fechas[k] for k in orden])
+        self.activos = bytearray(self.activos[k] for k in orden)
+        for campo in ('email', 'first_name', 'last_name', 'phone'):
+            columna = getattr(self, campo)
+            setattr(self, campo, [columna[k] for k in orden])
+
+    def despues_de(self, fecha, id):
+        """
+        Primera posición con ``(date_joined, id)`` mayor que la indicada.
+        """
+        posicion = bisect_left(self.fechas, fecha)
+        while posicion < len(self.ids) and self.fechas[posicion] == fecha and self.ids[posicion] <= id:
+            posicion += 1
+        return posicion
+
+    def antes_de(self, fecha, id):
+        """
+        Primera posición con ``(date_joined, id)`` mayor o igual que la indicada: las
+        anteriores son las menores.
+        """
+        posicion = bisect_left(self.fechas, fecha)
+        while posicion < len(self.ids) and self.fechas[posicion] == fecha and self.ids[posicion] < id:
+            posicion += 1
+        return posicion
+
+
+class DirectorioUsuarios:
+    """
+    Directorio en memoria del proceso, cargado en la primera lectura.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        """
+        Descarta el directorio; la siguiente lectura lo vuelve a cargar.
+        """
+        self._columnas = None
+        self.version = None
+        self.refrescado = 0.0
+        self.max_id = 0
+        self.marca_usuarios = None
+        self.marca_bajas = None
+
+    def _limite(self):
+        # Lo anterior a ``ahora - USERS_SYNC_LAG`` ya está confirmado (ver users.sincronizacion)
+        return timezone.now() - timedelta(seconds=settings.USERS_SYNC_LAG)
+
+    def _vencido(self):
+        return (
+            self._columnas is None
+            or obtener_version() != self.version
+            or time.monotonic() - self.refrescado > settings.USERS_DIRECTORY_MAX_AGE
+        )
+
+    def columnas(self):
+        """
+        Columnas vigentes: carga o refresca el directorio si hace falta.
+        """
+        if self._vencido():
+            with self._lock:
+                # Otro hilo pudo refrescar mientras se esperaba el lock
+                if self._columnas is None:
+                    self.cargar()
+                elif self._vencido():
+                    self.refrescar()
+        return self._columnas
+
+    def cargar(self):
+        """
+        Lee todos los usuarios de la base de datos principal.
+        """
+        version = obtener_version()
+        limite = self._limite()
+        columnas = Columnas()
+        with lecturas_en_replica(False):
+            filas = User.objects.order_by('date_joined', 'id').values_list(*CAMPOS_CONSULTA)
+            for fila in filas.iterator(chunk_size=5000):
+                columnas.agregar(fila)
+        # Lo cambiado después de ``limite`` se vuelve a leer en el primer refresco
+        self.marca_usuarios = self.marca_bajas = (limite, 0)
+        self.max_id = max(columnas.ids, default=0)
+        self._publicar(columnas, version)
+
+    def refrescar(self):
+        """
+        Aplica los usuarios cambiados y las bajas posteriores a las marcas.
+        :return: Tupla (usuarios cambiados, bajas aplicadas).
+        """
+        version = obtener_version()
+        limite = self._limite()
+        with lecturas_en_replica(False):
+            cambios = list(
+                _despues_de(User.objects.all(), 'updated_at', self.marca_usuarios)
+                .order_by('updated_at', 'id').values_list('updated_at', *CAMPOS_CONSULTA)
+            )
+            # Las bajas se leen después: un usuario borrado entre las dos consultas no se queda
+            bajas = list(
+                _despues_de(UserTombstone.objects.all(), 'deleted_at', self.marca_bajas)
+                .order_by('deleted_at', 'id').values_list('deleted_at', 'id', 'user_id')
+            )
+
+        eliminados = {user_id for _, _, user_id in bajas}
+        filas = [fila[1:] for fila in cambios if fila[1] not in eliminados]
+        columnas = self._columnas
+        if filas or eliminados:
+            columnas = columnas.copia()
+            # Los usuarios nuevos tienen ids mayores que todos los cargados: no hay que buscarlos
+            afectados = {fila[0] for fila in filas if fila[0] <= self.max_id} | eliminados
+            if afectados:
+                columnas.eliminar([k for k, id in enumerate(columnas.ids) if id in afectados])
+            if len(filas) >= CAMBIOS_REORDENAR:
+                for fila in filas:
+                    columnas.agregar(fila)
+                columnas.ordenar()
+            else:
+                for fila in filas:
+                    columnas.insertar(columnas.despues_de(a_microsegundos(fila[1]), fila[0]), fila)
+            self.max_id = max(self.max_id, max((fila[0] for fila in filas), default=0))
+
+        self.marca_usuarios = _avanzar(self.marca_usuarios, cambios[-1][:2] if cambios else None, limite)
+        self.marca_bajas = _avanzar(self.marca_bajas, bajas[-1][:2] if bajas else None, limite)
+        self._publicar(columnas, version)
+        return len(filas), len(eliminados)
+
+    def _publicar(self, columnas, version):
+        self._columnas = columnas
+        self.version = version
+        self.refrescado = time.monotonic()
+
+    def filas(self, filtros, paginacion, campos):
+        """
+        Equivalente en memoria de evaluar
+        ``paginacion.get_queryset(aplicar_filtros(User.objects.values(*campos), filtros))``.
+        :param filtros: Filtros normalizados por ``users.filters.leer_filtros``.
+        :param paginacion: ``UserCursorPagination`` de la petición.
+        :param campos: Campos de cada fila (ver ``FastUserListSerializer.columnas``).
+        :return: Lista de diccionarios como los de ``values()``, en el orden de la consulta.
+        """
+        c = self.columnas()
+        inicio, fin = 0, len(c)
+        # Las fechas están ordenadas: el rango de fechas es un rango de posiciones
+        if filtros['desde']:
+            inicio = bisect_left(c.fechas, a_microsegundos(filtros['desde']))
+        if filtros['hasta']:
+            hasta = a_microsegundos(filtros['hasta'])
+            fin = bisect_right(c.fechas, hasta) if filtros['hasta_inclusivo'] else bisect_left(c.fechas, hasta)
+
+        if paginacion.posicion:
+            date_joined, id, reverso = paginacion.posicion
+            if reverso:
+                fin = min(fin, c.antes_de(a_microsegundos(date_joined), id))
+            else:
+                inicio = max(inicio, c.despues_de(a_microsegundos(date_joined), id))
+
+        cumple = self._condiciones(c, filtros)
+        limite = paginacion.page_size + 1
+        encontradas = []
+        for k in self._posiciones(c, inicio, fin, filtros['is_active'], paginacion.reverso):
+            if all(condicion(k) for condicion in cumple):
+                encontradas.append(k)
+                if len(encontradas) == limite:
+                    break
+        return [self._fila(c, k, campos) for k in encontradas]
+
+    @staticmethod
+    def _posiciones(c, inicio, fin, is_active, reverso):
+        """
+        Posiciones entre ``inicio`` y ``fin`` en el orden de la consulta. Con
+        ``is_active`` salta directo a las filas con ese valor (``bytearray.find``).
+        """
+        if is_active is None:
+            yield from (range(fin - 1, inicio - 1, -1) if reverso else range(inicio, fin))
+            return
+        valor = int(is_active)
+        if reverso:
+            k = c.activos.rfind(valor, inicio, fin)
+            while k != -1:
+                yield k
+                k = c.activos.rfind(valor, inicio, k)
+        else:
+            k = c.activos.find(valor, inicio, fin)
+            while k != -1:
+                yield k
+                k = c.activos.find(valor, k + 1, fin)
+
+    @staticmethod
+    def _condiciones(c, filtros):
+        condiciones = []
+        email = filtros['email']
+        if email:
+            condiciones.append(lambda k: c.email[k].lower().startswith(email))
+        for termino in filtros['terminos']:
+            condiciones.append(
+                lambda k, termino=termino: termino in c.first_name[k].lower() or termino in c.last_name[k].lower()
+            )
+        return condiciones
+
+    @staticmethod
+    def _fila(c, k, campos):
+        fila = {}
+        for campo in campos:
+            if campo == 'date_joined':
+                fila[campo] = desde_microsegundos(c.fechas[k])
+            elif campo == 'id':
+                fila[campo] = c.ids[k]
+            else:
+                fila[campo] = getattr(c, campo)[k]
+        return fila
+
+
+directorio = DirectorioUsuarios()
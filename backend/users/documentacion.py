@@ -0,0 +1,73 @@
+"""
+Documentación de la API como componente opcional y de carga diferida.
+
+drf_yasg y sus objetos ``openapi`` solo se necesitan al generar el esquema, pero
+``swagger_auto_schema`` obliga a importarlos y a construir los parámetros al
+cargar las vistas, en cada worker y en cada ``manage.py``. ``documentar`` recibe
+una función que arma esos argumentos y solo la llama cuando se genera el esquema;
+las rutas de ``/swagger/`` y ``/redoc/`` importan drf_yasg en su primera
+petición. Con ``API_DOCS_ENABLED=False`` no se registran las rutas ni la app y
+drf_yasg nunca se importa.
+"""
+import importlib
+import threading
+
+_pendientes = []
+_pendientes_lock = threading.Lock()
+
+
+class _ModuloDiferido:
+    """
+    Importa el módulo al acceder al primer atributo.
+    """
+    def __init__(self, nombre):
+        self._nombre = nombre
+
+    def __getattr__(self, atributo):
+        return getattr(importlib.import_module(self._nombre), atributo)
+
+
+# Sustituto de ``from drf_yasg import openapi`` para usar dentro de ``documentar``
+openapi = _ModuloDiferido('drf_yasg.openapi')
+
+
+def documentar(argumentos):
+    """
+    Versión diferida de ``swagger_auto_schema`` para métodos de vistas.
+    :param argumentos: Función sin parámetros que devuelve el diccionario de
+        argumentos de ``swagger_auto_schema``. Se evalúa al generar el esquema.
+    """
+    def decorador(metodo):
+        with _pendientes_lock:
+            _pendientes.append((metodo, argumentos))
+        return metodo
+    return decorador
+
+
+def aplicar_documentacion():
+    """
+    Aplica ``swagger_auto_schema`` a los métodos registrados con ``documentar``.
+    Las vistas ya deben estar importadas (ver ``users.esquema``).
+    """
+    from drf_yasg.utils import swagger_auto_schema
+
+    with _pendientes_lock:
+        while _pendientes:
+            metodo, argumentos = _pendientes.pop(0)
+            swagger_auto_schema(**argumentos())(metodo)
+
+
+def vista_documentacion(nombre):
+    """
+    Vista de la documentación que importa drf_yasg en su primera petición.
+    :param nombre: ``json``, ``swagger`` o ``redoc`` (ver ``users.esquema.VISTAS``).
+    """
+    vista = None
+
+    def diferida(request, *args, **kwargs):
+        nonlocal vista
+        if vista is None:
+            from .esquema import VISTAS
+            vista = VISTAS[nombre]
+        return vista(request, *args, **kwargs)
+    return diferida
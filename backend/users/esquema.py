@@ -0,0 +1,160 @@
+"""
+Esquema OpenAPI precalculado para ``/swagger/`` y ``/redoc/``.
+
+drf_yasg recorre todas las vistas y serializers en cada petición al esquema. Con
+``API_SCHEMA_PRECOMPUTED`` el esquema se genera una sola vez por proceso (o se
+lee de ``API_SCHEMA_FILE``, escrito por el comando ``generar_esquema``) y se sirve
+desde memoria con ``ETag``, ``Last-Modified`` y una copia ya comprimida con gzip.
+
+``generar_esquema --check`` compara el archivo con el esquema de las vistas
+actuales; los tests lo ejecutan para que el archivo no quede desactualizado.
+"""
+import gzip
+import hashlib
+import os
+import re
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.urls import get_resolver
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from drf_yasg import openapi
+from drf_yasg.app_settings import swagger_settings
+from drf_yasg.codecs import OpenAPICodecJson
+from drf_yasg.views import get_schema_view
+from rest_framework import permissions
+
+from .documentacion import aplicar_documentacion
+
+INFO_API = openapi.Info(
+    title="API Documentation",
+    default_version='v1',
+    description="API description",
+)
+
+# Formatos de drf_yasg que devuelven el esquema en JSON
+FORMATOS_JSON = ('openapi', 'json')
+
+_acepta_gzip = re.compile(r'\bgzip\b')
+
+_esquema = None
+_esquema_lock = threading.Lock()
+
+
+def cargar_documentacion():
+    """
+    Importa las vistas (al cargar las URLs) y aplica su documentación diferida.
+    """
+    get_resolver().url_patterns
+    aplicar_documentacion()
+
+
+def generar_esquema():
+    """
+    Genera el esquema OpenAPI de las vistas actuales.
+
+    Se genera sin petición, así que no incluye ``host`` ni ``schemes``: la
+    interfaz usa los de la página que la carga.
+    :return: JSON del esquema en bytes.
+    """
+    cargar_documentacion()
+    generador = swagger_settings.DEFAULT_GENERATOR_CLASS(INFO_API)
+    esquema = generador.get_schema(request=None, public=True)
+    return OpenAPICodecJson(validators=[], pretty=True).encode(esquema)
+
+
+class EsquemaPrecalculado:
+    """
+    Esquema en memoria con su copia comprimida y sus validadores HTTP.
+    """
+    def __init__(self, contenido, modificado):
+        """
+        :param contenido: JSON del esquema en bytes.
+        :param modificado: Timestamp de generación (``Last-Modified``).
+        """
+        self.contenido = contenido
+        self.comprimido = gzip.compress(contenido, compresslevel=9, mtime=0)
+        self.etag = '"%s"' % hashlib.sha256(contenido).hexdigest()[:32]
+        self.modificado = int(modificado)
+
+
+def obtener_esquema():
+    """
+    Esquema del proceso: el de ``API_SCHEMA_FILE`` si existe o uno generado en la
+    primera llamada.
+    """
+    global _esquema
+    if _esquema is None:
+        with _esquema_lock:
+            if _esquema is None:
+                ruta = settings.API_SCHEMA_FILE
+                if ruta and os.path.exists(ruta):
+                    with open(ruta, 'rb') as archivo:
+                        _esquema = EsquemaPrecalculado(archivo.read(), os.path.getmtime(ruta))
+                else:
+                    _esquema = EsquemaPrecalculado(generar_esquema(), time.time())
+    return _esquema
+
+
+def reiniciar_esquema():
+    """
+    Descarta el esquema en memoria (se vuelve a cargar en la siguiente petición).
+    """
+    global _esquema
+    with _esquema_lock:
+        _esquema = None
+
+
+@require_safe
+def esquema_openapi(request):
+    """
+    Sirve el esquema precalculado: 304 si el cliente ya lo tiene y gzip si lo acepta.
+    """
+    esquema = obtener_esquema()
+    response = get_conditional_response(request, etag=esquema.etag, last_modified=esquema.modificado)
+    if response is None:
+        if _acepta_gzip.search(request.headers.get('Accept-Encoding', '')):
+            response = HttpResponse(esquema.comprimido, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(esquema.contenido, content_type='application/json')
+    response['ETag'] = esquema.etag
+    response['Last-Modified'] = http_date(esquema.modificado)
+    # El cliente puede guardarlo pero debe revalidar: un 304 no cuesta nada
+    patch_cache_control(response, public=True, no_cache=True)
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+def con_esquema_precalculado(vista):
+    """
+    Envuelve una vista de ``schema_view.with_ui``: la interfaz pide el esquema a su
+    propia URL con ``?format=openapi`` y esa petición se responde desde memoria.
+    """
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        if settings.API_SCHEMA_PRECOMPUTED and request.GET.get('format') in FORMATOS_JSON:
+            return esquema_openapi(request)
+        return vista(request, *args, **kwargs)
+    return envoltura
+
+
+schema_view = get_schema_view(
+    INFO_API,
+    public=True,
+    permission_classes=(permissions.AllowAny,),
+)
+
+cargar_documentacion()
+
+# Vistas reales detrás de ``users.documentacion.vista_documentacion``
+VISTAS = {
+    'json': esquema_openapi,
+    'swagger': con_esquema_precalculado(schema_view.with_ui('swagger', cache_timeout=0)),
+    'redoc': con_esquema_precalculado(schema_view.with_ui('redoc', cache_timeout=0)),
+}
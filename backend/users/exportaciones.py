@@ -0,0 +1,216 @@
+"""
+Exportaciones de usuarios en segundo plano.
+
+Una exportación grande no se genera dentro de la petición: se registra un
+``ExportJob`` y un pool de hilos del proceso lo ejecuta, escribiendo el CSV
+comprimido con gzip en ``USERS_EXPORT_DIR``. El cliente consulta el avance y
+descarga el archivo cuando está listo (con ``Range`` para reanudar descargas).
+
+Cada trabajo pertenece al usuario que lo pidió: solo él consulta su estado y
+descarga el archivo. Dos solicitudes del mismo usuario con los mismos parámetros
+mientras un trabajo sigue activo comparten ese trabajo (restricción única parcial
+sobre ``fingerprint``).
+
+Los trabajos que quedan pendientes o se interrumpen al reiniciar el proceso los
+retoma el comando ``procesar_exportaciones``.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .filters import campos_solicitados, filtrar_usuarios
+from .models import ExportJob, User
+from .utils import CSV_COLUMNAS, iterar_users_csv
+
+logger = logging.getLogger(__name__)
+
+# Parámetros de la petición que se guardan como filtros del trabajo
+PARAMETROS_FILTRO = ('email', 'search', 'joined_after', 'joined_before', 'is_active')
+
+# Nivel de gzip: el 6 comprime casi igual que el 9 con bastante menos CPU
+NIVEL_GZIP = 6
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def parametros_exportacion(params):
+    """
+    Normaliza y valida los parámetros de una exportación.
+    :param params: Parámetros de la query (``request.GET``).
+    :return: Diccionario serializable con ``fields`` y ``filtros``.
+    :raises FiltroInvalido: Si algún campo o filtro no es válido.
+    """
+    columnas = campos_solicitados(params, CSV_COLUMNAS)
+    filtros = {
+        nombre: params[nombre].strip()
+        for nombre in PARAMETROS_FILTRO
+        if params.get(nombre, '').strip()
+    }
+    # Se construye la consulta solo para validar los valores (no se ejecuta)
+    filtrar_usuarios(User.objects.all(), filtros)
+    return {"fields": list(columnas), "filtros": filtros}
+
+
+def huella(params, usuario=None):
+    """
+    Identificador de una exportación de un usuario: el mismo para cualquier orden
+    de los filtros y distinto para cada usuario, que no comparte sus trabajos.
+    """
+    canonico = json.dumps(
+        {"params": params, "usuario": usuario.pk if usuario else None},
+        sort_keys=True, separators=(',', ':'),
+    )
+    return hashlib.sha256(canonico.encode('utf-8')).hexdigest()
+
+
+def ruta_archivo(job):
+    return os.path.join(settings.USERS_EXPORT_DIR, f'{job.id.hex}.csv.gz')
+
+
+def solicitar_exportacion(params, usuario=None):
+    """
+    Registra una exportación o devuelve el trabajo activo del mismo usuario con
+    los mismos parámetros.
+    :param params: Parámetros normalizados (ver ``parametros_exportacion``).
+    :param usuario: Usuario que pide la exportación.
+    :return: Tupla (ExportJob, True si se creó un trabajo nuevo).
+    """
+    limpiar_exportaciones()
+    fingerprint = huella(params, usuario)
+    for _ in range(3):
+        job = ExportJob.objects.filter(fingerprint=fingerprint, status__in=ExportJob.ACTIVE_STATUSES).first()
+        if job is not None:
+            return job, False
+        try:
+            with transaction.atomic():
+                job = ExportJob.objects.create(fingerprint=fingerprint, params=params, requested_by=usuario)
+        except IntegrityError:
+            # Otra petición creó el mismo trabajo entre la consulta y el INSERT
+            continue
+        break
+    else:
+        raise RuntimeError("No se pudo registrar la exportación")
+
+    if settings.USERS_EXPORT_SYNC:
+        ejecutar_exportacion(job.id)
+        job.refresh_from_db()
+    else:
+        transaction.on_commit(lambda: encolar(job.id))
+    return job, True
+
+
+def _obtener_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=settings.USERS_EXPORT_WORKERS, thread_name_prefix='exportacion'
+            )
+        return _pool
+
+
+def encolar(job_id):
+    """
+    Envía un trabajo al pool de hilos del proceso.
+    """
+    _obtener_pool().submit(_ejecutar_en_hilo, job_id)
+
+
+def _ejecutar_en_hilo(job_id):
+    try:
+        ejecutar_exportacion(job_id)
+    finally:
+        # Cada hilo abre su propia conexión; se cierra al terminar el trabajo
+        connection.close()
+
+
+def ejecutar_exportacion(job_id):
+    """
+    Genera el archivo de un trabajo pendiente.
+
+    El trabajo se toma con un UPDATE condicionado al estado, así que si dos
+    procesos intentan ejecutarlo solo uno lo consigue. El CSV se escribe en un
+    archivo temporal que se renombra al terminar: nunca se descarga un archivo a
+    medias.
+    :param job_id: Id del ExportJob.
+    :return: True si el trabajo se ejecutó en esta llamada.
+    """
+    ahora = timezone.now()
+    tomado = ExportJob.objects.filter(id=job_id, status=ExportJob.PENDING).update(
+        status=ExportJob.RUNNING, progress=0, updated_at=ahora
+    )
+    if not tomado:
+        return False
+
+    job = ExportJob.objects.get(id=job_id)
+    ruta = ruta_archivo(job)
+    temporal = f'{ruta}.tmp'
+    try:
+        users = filtrar_usuarios(User.objects.all(), job.params.get('filtros', {}))
+        ExportJob.objects.filter(id=job_id).update(total=users.count(), updated_at=timezone.now())
+
+        def al_avanzar(total):
+            ExportJob.objects.filter(id=job_id).update(progress=total, updated_at=timezone.now())
+
+        os.makedirs(settings.USERS_EXPORT_DIR, exist_ok=True)
+        columnas = job.params.get('fields') or CSV_COLUMNAS
+        with gzip.open(temporal, 'wt', encoding='utf-8', newline='', compresslevel=NIVEL_GZIP) as archivo:
+            for bloque in iterar_users_csv(users, columnas=columnas, al_avanzar=al_avanzar):
+                archivo.write(bloque)
+        os.replace(temporal, ruta)
+    except Exception as e:
+        logger.exception("Falló la exportación %s", job_id)
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        ExportJob.objects.filter(id=job_id).update(
+            status=ExportJob.FAILED, error=str(e), finished_at=timezone.now(), updated_at=timezone.now()
+        )
+        return True
+
+    ExportJob.objects.filter(id=job_id).update(
+        status=ExportJob.DONE, file_path=ruta, size=os.path.getsize(ruta),
+        finished_at=timezone.now(), updated_at=timezone.now()
+    )
+    return True
+
+
+def reiniciar_interrumpidas(segundos):
+    """
+    Devuelve a pendientes los trabajos en ejecución que no avanzan desde hace
+    ``segundos`` (el proceso que los ejecutaba terminó).
+    :return: Número de trabajos reiniciados.
+    """
+    limite = timezone.now() - timedelta(seconds=segundos)
+    return ExportJob.objects.filter(status=ExportJob.RUNNING, updated_at__lt=limite).update(
+        status=ExportJob.PENDING, progress=0, updated_at=timezone.now()
+    )
+
+
+def limpiar_exportaciones():
+    """
+    Borra los trabajos terminados hace más de ``USERS_EXPORT_TTL`` segundos y sus archivos.
+    :return: Número de trabajos borrados.
+    """
+    limite = timezone.now() - timedelta(seconds=settings.USERS_EXPORT_TTL)
+    vencidos = list(ExportJob.objects.filter(
+        status__in=[ExportJob.DONE, ExportJob.FAILED], finished_at__lt=limite
+    ).values_list('id', 'file_path'))
+    for _, ruta in vencidos:
+        if ruta:
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+    if vencidos:
+        ExportJob.objects.filter(id__in=[id for id, _ in vencidos]).delete()
+    return len(vencidos)
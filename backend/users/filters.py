@@ -0,0 +1,176 @@
+"""
+Filtros del listado de usuarios.
+
+Cada filtro está pensado para resolverse con un índice (ver ``User.Meta.indexes`` y
+la migración ``0003``):
+
+- ``email``: prefijo del correo sin distinguir mayúsculas sobre el índice
+  funcional ``lower(email)``. En PostgreSQL el índice usa ``varchar_pattern_ops``
+  (migración ``0007``) y resuelve ``LIKE 'prefijo%'`` con cualquier intercalación;
+  en SQLite ``LIKE`` no usa índices y se agrega un rango, que con la intercalación
+  binaria de SQLite contiene exactamente los correos con ese prefijo.
+- ``search``: texto contenido en el nombre o los apellidos sin distinguir
+  mayúsculas. En PostgreSQL usa los índices trigram (``pg_trgm``) sobre
+  ``lower(first_name)`` y ``lower(last_name)``; en SQLite se recorren los nombres
+  de las filas que dejan los demás filtros (y ``lower()`` solo convierte ASCII).
+- ``joined_after`` / ``joined_before``: rango de ``date_joined`` (fecha o fecha y
+  hora ISO 8601) sobre el índice ``(date_joined, id)``.
+- ``is_active``: ``true`` o ``false``, con el índice ``(is_active, date_joined, id)``
+  que además conserva el orden de la paginación.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+VALORES_BOOLEANOS = {
+    'true': True, '1': True,
+    'false': False, '0': False,
+}
+
+
+class FiltroInvalido(ValueError):
+    """Un parámetro de filtrado tiene un valor inválido."""
+
+
+def _siguiente_prefijo(prefijo):
+    # Menor cadena mayor que todas las que empiezan con ``prefijo``
+    return prefijo[:-1] + chr(ord(prefijo[-1]) + 1)
+
+
+def _fecha(parametro, valor, fin_del_dia=False):
+    """
+    Interpreta una fecha o fecha y hora ISO 8601.
+    :param fin_del_dia: Si el valor es solo una fecha, devuelve el inicio del día siguiente.
+    :return: Tupla (datetime con zona horaria, True si el valor era solo una fecha).
+    """
+    try:
+        # parse_datetime también acepta fechas sin hora, así que se prueba primero la fecha
+        fecha = parse_date(valor)
+        if fecha is not None:
+            if fin_del_dia:
+                fecha += timedelta(days=1)
+            return timezone.make_aware(datetime.combine(fecha, time.min)), True
+        fecha_hora = parse_datetime(valor)
+        if fecha_hora is None:
+            raise ValueError
+    except ValueError:
+        raise FiltroInvalido(f"{parametro} debe ser una fecha ISO 8601 (AAAA-MM-DD o AAAA-MM-DDTHH:MM:SS)")
+    if timezone.is_naive(fecha_hora):
+        fecha_hora = timezone.make_aware(fecha_hora)
+    return fecha_hora, False
+
+
+def campos_solicitados(params, permitidos):
+    """
+    Lee el parámetro ``fields`` (lista separada por comas) y lo valida contra los
+    campos permitidos.
+    :param params: Parámetros de la query (``request.GET``).
+    :param permitidos: Campos que se pueden pedir, en el orden por defecto.
+    :return: Tupla con los campos pedidos en el orden recibido, sin repetidos, o
+        ``permitidos`` si no se envió ``fields``.
+    :raises FiltroInvalido: Si se pide un campo fuera de ``permitidos``.
+    """
+    valor = params.get('fields', '')
+    campos = tuple(dict.fromkeys(campo.strip() for campo in valor.split(',') if campo.strip()))
+    if not campos:
+        return tuple(permitidos)
+    desconocidos = [campo for campo in campos if campo not in permitidos]
+    if desconocidos:
+        raise FiltroInvalido(
+            f"Campos no permitidos en fields: {', '.join(desconocidos)}. "
+            f"Campos disponibles: {', '.join(permitidos)}"
+        )
+    return campos
+
+
+def leer_filtros(params):
+    """
+    Valida y normaliza los filtros de la petición.
+    :param params: Parámetros de la query (``request.GET``).
+    :return: Diccionario con ``email`` (prefijo en minúsculas), ``terminos``,
+        ``desde``, ``hasta``, ``hasta_inclusivo`` e ``is_active``; los filtros que no
+        se enviaron quedan en ``None`` (o lista vacía).
+    :raises FiltroInvalido: Si algún valor no es válido.
+    """
+    filtros = {
+        'email': params.get('email', '').strip().lower() or None,
+        'terminos': params.get('search', '').lower().split(),
+        'desde': None,
+        'hasta': None,
+        'hasta_inclusivo': False,
+        'is_active': None,
+    }
+
+    joined_after = params.get('joined_after')
+    if joined_after:
+        filtros['desde'], _ = _fecha('joined_after', joined_after)
+
+    joined_before = params.get('joined_before')
+    if joined_before:
+        filtros['hasta'], solo_fecha = _fecha('joined_before', joined_before, fin_del_dia=True)
+        # Una fecha sin hora incluye todo ese día
+        filtros['hasta_inclusivo'] = not solo_fecha
+
+    is_active = params.get('is_active')
+    if is_active:
+        try:
+            filtros['is_active'] = VALORES_BOOLEANOS[is_active.lower()]
+        except KeyError:
+            raise FiltroInvalido("is_active debe ser true o false")
+
+    return filtros
+
+
+def aplicar_filtros(queryset, filtros):
+    """
+    Aplica filtros normalizados por ``leer_filtros`` al QuerySet de usuarios.
+    """
+    email = filtros['email']
+    if email:
+        queryset = queryset.alias(email_lower=Lower('email')).filter(email_lower__startswith=email)
+        if connections[queryset.db].vendor != 'postgresql':
+            # Con una intercalación lingüística (en_US.UTF-8) el rango dejaría fuera
+            # correos con el prefijo, por eso solo se usa en SQLite
+            queryset = queryset.filter(
+                email_lower__gte=email,
+                email_lower__lt=_siguiente_prefijo(email),
+            )
+
+    if filtros['terminos']:
+        queryset = queryset.alias(first_name_lower=Lower('first_name'), last_name_lower=Lower('last_name'))
+        # Cada término debe aparecer en el nombre o en los apellidos
+        for termino in filtros['terminos']:
+            queryset = queryset.filter(
+                Q(first_name_lower__contains=termino) | Q(last_name_lower__contains=termino)
+            )
+
+    if filtros['desde']:
+        queryset = queryset.filter(date_joined__gte=filtros['desde'])
+
+    if filtros['hasta']:
+        if filtros['hasta_inclusivo']:
+            queryset = queryset.filter(date_joined__lte=filtros['hasta'])
+        else:
+            queryset = queryset.filter(date_joined__lt=filtros['hasta'])
+
+    if filtros['is_active'] is not None:
+        # Con ``is_active=False`` Django genera ``NOT is_active``, que SQLite no
+        # resuelve con el índice; ``IN`` sí se compara contra la columna indexada
+        queryset = queryset.filter(is_active__in=[filtros['is_active']])
+
+    return queryset
+
+
+def filtrar_usuarios(queryset, params):
+    """
+    Aplica los filtros de la petición al QuerySet de usuarios.
+    :param queryset: QuerySet de ``User``.
+    :param params: Parámetros de la query (``request.GET``).
+    :return: QuerySet filtrado, todavía sin evaluar.
+    :raises FiltroInvalido: Si algún valor no es válido.
+    """
+    return aplicar_filtros(queryset, leer_filtros(params))
@@ -0,0 +1,64 @@
+"""
+Hasheo de contraseñas en paralelo.
+
+Este módulo no importa modelos para que los procesos del pool (iniciados con
+``spawn``) puedan cargarlo sin inicializar las aplicaciones de Django.
+"""
+import os
+import secrets
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX, get_hasher, make_password
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _hashear(argumentos):
+    password, algoritmo = argumentos
+    return make_password(password, hasher=algoritmo)
+
+
+def _obtener_pool():
+    """
+    Crea (una sola vez por proceso) el pool de procesos usado para hashear.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = settings.USERS_HASH_WORKERS or os.cpu_count() or 1
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'))
+        return _pool
+
+
+def hashear_passwords(passwords):
+    """
+    Hashea una lista de contraseñas con el hasher por defecto.
+
+    Los lotes pequeños se hashean en el proceso actual; a partir de
+    ``USERS_HASH_POOL_MIN`` contraseñas se reparten en un pool de procesos para
+    usar todos los núcleos.
+    :param passwords: Lista de contraseñas en texto plano.
+    :return: Lista de hashes en el mismo orden.
+    """
+    algoritmo = get_hasher('default').algorithm
+    argumentos = [(password, algoritmo) for password in passwords]
+    workers = settings.USERS_HASH_WORKERS or os.cpu_count() or 1
+
+    if workers <= 1 or len(argumentos) < settings.USERS_HASH_POOL_MIN:
+        return [_hashear(a) for a in argumentos]
+
+    chunksize = max(1, len(argumentos) // (workers * 4))
+    return list(_obtener_pool().map(_hashear, argumentos, chunksize=chunksize))
+
+
+def password_no_utilizable():
+    """
+    Equivale a ``make_password(None)`` (prefijo ``!`` y 40 caracteres aleatorios)
+    pero con ``secrets.token_hex``, que es mucho más rápido que ``get_random_string``
+    al generar miles de usuarios sin contraseña.
+    """
+    return UNUSABLE_PASSWORD_PREFIX + secrets.token_hex(20)
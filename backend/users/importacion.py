@@ -0,0 +1,232 @@
+"""
+Importación de usuarios desde CSV, la operación inversa de ``generar_users_csv``.
+
+El archivo se lee como un flujo: se decodifica por bloques y las filas se validan e
+insertan de ``USERS_BULK_BATCH_SIZE`` en ``USERS_BULK_BATCH_SIZE``, así que la
+memoria usada no depende del tamaño del archivo. Las filas rechazadas se escriben
+en un reporte CSV en disco (``USERS_IMPORT_DIR``) que se descarga aparte. El
+reporte contiene las filas originales (emails, nombres y hasta contraseñas), así
+que el nombre del archivo lleva el id del usuario que importó y solo él lo descarga.
+"""
+import csv
+import io
+import json
+import os
+import time
+import uuid
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.db import transaction
+
+from .bulk import crear_usuarios, validar_filas
+from .models import User
+from .serializers import UserImportSerializer
+from .utils import CSV_COLUMNAS
+
+# Columnas obligatorias y opcionales del archivo (``id`` se ignora: se asignan ids nuevos)
+COLUMNAS_REQUERIDAS = ('email', 'first_name', 'last_name')
+COLUMNAS_PERMITIDAS = frozenset(CSV_COLUMNAS) | {'password'}
+
+# Columnas que se omiten si vienen vacías para que se apliquen los valores por defecto
+COLUMNAS_OPCIONALES = ('password', 'date_joined')
+
+
+class ArchivoInvalido(ValueError):
+    """
+    El archivo no se puede importar (encabezado, codificación o formato CSV).
+    ``resultado`` lleva lo importado antes del error si el archivo resultó inválido
+    a la mitad (los bloques anteriores ya se confirmaron), o None.
+    """
+    def __init__(self, mensaje, resultado=None):
+        super().__init__(mensaje)
+        self.resultado = resultado
+
+
+class FlujoBinario(io.RawIOBase):
+    """
+    Adapta un objeto con ``read(n)`` (por ejemplo ``HttpRequest``) a la interfaz de
+    archivo binario que necesita ``io.TextIOWrapper``, sin leerlo completo.
+    """
+    def __init__(self, origen):
+        self._origen = origen
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        datos = self._origen.read(len(buffer))
+        buffer[:len(datos)] = datos
+        return len(datos)
+
+
+def abrir_texto(origen):
+    """
+    Envuelve un flujo binario para leerlo como texto UTF-8 (con o sin BOM).
+    """
+    if not hasattr(origen, 'readinto'):
+        origen = io.BufferedReader(FlujoBinario(origen))
+    return io.TextIOWrapper(origen, encoding='utf-8-sig', newline='')
+
+
+def ruta_reporte(token, usuario=None):
+    """
+    Ruta del reporte de errores de una importación.
+    :param usuario: Usuario que hizo la importación; el reporte de otro usuario
+        tiene otra ruta y no se encuentra.
+    :return: Ruta absoluta o None si el token no es válido.
+    """
+    try:
+        token = uuid.UUID(token).hex
+    except (TypeError, ValueError):
+        return None
+    nombre = f'{usuario.pk}-{token}.csv' if usuario is not None else f'{token}.csv'
+    return os.path.join(settings.USERS_IMPORT_DIR, nombre)
+
+
+def _limpiar_reportes():
+    # Borra los reportes que ya vencieron
+    limite = time.time() - settings.USERS_IMPORT_REPORT_TTL
+    try:
+        entradas = list(os.scandir(settings.USERS_IMPORT_DIR))
+    except FileNotFoundError:
+        return
+    for entrada in entradas:
+        if entrada.name.endswith('.csv') and entrada.stat().st_mtime < limite:
+            try:
+                os.remove(entrada.path)
+            except FileNotFoundError:
+                pass
+
+
+class ReporteErrores:
+    """
+    CSV con las filas rechazadas: número de línea, columnas originales y errores.
+    El archivo se crea con el primer error, así que una importación sin errores no
+    deja nada en disco.
+    """
+    def __init__(self, columnas, usuario=None):
+        self.columnas = list(columnas)
+        self.usuario = usuario
+        self.token = None
+        self.total = 0
+        self._archivo = None
+        self._writer = None
+
+    def agregar(self, linea, fila, errores):
+        if self._archivo is None:
+            _limpiar_reportes()
+            os.makedirs(settings.USERS_IMPORT_DIR, exist_ok=True)
+            self.token = uuid.uuid4().hex
+            self._archivo = open(ruta_reporte(self.token, self.usuario), 'w', encoding='utf-8', newline='')
+            self._writer = csv.writer(self._archivo)
+            self._writer.writerow(['linea', *self.columnas, 'errores'])
+        valores = [fila.get(columna, '') for columna in self.columnas]
+        self._writer.writerow([linea, *valores, json.dumps(errores, ensure_ascii=False)])
+        self.total += 1
+
+    def cerrar(self):
+        if self._archivo is not None:
+            self._archivo.close()
+
+
+def _leer_bloques(reader, tamano):
+    """
+    Agrupa las filas del CSV en bloques de ``(linea, fila)``.
+    """
+    bloque = []
+    try:
+        for fila in reader:
+            bloque.append((reader.line_num, fila))
+            if len(bloque) >= tamano:
+                yield bloque
+                bloque = []
+    except UnicodeDecodeError:
+        raise ArchivoInvalido(f"El archivo no está en UTF-8 (cerca de la línea {reader.line_num + 1})")
+    except csv.Error as e:
+        raise ArchivoInvalido(f"CSV inválido en la línea {reader.line_num}: {e}")
+    if bloque:
+        yield bloque
+
+
+def _preparar(fila):
+    # Quita las columnas ignoradas y las opcionales vacías
+    datos = {columna: valor for columna, valor in fila.items() if columna in COLUMNAS_PERMITIDAS and columna != 'id'}
+    for columna in COLUMNAS_OPCIONALES:
+        if not datos.get(columna):
+            datos.pop(columna, None)
+    return datos
+
+
+def importar_usuarios_csv(texto, dry_run=False, usuario=None):
+    """
+    Importa usuarios desde un CSV con el encabezado de ``generar_users_csv``.
+
+    Cada bloque se valida con ``validar_filas`` (reglas de ``UserSerializer`` y
+    unicidad del email contra la base de datos con una consulta por bloque) y se
+    inserta con ``crear_usuarios`` (``bulk_create`` dentro de un savepoint). Cada
+    bloque se confirma en su propia transacción, así que si el archivo resulta
+    inválido a la mitad quedan guardados los bloques anteriores (una sola
+    transacción larga rompería la sincronización ``since``, ver
+    ``users.sincronizacion``). Con ``dry_run`` todo el archivo va en una transacción
+    que se revierte al final, de modo que el resultado y el reporte son los mismos
+    que en una importación real.
+    :param texto: Archivo de texto abierto (ver ``abrir_texto``).
+    :param dry_run: Si es True no se guarda ningún usuario.
+    :param usuario: Usuario que importa, dueño del reporte de errores.
+    :return: Diccionario con ``filas``, ``creados``, ``errores`` y ``reporte`` (token
+        del reporte de errores o None).
+    :raises ArchivoInvalido: Si el encabezado o el formato del archivo no son válidos.
+        Si el error aparece a la mitad, su ``resultado`` tiene el mismo diccionario
+        con lo procesado hasta ese punto.
+    """
+    reader = csv.DictReader(texto)
+    try:
+        columnas = reader.fieldnames or []
+    except UnicodeDecodeError:
+        raise ArchivoInvalido("El archivo no está en UTF-8")
+    except csv.Error as e:
+        raise ArchivoInvalido(f"CSV inválido en el encabezado: {e}")
+    faltantes = [columna for columna in COLUMNAS_REQUERIDAS if columna not in columnas]
+    if faltantes:
+        raise ArchivoInvalido(f"Faltan columnas en el encabezado: {', '.join(faltantes)}")
+    desconocidas = [columna for columna in columnas if columna not in COLUMNAS_PERMITIDAS]
+    if desconocidas:
+        raise ArchivoInvalido(f"Columnas desconocidas en el encabezado: {', '.join(desconocidas)}")
+
+    reporte = ReporteErrores(columnas, usuario)
+    filas = creados = 0
+
+    def resultado():
+        return {
+            "filas": filas,
+            "creados": creados,
+            "errores": reporte.total,
+            "reporte": reporte.token,
+        }
+
+    try:
+        with transaction.atomic() if dry_run else nullcontext():
+            for bloque in _leer_bloques(reader, settings.USERS_BULK_BATCH_SIZE):
+                filas += len(bloque)
+                validas, errores = validar_filas(
+                    [_preparar(fila) for _, fila in bloque], serializer_class=UserImportSerializer
+                )
+                for indice, usuario in crear_usuarios(validas).items():
+                    if isinstance(usuario, User):
+                        creados += 1
+                    else:
+                        errores[indice] = usuario
+                for indice in sorted(errores):
+                    linea, fila = bloque[indice]
+                    reporte.agregar(linea, fila, errores[indice])
+            if dry_run:
+                transaction.set_rollback(True)
+    except ArchivoInvalido as e:
+        # Los bloques anteriores ya están guardados: el cliente debe saberlo
+        e.resultado = resultado()
+        raise
+    finally:
+        reporte.cerrar()
+
+    return resultado()
@@ -0,0 +1,92 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+)
+
+from users.benchmarks import ESCENARIOS
+
+PRESUPUESTOS = Path(__file__).resolve().parents[2] / 'benchmark_budgets.json'
+
+
+class Command(BaseCommand):
+    help = (
+        "Ejecuta los benchmarks de la API de usuarios sobre una base de datos de pruebas. "
+        "Escenarios disponibles: " + ", ".join(sorted(ESCENARIOS))
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('escenarios', nargs='*', help='Escenarios a ejecutar (por defecto todos)')
+        parser.add_argument('--filas', nargs='+', type=int, default=[1000],
+                            help='Tamaños de la tabla de usuarios a medir')
+        parser.add_argument('--repeticiones', type=int, default=200,
+                            help='Peticiones u operaciones medidas por caso')
+        parser.add_argument('--concurrencia', type=int, default=8,
+                            help='Peticiones simultáneas en los escenarios de carga')
+        parser.add_argument('--json', action='store_true', help='Imprime los resultados en JSON')
+        parser.add_argument('--keepdb', action='store_true', help='Conserva la base de datos de pruebas')
+        parser.add_argument('--verificar', action='store_true',
+                            help='Falla si algún resultado excede los presupuestos')
+        parser.add_argument('--presupuestos', default=str(PRESUPUESTOS),
+                            help='Archivo JSON con los presupuestos (por defecto users/benchmark_budgets.json)')
+
+    def handle(self, *args, **options):
+        nombres = options['escenarios'] or sorted(ESCENARIOS)
+        desconocidos = [nombre for nombre in nombres if nombre not in ESCENARIOS]
+        if desconocidos:
+            raise CommandError(f"Escenarios desconocidos: {', '.join(desconocidos)}")
+
+        setup_test_environment(debug=False)
+        config_anterior = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        try:
+            resultados = []
+            for nombre in nombres:
+                for resultado in ESCENARIOS[nombre](options):
+                    resultados.append(resultado)
+                    if not options['json']:
+                        self.stdout.write(self._formatear(resultado))
+        finally:
+            teardown_databases(config_anterior, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultados, indent=2))
+
+        if options['verificar']:
+            excedidos = self._verificar(resultados, options['presupuestos'])
+            if excedidos:
+                raise CommandError("Presupuestos excedidos:\n" + "\n".join(excedidos))
+            self.stdout.write(self.style.SUCCESS("Todos los resultados están dentro del presupuesto"))
+
+    def _verificar(self, resultados, ruta):
+        """
+        Compara cada métrica con su máximo para el motor de base de datos actual.
+
+        Un presupuesto ``escenario/caso`` aplica a todos los tamaños y uno
+        ``escenario/caso/filas`` solo a ese tamaño.
+        :return: Lista de mensajes con las métricas excedidas.
+        """
+        with open(ruta, encoding='utf-8') as archivo:
+            presupuestos = json.load(archivo).get(connection.vendor, {})
+
+        excedidos = []
+        for resultado in resultados:
+            base = f"{resultado['escenario']}/{resultado['caso']}"
+            for clave in (base, f"{base}/{resultado['filas']}"):
+                for metrica, maximo in presupuestos.get(clave, {}).items():
+                    valor = resultado.get(metrica)
+                    if valor is not None and valor > maximo:
+                        excedidos.append(
+                            f"{base} filas={resultado['filas']}: {metrica}={valor} (máximo {maximo})"
+                        )
+        return excedidos
+
+    def _formatear(self, resultado):
+        metricas = ' '.join(
+            f'{clave}={valor}' for clave, valor in resultado.items()
+            if clave not in ('escenario', 'caso', 'filas')
+        )
+        return f"{resultado['escenario']:<14} {resultado['caso']:<18} filas={resultado['filas']:<8} {metricas}"
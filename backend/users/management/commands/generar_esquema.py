@@ -0,0 +1,44 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Escribe el esquema OpenAPI precalculado que sirven /swagger/ y /redoc/. "
+        "Con --check solo verifica que el archivo coincida con las vistas actuales."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--archivo', default=None,
+                            help='Ruta del archivo (por defecto API_SCHEMA_FILE)')
+        parser.add_argument('--check', action='store_true',
+                            help='Falla si el archivo no existe o no coincide con el esquema actual')
+
+    def handle(self, *args, **options):
+        if not settings.API_DOCS_ENABLED:
+            raise CommandError("La documentación de la API está desactivada (API_DOCS_ENABLED=False)")
+        from users.esquema import generar_esquema
+
+        ruta = options['archivo'] or settings.API_SCHEMA_FILE
+        if not ruta:
+            raise CommandError("Indica --archivo o define API_SCHEMA_FILE")
+        contenido = generar_esquema()
+
+        if options['check']:
+            try:
+                with open(ruta, 'rb') as archivo:
+                    actual = archivo.read()
+            except FileNotFoundError:
+                raise CommandError(f"No existe {ruta}; ejecuta manage.py generar_esquema")
+            if actual != contenido:
+                raise CommandError(f"{ruta} no coincide con las vistas actuales; ejecuta manage.py generar_esquema")
+            self.stdout.write(self.style.SUCCESS(f"{ruta} está actualizado"))
+            return
+
+        temporal = f'{ruta}.tmp'
+        with open(temporal, 'wb') as archivo:
+            archivo.write(contenido)
+        os.replace(temporal, ruta)
+        self.stdout.write(self.style.SUCCESS(f"Esquema escrito en {ruta} ({len(contenido)} bytes)"))
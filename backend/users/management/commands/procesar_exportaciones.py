@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.exportaciones import ejecutar_exportacion, limpiar_exportaciones, reiniciar_interrumpidas
+from users.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = (
+        "Ejecuta las exportaciones pendientes, retoma las que quedaron interrumpidas "
+        "y borra las vencidas. Con --continuo se queda revisando la tabla de trabajos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interrumpidas', type=int, default=600,
+                            help='Segundos sin avance tras los que un trabajo en ejecución se reinicia')
+        parser.add_argument('--continuo', action='store_true',
+                            help='No terminar: revisar la tabla cada --intervalo segundos')
+        parser.add_argument('--intervalo', type=float, default=5, help='Segundos entre revisiones')
+
+    def handle(self, *args, **options):
+        if options['interrumpidas'] < 1 or options['intervalo'] <= 0:
+            raise CommandError("--interrumpidas y --intervalo deben ser mayores a 0")
+
+        while True:
+            reiniciados = reiniciar_interrumpidas(options['interrumpidas'])
+            if reiniciados:
+                self.stdout.write(f"Se reiniciaron {reiniciados} exportaciones interrumpidas")
+
+            ejecutados = 0
+            pendientes = ExportJob.objects.filter(status=ExportJob.PENDING).order_by('created_at')
+            for job_id in pendientes.values_list('id', flat=True):
+                if ejecutar_exportacion(job_id):
+                    ejecutados += 1
+                    self.stdout.write(f"Exportación {job_id}: {ExportJob.objects.get(id=job_id).status}")
+
+            borrados = limpiar_exportaciones()
+            if ejecutados or borrados or not options['continuo']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Se ejecutaron {ejecutados} exportaciones y se borraron {borrados} vencidas"
+                ))
+            if not options['continuo']:
+                break
+            time.sleep(options['intervalo'])
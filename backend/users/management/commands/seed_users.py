@@ -0,0 +1,54 @@
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import User
+from users.seeding import generar_usuarios, insertar_usuarios
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera usuarios sintéticos para pruebas de carga. Todos comparten un hash de "
+        "contraseña precalculado y se insertan por lotes (COPY en PostgreSQL)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cantidad', '-n', type=int, default=10000, help='Usuarios a generar')
+        parser.add_argument('--dias', type=int, default=365,
+                            help='Rango en días hacia atrás para date_joined')
+        parser.add_argument('--semilla', type=int, default=0, help='Semilla para resultados reproducibles')
+        parser.add_argument('--lote', type=int, default=5000, help='Usuarios por lote de inserción')
+        parser.add_argument('--dominio', default='carga.example', help='Dominio de los emails generados')
+        parser.add_argument('--password', default='cargapass123',
+                            help='Contraseña de todos los usuarios generados')
+        parser.add_argument('--limpiar', action='store_true',
+                            help='Elimina antes los usuarios con emails del dominio indicado')
+
+    def handle(self, *args, **options):
+        if options['cantidad'] < 1 or options['lote'] < 1:
+            raise CommandError("--cantidad y --lote deben ser mayores a 0")
+
+        if options['limpiar']:
+            eliminados, _ = User.objects.filter(email__endswith=f"@{options['dominio']}").delete()
+            self.stdout.write(f"Se eliminaron {eliminados} registros previos")
+
+        usuarios = generar_usuarios(
+            options['cantidad'],
+            make_password(options['password']),
+            dias=options['dias'],
+            semilla=options['semilla'],
+            dominio=options['dominio'],
+        )
+
+        inicio = time.perf_counter()
+
+        def progreso(total):
+            transcurrido = time.perf_counter() - inicio
+            self.stdout.write(f"{total}/{options['cantidad']} usuarios ({total / transcurrido:,.0f} filas/s)")
+
+        total = insertar_usuarios(usuarios, tamano_lote=options['lote'], progreso=progreso)
+        transcurrido = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"Se crearon {total} usuarios en {transcurrido:.1f} s ({total / transcurrido:,.0f} filas/s)"
+        ))
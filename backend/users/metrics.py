@@ -0,0 +1,91 @@
+"""
+Métricas de las peticiones en formato de texto de Prometheus.
+
+Los histogramas viven en la memoria de cada proceso; con varios workers cada uno
+expone sus propios valores en ``/metrics``.
+"""
+import bisect
+import threading
+from http import HTTPStatus
+
+from django.conf import settings
+from django.http import HttpResponse
+
+BUCKETS_SEGUNDOS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (0, 1, 2, 5, 10, 20, 50, 100)
+BUCKETS_BYTES = (1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+
+class Histograma:
+    """
+    Histograma de Prometheus con la etiqueta ``view``.
+    """
+    def __init__(self, nombre, ayuda, buckets):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, vista, valor):
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(vista)
+            if serie is None:
+                # Conteo por bucket (sin acumular), suma y total de observaciones
+                serie = self._series[vista] = [[0] * len(self.buckets), 0.0, 0]
+            if indice < len(self.buckets):
+                serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exportar(self):
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} histogram']
+        with self._lock:
+            series = {vista: (list(c), s, n) for vista, (c, s, n) in self._series.items()}
+        for vista, (conteos, suma, total) in sorted(series.items()):
+            acumulado = 0
+            for limite, conteo in zip(self.buckets, conteos):
+                acumulado += conteo
+                lineas.append(f'{self.nombre}_bucket{{view="{vista}",le="{limite}"}} {acumulado}')
+            lineas.append(f'{self.nombre}_bucket{{view="{vista}",le="+Inf"}} {total}')
+            lineas.append(f'{self.nombre}_sum{{view="{vista}"}} {suma}')
+            lineas.append(f'{self.nombre}_count{{view="{vista}"}} {total}')
+        return lineas
+
+    def limpiar(self):
+        with self._lock:
+            self._series.clear()
+
+
+DURACION = Histograma(
+    'http_request_duration_seconds', 'Latencia total de la petición.', BUCKETS_SEGUNDOS
+)
+CONSULTAS = Histograma(
+    'http_request_db_queries', 'Consultas SQL por petición.', BUCKETS_CONSULTAS
+)
+DURACION_DB = Histograma(
+    'http_request_db_duration_seconds', 'Tiempo en consultas SQL por petición.', BUCKETS_SEGUNDOS
+)
+DURACION_RENDER = Histograma(
+    'http_request_render_duration_seconds', 'Tiempo de serialización de la respuesta.', BUCKETS_SEGUNDOS
+)
+TAMANO_RESPUESTA = Histograma(
+    'http_response_size_bytes', 'Tamaño del cuerpo de la respuesta.', BUCKETS_BYTES
+)
+
+HISTOGRAMAS = (DURACION, CONSULTAS, DURACION_DB, DURACION_RENDER, TAMANO_RESPUESTA)
+
+
+def metricas(request):
+    """
+    Expone los histogramas en el formato de texto de Prometheus.
+
+    Si ``METRICS_TOKEN`` está definido se exige ``Authorization: Bearer <token>``.
+    """
+    if settings.METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {settings.METRICS_TOKEN}':
+        return HttpResponse(status=HTTPStatus.UNAUTHORIZED)
+    lineas = []
+    for histograma in HISTOGRAMAS:
+        lineas.extend(histograma.exportar())
+    return HttpResponse('\n'.join(lineas) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,244 @@
+import hashlib
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_vary_headers
+
+from . import metrics
+from .compresion import comprimible, elegir_codificacion
+from .routers import lecturas_en_replica
+
+# Vistas que no se registran (el scrape de Prometheus no debe medirse a sí mismo)
+VISTAS_EXCLUIDAS = frozenset({'metrics'})
+
+
+class _Medicion:
+    """
+    Tiempos de una petición: consultas SQL y serialización de la respuesta.
+    """
+    __slots__ = ('consultas', 'tiempo_db', 'tiempo_render')
+
+    def __init__(self):
+        self.consultas = 0
+        self.tiempo_db = 0.0
+        self.tiempo_render = None
+
+    def medir_sql(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tiempo_db += time.perf_counter() - inicio
+            self.consultas += 1
+
+
+class InstrumentacionMiddleware:
+    """
+    Mide cada petición a una vista con nombre (``user-list``, ``user-detail``,
+    ``user-export-csv``, ``token_obtain_pair``, ...): latencia total, número y tiempo
+    de consultas SQL, tiempo de serialización y tamaño de la respuesta.
+
+    Los valores se envían en el header ``Server-Timing`` y se acumulan en los
+    histogramas de ``/metrics``. En respuestas streaming se mide hasta que la vista
+    devuelve la respuesta y no se registra el tamaño. Con vistas asíncronas no se
+    cuentan las consultas, porque se ejecutan en otro hilo y con otra conexión.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        medicion = request._medicion = _Medicion()
+        inicio = time.perf_counter()
+        with ExitStack() as stack:
+            for conexion in connections.all():
+                stack.enter_context(conexion.execute_wrapper(medicion.medir_sql))
+            response = self.get_response(request)
+        return self._registrar(request, response, medicion, time.perf_counter() - inicio, con_db=True)
+
+    async def __acall__(self, request):
+        medicion = request._medicion = _Medicion()
+        inicio = time.perf_counter()
+        response = await self.get_response(request)
+        return self._registrar(request, response, medicion, time.perf_counter() - inicio, con_db=False)
+
+    def process_template_response(self, request, response):
+        # Las respuestas de DRF se renderizan después de este hook
+        medicion = getattr(request, '_medicion', None)
+        if medicion is not None:
+            inicio = time.perf_counter()
+
+            def fin_render(response):
+                medicion.tiempo_render = time.perf_counter() - inicio
+
+            response.add_post_render_callback(fin_render)
+        return response
+
+    def _registrar(self, request, response, medicion, total, con_db):
+        match = request.resolver_match
+        if match is None or not match.url_name or match.url_name in VISTAS_EXCLUIDAS:
+            return response
+        vista = match.url_name
+
+        metrics.DURACION.observar(vista, total)
+        tiempos = [f'total;dur={total * 1000:.2f}']
+        if con_db:
+            metrics.CONSULTAS.observar(vista, medicion.consultas)
+            metrics.DURACION_DB.observar(vista, medicion.tiempo_db)
+            tiempos.append(f'db;dur={medicion.tiempo_db * 1000:.2f};desc="{medicion.consultas} queries"')
+        if medicion.tiempo_render is not None:
+            metrics.DURACION_RENDER.observar(vista, medicion.tiempo_render)
+            tiempos.append(f'render;dur={medicion.tiempo_render * 1000:.2f}')
+        if not response.streaming:
+            metrics.TAMANO_RESPUESTA.observar(vista, len(response.content))
+
+        response['Server-Timing'] = ', '.join(tiempos)
+        return response
+
+
+METODOS_LECTURA = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+
+def clave_primario(request):
+    """
+    Clave de caché que fija al cliente en el primario. El cliente se identifica
+    por su header ``Authorization`` o, sin él, por su IP.
+    """
+    cliente = request.headers.get('Authorization') or request.META.get('REMOTE_ADDR', '')
+    return f"users:primario:{hashlib.sha256(cliente.encode('utf-8')).hexdigest()[:32]}"
+
+
+class ReplicaMiddleware:
+    """
+    Envía a la réplica (``USERS_READ_REPLICA``) las peticiones de lectura a vistas
+    con ``lecturas_en_replica = True``.
+
+    Después de una escritura exitosa el cliente queda fijado al primario durante
+    ``DB_REPLICA_MAX_LAG`` segundos, para que vea sus propios cambios aunque la
+    réplica vaya atrasada. Sin réplica configurada no hace nada.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.USERS_READ_REPLICA:
+            return self.get_response(request)
+        if request.method in METODOS_LECTURA:
+            replica = self._vista_de_lectura(request) and not cache.get(clave_primario(request))
+            with lecturas_en_replica(replica):
+                return self.get_response(request)
+        response = self.get_response(request)
+        if response.status_code < 400:
+            cache.set(clave_primario(request), True, settings.DB_REPLICA_MAX_LAG)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.USERS_READ_REPLICA:
+            return await self.get_response(request)
+        if request.method in METODOS_LECTURA:
+            replica = self._vista_de_lectura(request) and not await cache.aget(clave_primario(request))
+            with lecturas_en_replica(replica):
+                return await self.get_response(request)
+        response = await self.get_response(request)
+        if response.status_code < 400:
+            await cache.aset(clave_primario(request), True, settings.DB_REPLICA_MAX_LAG)
+        return response
+
+    @staticmethod
+    def _vista_de_lectura(request):
+        # La URL se resuelve aquí porque process_view correría en otro contexto bajo ASGI
+        try:
+            match = resolve(request.path_info, getattr(request, 'urlconf', None))
+        except Resolver404:
+            return False
+        vista = getattr(match.func, 'view_class', None)
+        return getattr(vista, 'lecturas_en_replica', False)
+
+
+
+class CompresionMiddleware:
+    """
+    Comprime las respuestas de texto (JSON, CSV, ...) con la codificación que
+    acepte el cliente (ver ``users.compresion``), también las streaming.
+
+    No se comprimen:
+    - las respuestas de menos de ``COMPRESSION_MIN_SIZE`` bytes;
+    - las que ya traen ``Content-Encoding`` (el esquema OpenAPI precalculado);
+    - las de rangos de bytes (``Accept-Ranges`` o 206), como la descarga de
+      exportaciones, porque los rangos se refieren al archivo sin comprimir.
+
+    El ``ETag`` de una respuesta comprimida pasa a ser débil, como en
+    ``GZipMiddleware`` de Django.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.comprimir(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.comprimir(request, await self.get_response(request))
+
+    def comprimir(self, request, response):
+        if not settings.COMPRESSION_ENABLED or not self._aplica(response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        codificacion = elegir_codificacion(request.headers.get('Accept-Encoding', ''))
+        if codificacion is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = codificacion().acomprimir_bloques(response.streaming_content)
+            else:
+                response.streaming_content = codificacion().comprimir_bloques(response.streaming_content)
+            del response['Content-Length']
+        else:
+            comprimido = codificacion(len(response.content)).comprimir(response.content)
+            if len(comprimido) >= len(response.content):
+                return response
+            response.content = comprimido
+            response['Content-Length'] = str(len(comprimido))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = codificacion.nombre
+        return response
+
+    @staticmethod
+    def _aplica(response):
+        if response.has_header('Content-Encoding') or response.has_header('Content-Range'):
+            return False
+        if response.status_code == 206 or response.get('Accept-Ranges', 'none') != 'none':
+            return False
+        if 'no-transform' in response.get('Cache-Control', ''):
+            return False
+        if not comprimible(response.get('Content-Type', '')):
+            return False
+        return response.streaming or len(response.content) >= settings.COMPRESSION_MIN_SIZE
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-17 18:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='email',
+            field=models.EmailField(error_messages={'unique': 'Error el correo ya existe'}, max_length=255, unique=True, verbose_name='Email Address'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['date_joined', 'id'], name='users_user_joined_id_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-17 19:19
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+# Índices trigram para la búsqueda por nombre (LIKE '%texto%'); solo en PostgreSQL
+INDICES_TRIGRAM = (
+    ('users_user_first_name_trgm_idx', 'first_name'),
+    ('users_user_last_name_trgm_idx', 'last_name'),
+)
+
+
+def crear_indices_trigram(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    tabla = schema_editor.quote_name(apps.get_model('users', 'User')._meta.db_table)
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for nombre, columna in INDICES_TRIGRAM:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {schema_editor.quote_name(nombre)} '
+            f'ON {tabla} USING gin (lower({schema_editor.quote_name(columna)}) gin_trgm_ops)'
+        )
+
+
+def eliminar_indices_trigram(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for nombre, _ in INDICES_TRIGRAM:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {schema_editor.quote_name(nombre)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0002_user_joined_id_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='users_user_email_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_active', 'date_joined', 'id'], name='users_user_active_joined_idx'),
+        ),
+        migrations.RunPython(crear_indices_trigram, eliminar_indices_trigram),
+    ]
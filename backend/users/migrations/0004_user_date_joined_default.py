@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-17 19:35
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='date_joined',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Date Joined'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.1 on 2026-10-17 19:49
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_date_joined_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('fingerprint', models.CharField(max_length=64, verbose_name='Fingerprint')),
+                ('params', models.JSONField(default=dict, verbose_name='Parameters')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10, verbose_name='Status')),
+                ('progress', models.PositiveIntegerField(default=0, verbose_name='Exported rows')),
+                ('total', models.PositiveIntegerField(blank=True, null=True, verbose_name='Total rows')),
+                ('file_path', models.CharField(blank=True, max_length=255, verbose_name='File')),
+                ('size', models.BigIntegerField(blank=True, null=True, verbose_name='Size in bytes')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Finished at')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='export_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Requested by')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='users_exportjob_status_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'running'])), fields=('fingerprint',), name='users_exportjob_active_fingerprint_uniq')],
+            },
+        ),
+    ]
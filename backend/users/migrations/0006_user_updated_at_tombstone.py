@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-17 20:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0005_export_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField(verbose_name='User ID')),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Deleted At')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Updated At'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['updated_at', 'id'], name='users_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usertombstone',
+            index=models.Index(fields=['deleted_at', 'id'], name='users_tombstone_deleted_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-17 21:10
+
+from django.db import migrations
+
+INDICE = 'users_user_email_lower_idx'
+
+
+def _recrear_indice(apps, schema_editor, clase_de_operador):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    tabla = schema_editor.quote_name(apps.get_model('users', 'User')._meta.db_table)
+    nombre = schema_editor.quote_name(INDICE)
+    schema_editor.execute(f'DROP INDEX IF EXISTS {nombre}')
+    schema_editor.execute(
+        f'CREATE INDEX {nombre} ON {tabla} (lower({schema_editor.quote_name("email")}) {clase_de_operador})'
+    )
+
+
+def usar_pattern_ops(apps, schema_editor):
+    # Con una intercalación distinta de C, PostgreSQL solo usa el índice para
+    # ``LIKE 'prefijo%'`` si compara byte a byte (varchar_pattern_ops)
+    _recrear_indice(apps, schema_editor, 'varchar_pattern_ops')
+
+
+def usar_operadores_por_defecto(apps, schema_editor):
+    _recrear_indice(apps, schema_editor, '')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_user_updated_at_tombstone'),
+    ]
+
+    operations = [
+        migrations.RunPython(usar_pattern_ops, usar_operadores_por_defecto),
+    ]
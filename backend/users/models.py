@@ -1,4 +1,9 @@
+import uuid
+
+from django.conf import settings
 from django.db import models
+from django.db.models.functions import Lower
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.utils.translation import gettext_lazy as _
 
@@ -32,11 +37,93 @@ class User(AbstractUser):
     email = models.EmailField(unique=True, verbose_name=_("Email Address"), max_length=255,error_messages={"unique":"Error el correo ya existe"})
     is_active = models.BooleanField(default=True, verbose_name=_("Active"))
     is_superuser = models.BooleanField(default=False)
-    date_joined = models.DateTimeField(auto_now_add=True, verbose_name=_("Date Joined"))
+    # Con default en lugar de auto_now_add se respeta una fecha asignada (importaciones, bulk_create)
+    date_joined = models.DateTimeField(default=timezone.now, editable=False, verbose_name=_("Date Joined"))
+    # save() lo actualiza solo; bulk_update y QuerySet.update deben asignarlo (ver users.bulk)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
     
     
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name']
     
     objects = UserManager()
-    
\ No newline at end of file
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Índice para la paginación por cursor ordenada por (date_joined, id)
+            models.Index(fields=['date_joined', 'id'], name='users_user_joined_id_idx'),
+            # Búsqueda por prefijo de email sin distinguir mayúsculas (users.filters).
+            # En PostgreSQL la migración 0007 lo recrea con varchar_pattern_ops
+            models.Index(Lower('email'), name='users_user_email_lower_idx'),
+            # Filtro por is_active conservando el orden de la paginación
+            models.Index(fields=['is_active', 'date_joined', 'id'], name='users_user_active_joined_idx'),
+            # Sincronización incremental: cambios posteriores a un cursor (updated_at, id)
+            models.Index(fields=['updated_at', 'id'], name='users_user_updated_idx'),
+        ]
+
+
+class UserTombstone(models.Model):
+    """
+    Marca de un usuario eliminado, para que la sincronización incremental
+    (``users.sincronizacion``) también informe las bajas. Se crea con la señal
+    ``post_delete`` de ``User`` o, en los borrados masivos, con un ``bulk_create``
+    por lote (``users.bulk.eliminar_usuarios``).
+    """
+    user_id = models.BigIntegerField(verbose_name=_("User ID"))
+    deleted_at = models.DateTimeField(default=timezone.now, verbose_name=_("Deleted At"))
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'], name='users_tombstone_deleted_idx'),
+        ]
+
+
+class ExportJob(models.Model):
+    """
+    Trabajo de exportación en segundo plano (ver ``users.exportaciones``).
+
+    ``fingerprint`` identifica los parámetros de la exportación y al usuario que la
+    pidió: la restricción parcial impide que haya dos trabajos activos iguales del
+    mismo usuario, así que sus peticiones idénticas y concurrentes comparten un
+    solo trabajo. Solo ``requested_by`` consulta y descarga el trabajo.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, _("Pending")),
+        (RUNNING, _("Running")),
+        (DONE, _("Done")),
+        (FAILED, _("Failed")),
+    ]
+    ACTIVE_STATUSES = (PENDING, RUNNING)
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    fingerprint = models.CharField(max_length=64, verbose_name=_("Fingerprint"))
+    params = models.JSONField(default=dict, verbose_name=_("Parameters"))
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, verbose_name=_("Status"))
+    progress = models.PositiveIntegerField(default=0, verbose_name=_("Exported rows"))
+    total = models.PositiveIntegerField(null=True, blank=True, verbose_name=_("Total rows"))
+    file_path = models.CharField(max_length=255, blank=True, verbose_name=_("File"))
+    size = models.BigIntegerField(null=True, blank=True, verbose_name=_("Size in bytes"))
+    error = models.TextField(blank=True, verbose_name=_("Error"))
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL,
+        related_name='export_jobs', verbose_name=_("Requested by")
+    )
+    created_at = models.DateTimeField(default=timezone.now, verbose_name=_("Created at"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated at"))
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name=_("Finished at"))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fingerprint'],
+                condition=models.Q(status__in=['pending', 'running']),
+                name='users_exportjob_active_fingerprint_uniq',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='users_exportjob_status_idx'),
+        ]
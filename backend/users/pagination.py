@@ -0,0 +1,156 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+
+class CursorInvalido(ValueError):
+    """El cursor recibido no se pudo decodificar."""
+
+
+def codificar_cursor(date_joined, id, reverso=False):
+    """
+    Codifica una posición de la lista en un cursor opaco.
+    :param date_joined: Fecha de registro del último usuario visto.
+    :param id: ID del último usuario visto.
+    :param reverso: True si el cursor avanza hacia la página anterior.
+    :return: Cadena base64 segura para usarse en la URL.
+    """
+    posicion = {"d": date_joined.isoformat(), "i": id, "r": int(reverso)}
+    crudo = json.dumps(posicion, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(crudo).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """
+    Decodifica un cursor generado por ``codificar_cursor``.
+    :return: Tupla (date_joined, id, reverso).
+    :raises CursorInvalido: Si el cursor está mal formado.
+    """
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        posicion = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return datetime.fromisoformat(posicion['d']), int(posicion['i']), bool(posicion.get('r'))
+    except (binascii.Error, ValueError, TypeError, KeyError, UnicodeDecodeError):
+        raise CursorInvalido("Cursor inválido")
+
+
+def leer_page_size(valor):
+    """
+    Valida el parámetro ``page_size``.
+    :return: Tamaño de página limitado a ``USERS_MAX_PAGE_SIZE``.
+    :raises CursorInvalido: Si no es un entero mayor a 0.
+    """
+    try:
+        page_size = int(valor)
+    except ValueError:
+        raise CursorInvalido("page_size debe ser un número entero")
+    if page_size < 1:
+        raise CursorInvalido("page_size debe ser mayor a 0")
+    return min(page_size, settings.USERS_MAX_PAGE_SIZE)
+
+
+def _clave(fila):
+    # Las filas pueden ser instancias del modelo o diccionarios de values()
+    if isinstance(fila, dict):
+        return fila['date_joined'], fila['id']
+    return fila.date_joined, fila.id
+
+
+class UserCursorPagination:
+    """
+    Paginación por cursor (keyset) ordenada por ``(date_joined, id)``.
+
+    Cada página se obtiene con ``WHERE (date_joined, id) > cursor ORDER BY ... LIMIT``,
+    sin ``OFFSET``, así que el costo no crece con la página y los registros insertados
+    mientras se pagina no desplazan las filas ya vistas.
+
+    Si la petición no trae ``cursor`` ni ``page_size`` se mantiene el comportamiento
+    anterior (lista completa), limitado a ``USERS_UNPAGINATED_LIMIT`` filas.
+
+    El trabajo está separado en ``get_queryset`` y ``get_page`` para que las vistas
+    síncronas y asíncronas evalúen el QuerySet cada una a su manera.
+    """
+    orden = ('date_joined', 'id')
+
+    def __init__(self, params):
+        """
+        :param params: Parámetros de la query (``request.GET``).
+        :raises CursorInvalido: Si ``cursor`` o ``page_size`` no son válidos.
+        """
+        cursor = params.get('cursor')
+        page_size = params.get('page_size')
+        self.paginado = bool(cursor or page_size)
+        self.posicion = decodificar_cursor(cursor) if cursor else None
+
+        if page_size:
+            self.page_size = leer_page_size(page_size)
+        elif self.paginado:
+            self.page_size = settings.USERS_PAGE_SIZE
+        else:
+            self.page_size = settings.USERS_UNPAGINATED_LIMIT
+
+    @property
+    def reverso(self):
+        return bool(self.posicion and self.posicion[2])
+
+    def get_queryset(self, queryset):
+        """
+        Aplica el filtro por cursor, el orden y el límite (una fila extra para saber
+        si hay más páginas). El resultado todavía no se evalúa.
+        """
+        if self.posicion:
+            date_joined, id, reverso = self.posicion
+            if reverso:
+                queryset = queryset.filter(
+                    Q(date_joined__lt=date_joined) | Q(date_joined=date_joined, id__lt=id)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(date_joined__gt=date_joined) | Q(date_joined=date_joined, id__gt=id)
+                )
+
+        if self.reverso:
+            queryset = queryset.order_by('-date_joined', '-id')
+        else:
+            queryset = queryset.order_by(*self.orden)
+        return queryset[:self.page_size + 1]
+
+    def get_page(self, filas):
+        """
+        Recorta las filas obtenidas con ``get_queryset`` y calcula los cursores.
+        :param filas: Lista con el resultado evaluado de ``get_queryset``.
+        :return: Tupla (filas de la página, cursor siguiente, cursor anterior).
+        """
+        filas = list(filas)
+        hay_mas = len(filas) > self.page_size
+        filas = filas[:self.page_size]
+
+        if self.reverso:
+            filas.reverse()
+            hay_siguiente, hay_anterior = True, hay_mas
+        else:
+            hay_siguiente, hay_anterior = hay_mas, self.posicion is not None
+
+        siguiente = anterior = None
+        if filas and hay_siguiente:
+            siguiente = codificar_cursor(*_clave(filas[-1]))
+        if filas and hay_anterior:
+            anterior = codificar_cursor(*_clave(filas[0]), reverso=True)
+        return filas, siguiente, anterior
+
+    def get_response_data(self, data, siguiente, anterior):
+        """
+        Arma el cuerpo de la respuesta conservando el sobre ``{"data": [...]}``.
+        """
+        respuesta = {"data": data}
+        if self.paginado:
+            respuesta["next"] = siguiente
+            respuesta["previous"] = anterior
+        elif siguiente:
+            # La lista sin paginar se truncó: se indica cómo continuar
+            respuesta["next"] = siguiente
+        return respuesta
@@ -0,0 +1,72 @@
+import codecs
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.utils.json import strict_constant
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _usar_orjson(encoding):
+    # orjson solo lee UTF-8
+    return orjson is not None and codecs.lookup(encoding).name == 'utf-8'
+
+
+class ORJSONParser(JSONParser):
+    """
+    ``JSONParser`` que usa ``orjson`` (dependencia opcional) cuando está disponible.
+
+    ``orjson`` rechaza ``NaN`` e infinito, igual que el modo estricto de DRF. Sin
+    ``orjson``, con otra codificación o si el cuerpo no es válido se usa ``json``,
+    que arma el mismo mensaje de error que DRF.
+    """
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if not self.strict or not _usar_orjson(encoding):
+            return super().parse(stream, media_type, parser_context)
+        contenido = stream.read()
+        try:
+            return orjson.loads(contenido)
+        except orjson.JSONDecodeError:
+            pass
+        try:
+            return json.loads(contenido.decode(encoding), parse_constant=strict_constant)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parser para cuerpos NDJSON (un objeto JSON por línea).
+
+    Devuelve una lista con un elemento por línea no vacía.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8')
+        rapido = _usar_orjson(encoding)
+        filas = []
+        for numero, linea in enumerate(stream, start=1):
+            linea = linea.strip()
+            if not linea:
+                continue
+            if rapido:
+                try:
+                    filas.append(orjson.loads(linea))
+                    continue
+                except orjson.JSONDecodeError:
+                    # json acepta NaN y da el mensaje de error con la posición
+                    pass
+            try:
+                filas.append(json.loads(linea.decode(encoding)))
+            except ValueError as exc:
+                raise ParseError(f'NDJSON inválido en la línea {numero}: {exc}')
+        return filas
@@ -0,0 +1,48 @@
+"""
+Renderer JSON de la API con ``orjson``.
+
+``orjson`` (dependencia opcional) serializa en C los diccionarios, listas, fechas y
+UUID que arman las vistas, de 5 a 10 veces más rápido que el módulo ``json``. La
+salida es la misma que la de ``JSONRenderer`` de DRF: compacta, UTF-8 sin escapar,
+fechas ISO 8601 con ``Z`` para UTC y ``U+2028``/``U+2029`` escapados.
+
+Sin ``orjson``, con ``indent`` o con un valor que ``orjson`` no sabe serializar se
+usa el renderer de DRF, así que el resultado no depende de que esté instalado.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Separadores de línea que DRF escapa para poder incrustar el JSON en <script>
+_ESCAPES = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    ``JSONRenderer`` que usa ``orjson`` cuando está disponible.
+
+    A diferencia de ``json`` en modo estricto, ``orjson`` escribe ``NaN`` e
+    infinito como ``null`` en lugar de fallar.
+    """
+    opciones = (orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            # Los tipos que orjson no conoce (Decimal, textos diferidos, ...) pasan
+            # por el mismo encoder que usa DRF
+            contenido = orjson.dumps(data, default=self.encoder_class().default, option=self.opciones)
+        except orjson.JSONEncodeError:
+            # Enteros de más de 64 bits, claves no admitidas o tipos desconocidos:
+            # DRF los serializa o levanta su propio error
+            return super().render(data, accepted_media_type, renderer_context)
+        for original, escapado in _ESCAPES:
+            if original in contenido:
+                contenido = contenido.replace(original, escapado)
+        return contenido
@@ -0,0 +1,54 @@
+"""
+Enrutamiento de lecturas a la réplica de la base de datos.
+
+Con ``USERS_READ_REPLICA`` configurado (``DB_REPLICA_HOST`` o ``DB_REPLICA_NAME``),
+las lecturas hechas dentro de ``lecturas_en_replica()`` van a la réplica y todas las
+escrituras al primario. ``ReplicaMiddleware`` activa ese contexto solo en las
+vistas de lectura pesada marcadas con ``lecturas_en_replica = True`` (listado y
+exportación); el resto de la aplicación lee del primario como siempre.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Un ContextVar funciona igual en hilos (WSGI) y en tareas de asyncio (ASGI)
+_lectura_en_replica = ContextVar('lectura_en_replica', default=False)
+
+
+@contextmanager
+def lecturas_en_replica(activo=True):
+    """
+    Envía a la réplica las lecturas del bloque (o al primario con ``activo=False``).
+    """
+    token = _lectura_en_replica.set(activo)
+    try:
+        yield
+    finally:
+        _lectura_en_replica.reset(token)
+
+
+def alias_lectura():
+    """
+    Alias de la base de datos que usan las lecturas en el contexto actual.
+    """
+    if settings.USERS_READ_REPLICA and _lectura_en_replica.get():
+        return settings.USERS_READ_REPLICA
+    return DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    """
+    Router de Django: lecturas según ``lecturas_en_replica`` y escrituras siempre
+    en el primario.
+    """
+    def db_for_read(self, model, **hints):
+        return alias_lectura()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # La réplica tiene los mismos datos que el primario
+        return True
@@ -0,0 +1,112 @@
+"""
+Generación e inserción rápida de usuarios sintéticos para pruebas de carga.
+"""
+import csv
+import random
+from datetime import timedelta
+from io import StringIO
+
+from django.db import connection
+from django.utils import timezone
+
+from .cache import invalidar_listado
+from .models import User
+
+NOMBRES = (
+    'María', 'José', 'Juan', 'Guadalupe', 'Francisco', 'Ana', 'Luis', 'Carmen', 'Carlos',
+    'Rosa', 'Miguel', 'Patricia', 'Jorge', 'Leticia', 'Pedro', 'Fernanda', 'Alejandro',
+    'Sofía', 'Ricardo', 'Daniela', 'Eduardo', 'Valeria', 'Fernando', 'Gabriela',
+)
+APELLIDOS = (
+    'Hernández', 'García', 'Martínez', 'López', 'González', 'Pérez', 'Rodríguez', 'Sánchez',
+    'Ramírez', 'Cruz', 'Flores', 'Gómez', 'Morales', 'Vázquez', 'Reyes', 'Jiménez', 'Torres',
+    'Díaz', 'Gutiérrez', 'Ruiz', 'Mendoza', 'Aguilar', 'Ortiz', 'Castillo',
+)
+
+# Columnas escritas con COPY (las demás columnas NOT NULL no tienen default en la BD)
+COLUMNAS_COPY = (
+    'email', 'password', 'first_name', 'last_name', 'phone',
+    'is_staff', 'is_active', 'is_superuser', 'date_joined', 'updated_at',
+)
+
+
+def generar_usuarios(cantidad, password, dias=365, semilla=0, dominio='carga.example', inicio=0):
+    """
+    Genera usuarios sintéticos reproducibles.
+    :param cantidad: Número de usuarios.
+    :param password: Hash de contraseña (ya calculado) compartido por todos.
+    :param dias: Los ``date_joined`` se reparten en los últimos ``dias`` días.
+    :param semilla: Semilla del generador aleatorio.
+    :return: Generador de instancias ``User`` sin guardar.
+    """
+    rng = random.Random(semilla)
+    ahora = timezone.now()
+    segundos = max(int(timedelta(days=dias).total_seconds()), 1)
+    for i in range(inicio, inicio + cantidad):
+        nombre = rng.choice(NOMBRES)
+        apellido = rng.choice(APELLIDOS)
+        yield User(
+            email=f'usuario{i}@{dominio}',
+            password=password,
+            first_name=nombre,
+            last_name=f'{apellido} {rng.choice(APELLIDOS)}',
+            phone=f'55{rng.randrange(10 ** 8):08d}',
+            date_joined=ahora - timedelta(seconds=rng.randrange(segundos)),
+            updated_at=ahora,
+        )
+
+
+def _lotes(usuarios, tamano):
+    lote = []
+    for usuario in usuarios:
+        lote.append(usuario)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _copiar_lote(cursor, lote):
+    # Inserta un lote con COPY ... FROM STDIN (psycopg2 o psycopg 3)
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    for usuario in lote:
+        writer.writerow([getattr(usuario, columna) for columna in COLUMNAS_COPY])
+    tabla = connection.ops.quote_name(User._meta.db_table)
+    columnas = ', '.join(connection.ops.quote_name(c) for c in COLUMNAS_COPY)
+    sql = f'COPY {tabla} ({columnas}) FROM STDIN WITH (FORMAT csv)'
+
+    crudo = cursor.cursor
+    buffer.seek(0)
+    if hasattr(crudo, 'copy_expert'):
+        crudo.copy_expert(sql, buffer)
+    else:
+        with crudo.copy(sql) as copia:
+            copia.write(buffer.getvalue())
+
+
+def insertar_usuarios(usuarios, tamano_lote=5000, progreso=None):
+    """
+    Inserta usuarios por lotes: ``COPY`` en PostgreSQL y ``bulk_create`` en otros motores.
+    :param usuarios: Iterable de instancias ``User`` sin guardar.
+    :param progreso: Función opcional que recibe el total insertado tras cada lote.
+    :return: Número de usuarios insertados.
+    """
+    total = 0
+    usar_copy = connection.vendor == 'postgresql'
+    if usar_copy:
+        with connection.cursor() as cursor:
+            for lote in _lotes(usuarios, tamano_lote):
+                _copiar_lote(cursor, lote)
+                total += len(lote)
+                if progreso:
+                    progreso(total)
+    else:
+        for lote in _lotes(usuarios, tamano_lote):
+            User.objects.bulk_create(lote)
+            total += len(lote)
+            if progreso:
+                progreso(total)
+    invalidar_listado()
+    return total
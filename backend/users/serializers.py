@@ -1,7 +1,12 @@
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from rest_framework import serializers
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework import exceptions, serializers
 from django.contrib.auth import authenticate
-from users.models import User
+from django.contrib.auth.models import update_last_login
+from django.utils import timezone
+from datetime import timezone as dt_timezone
+from django.urls import reverse
+from users.models import ExportJob, User
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=8)
@@ -43,6 +48,135 @@ class UserSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
 
+class UserBulkSerializer(UserSerializer):
+    """
+    Serializer para validar filas de operaciones masivas.
+
+    Aplica las mismas reglas que ``UserSerializer`` excepto la unicidad del email,
+    que se verifica para todo el lote con una sola consulta.
+    """
+    class Meta(UserSerializer.Meta):
+        extra_kwargs = {
+            'password': {'write_only': True},
+            'email': {'validators': []}
+        }
+
+
+class UserImportSerializer(UserBulkSerializer):
+    """
+    Serializer para las filas de la importación CSV.
+
+    Acepta el formato que escribe ``generar_users_csv``: la contraseña es opcional
+    (sin ella el usuario queda con una contraseña no utilizable) y ``date_joined``
+    se conserva si viene en el archivo (en UTC).
+    """
+    password = serializers.CharField(write_only=True, min_length=8, required=False)
+    date_joined = serializers.DateTimeField(
+        required=False,
+        input_formats=['%Y-%m-%d %H:%M:%S', 'iso-8601'],
+        default_timezone=dt_timezone.utc
+    )
+
+    class Meta(UserBulkSerializer.Meta):
+        read_only_fields = ['id']
+
+
+class UserBulkUpdateSerializer(UserBulkSerializer):
+    """
+    Serializer para validar los cambios de la actualización masiva.
+
+    Además de los campos de ``UserSerializer`` permite cambiar ``is_active`` para
+    activar o desactivar usuarios en lote.
+    """
+    class Meta(UserBulkSerializer.Meta):
+        fields = UserBulkSerializer.Meta.fields + ['is_active']
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    """
+    Estado de una exportación en segundo plano. ``descarga`` es la URL del archivo
+    cuando el trabajo terminó (null mientras tanto).
+    """
+    descarga = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = ['id', 'status', 'progress', 'total', 'size', 'error', 'params',
+                  'created_at', 'finished_at', 'descarga']
+        read_only_fields = fields
+
+    def get_descarga(self, job):
+        if job.status != ExportJob.DONE:
+            return None
+        url = reverse('user-export-job-descarga', kwargs={'id': job.id})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+def _datetime_iso(value, zona):
+    # Mismo formato que DateTimeField de DRF: ISO 8601 en la zona actual y 'Z' para UTC
+    if not value:
+        return None
+    value = value.astimezone(zona).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+class FastUserListSerializer:
+    """
+    Serializador de solo lectura para listados de usuarios.
+
+    Produce la misma salida que ``UserSerializer(many=True)`` pero a partir de filas
+    de ``values()`` con solo los campos públicos, sin crear instancias del modelo ni
+    recorrer los campos de DRF uno por uno. Las conversiones de cada campo se
+    resuelven una sola vez al crear el serializador.
+    """
+    campos = ('id', 'email', 'first_name', 'last_name', 'phone', 'date_joined')
+    conversores = {
+        'date_joined': _datetime_iso,
+    }
+
+    def __init__(self, campos=None, adicionales=()):
+        """
+        :param campos: Campos a serializar (por defecto todos los públicos).
+        :param adicionales: Campos que se consultan aunque no se serialicen, por
+            ejemplo los que necesita la paginación para calcular el cursor.
+        """
+        if campos is not None:
+            self.campos = tuple(campos)
+        self._sobrantes = tuple(campo for campo in adicionales if campo not in self.campos)
+        self._conversiones = tuple(
+            (campo, self.conversores[campo]) for campo in self.campos if campo in self.conversores
+        )
+
+    @property
+    def columnas(self):
+        """
+        Campos que se consultan: los serializados y los adicionales.
+        """
+        return (*self.campos, *self._sobrantes)
+
+    def get_queryset(self, queryset):
+        """
+        Limita la consulta a los campos serializados y los adicionales.
+        """
+        return queryset.values(*self.columnas)
+
+    def serializar(self, filas):
+        """
+        Convierte filas de ``values()`` al formato de la API y quita los campos
+        adicionales. Las filas se modifican en el lugar.
+        """
+        zona = timezone.get_current_timezone()
+        conversiones = self._conversiones
+        sobrantes = self._sobrantes
+        for fila in filas:
+            for campo, conversor in conversiones:
+                fila[campo] = conversor(fila[campo], zona)
+            for campo in sobrantes:
+                del fila[campo]
+        return filas
+
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     username_field = User.EMAIL_FIELD  # Usa el email como identificador
     
@@ -57,7 +191,23 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         else:
             raise serializers.ValidationError("Se requiere email y contraseña", code='authorization')
         
-        data = super().validate(attrs)
+        # Las credenciales ya se verificaron: no se llama a super().validate() porque
+        # volvería a ejecutar authenticate() y el hasheo de la contraseña
+        self.user = user
+        if not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise exceptions.AuthenticationFailed(
+                self.error_messages["no_active_account"],
+                "no_active_account",
+            )
+
+        refresh = self.get_token(user)
+        data = {
+            "refresh": str(refresh),
+            "access": str(refresh.access_token),
+        }
+        if api_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
+
         data['user'] = {
             "id": user.id,
             "email": user.email,
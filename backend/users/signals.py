@@ -0,0 +1,66 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import CAMPOS_AUTENTICACION, invalidar_usuario_autenticado
+from .cache import invalidar_listado
+from .models import User, UserTombstone
+
+# True mientras ``borrado_en_lote`` está activo: las bajas las registra quien borra
+_borrado_en_lote = ContextVar('borrado_en_lote', default=False)
+
+
+@contextmanager
+def borrado_en_lote():
+    """
+    Desactiva los receivers de ``post_delete`` de ``User`` para un borrado masivo.
+    Quien borra debe crear las marcas de baja e invalidar las cachés una vez por lote
+    (ver ``users.bulk.eliminar_usuarios``).
+    """
+    token = _borrado_en_lote.set(True)
+    try:
+        yield
+    finally:
+        _borrado_en_lote.reset(token)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidar_cache_usuarios(sender, signal, **kwargs):
+    """
+    Invalida la caché del listado cuando se crea, modifica o elimina un usuario.
+    """
+    if signal is post_delete and _borrado_en_lote.get():
+        return
+    invalidar_listado()
+
+
+@receiver(post_save, sender=User)
+def invalidar_cache_autenticacion(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Invalida al usuario en la caché de autenticación si cambió algún campo que
+    afecte el acceso. Guardados parciales de otros campos (p. ej. ``last_login``)
+    no la invalidan.
+    """
+    if created:
+        return
+    if update_fields is not None and not CAMPOS_AUTENTICACION.intersection(update_fields):
+        return
+    invalidar_usuario_autenticado(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def invalidar_cache_autenticacion_eliminado(sender, instance, **kwargs):
+    if not _borrado_en_lote.get():
+        invalidar_usuario_autenticado(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def registrar_baja(sender, instance, **kwargs):
+    """
+    Deja la marca de la baja para la sincronización incremental (``since``).
+    """
+    if not _borrado_en_lote.get():
+        UserTombstone.objects.create(user_id=instance.pk)
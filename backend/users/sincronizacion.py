@@ -0,0 +1,181 @@
+"""
+Sincronización incremental de usuarios con ``since=``.
+
+En lugar de descargar la tabla completa, un sistema externo pide los cambios
+posteriores a un cursor y recibe un cursor nuevo para la siguiente llamada. El
+cursor guarda dos posiciones:
+
+- ``(updated_at, id)`` del último usuario creado o modificado que se entregó.
+- ``(deleted_at, id)`` de la última baja (``UserTombstone``) entregada.
+
+Ambas consultas usan sus índices, así que el costo depende de cuántas filas
+cambiaron y no del tamaño de la tabla.
+
+Solo se entregan cambios anteriores a ``ahora - USERS_SYNC_LAG``: una transacción
+que asignó ``updated_at`` pero aún no confirma no queda detrás de un cursor que
+ya la pasó.
+
+Esto exige que toda transacción que escribe ``updated_at`` o ``deleted_at``
+confirme en menos de ``USERS_SYNC_LAG`` segundos. Si confirma más tarde, sus filas
+quedan detrás de cursores que ya avanzaron y ni los clientes de ``since`` ni el
+directorio en memoria (``users.directorio``) las ven nunca. Por eso la creación
+masiva (``users.bulk``) y la importación CSV (``users.importacion``) confirman cada
+lote por separado, y las actualizaciones y borrados masivos usan una transacción
+acotada por ``USERS_BULK_MAX_ROWS``. Quien agregue escrituras de usuarios debe
+respetar el mismo límite.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import UserTombstone
+from .pagination import CursorInvalido, leer_page_size
+
+
+def codificar_since(usuarios, eliminados):
+    """
+    Codifica las dos posiciones de la sincronización en un cursor opaco.
+    :param usuarios: Tupla (updated_at, id) del último usuario entregado.
+    :param eliminados: Tupla (deleted_at, id) de la última baja entregada.
+    :return: Cadena base64 segura para usarse en la URL.
+    """
+    posicion = {
+        "u": [usuarios[0].isoformat(), usuarios[1]],
+        "e": [eliminados[0].isoformat(), eliminados[1]],
+    }
+    crudo = json.dumps(posicion, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(crudo).decode('ascii').rstrip('=')
+
+
+def _desde_fecha(valor):
+    # Una fecha u hora ISO 8601 equivale a un cursor en esa posición para ambas listas
+    fecha = parse_date(valor)
+    if fecha is not None:
+        fecha_hora = datetime.combine(fecha, time.min)
+    else:
+        fecha_hora = parse_datetime(valor)
+        if fecha_hora is None:
+            return None
+    if timezone.is_naive(fecha_hora):
+        fecha_hora = timezone.make_aware(fecha_hora)
+    return (fecha_hora, 0), (fecha_hora, 0)
+
+
+def decodificar_since(valor):
+    """
+    Interpreta el parámetro ``since``: un cursor devuelto por una sincronización
+    anterior o una fecha ISO 8601 para empezar (por ejemplo ``1970-01-01``).
+    :return: Tupla ((updated_at, id), (deleted_at, id)).
+    :raises CursorInvalido: Si el valor no es un cursor ni una fecha.
+    """
+    try:
+        posiciones = _desde_fecha(valor)
+    except ValueError:
+        posiciones = None
+    if posiciones is not None:
+        return posiciones
+    try:
+        relleno = '=' * (-len(valor) % 4)
+        posicion = json.loads(base64.urlsafe_b64decode(valor + relleno))
+        return tuple(
+            (datetime.fromisoformat(posicion[clave][0]), int(posicion[clave][1]))
+            for clave in ('u', 'e')
+        )
+    except (binascii.Error, ValueError, TypeError, KeyError, IndexError, UnicodeDecodeError):
+        raise CursorInvalido("since debe ser un cursor de sincronización o una fecha ISO 8601")
+
+
+def _posteriores(queryset, campo, posicion, limite):
+    fecha, id = posicion
+    return queryset.filter(
+        Q(**{f'{campo}__gt': fecha}) | Q(**{campo: fecha, 'id__gt': id}),
+        **{f'{campo}__lt': limite},
+    ).order_by(campo, 'id')
+
+
+class SincronizacionUsuarios:
+    """
+    Modo ``since`` del listado: usuarios creados o modificados y bajas posteriores
+    al cursor, hasta ``page_size`` de cada tipo por llamada.
+
+    Igual que ``UserCursorPagination`` separa la construcción de las consultas
+    (``get_queryset``, ``get_eliminados``) de su evaluación (``get_page``) para las
+    vistas síncronas y asíncronas.
+    """
+    orden = ('updated_at', 'id')
+
+    def __init__(self, params):
+        """
+        :param params: Parámetros de la query (``request.GET``) con ``since``.
+        :raises CursorInvalido: Si ``since`` o ``page_size`` no son válidos.
+        """
+        self.usuarios, self.eliminados = decodificar_since(params['since'])
+        page_size = params.get('page_size')
+        self.page_size = leer_page_size(page_size) if page_size else settings.USERS_UNPAGINATED_LIMIT
+        self.limite = timezone.now() - timedelta(seconds=settings.USERS_SYNC_LAG)
+
+    def get_queryset(self, queryset):
+        """
+        Usuarios cambiados después del cursor, con una fila extra para saber si hay más.
+        """
+        return _posteriores(queryset, 'updated_at', self.usuarios, self.limite)[:self.page_size + 1]
+
+    def get_eliminados(self):
+        """
+        Bajas posteriores al cursor como tuplas (deleted_at, id, user_id).
+        """
+        queryset = _posteriores(UserTombstone.objects.all(), 'deleted_at', self.eliminados, self.limite)
+        return queryset.values_list('deleted_at', 'id', 'user_id')[:self.page_size + 1]
+
+    def _avance(self, filas, posicion, clave):
+        # Con la página llena el cursor queda en la última fila entregada; si no, en
+        # el límite: lo anterior a ``limite`` ya se entregó completo
+        if len(filas) > self.page_size:
+            return clave(filas[self.page_size - 1]), True
+        return max(posicion, (self.limite, 0)), False
+
+    def get_page(self, filas, eliminados):
+        """
+        Recorta las filas evaluadas y calcula el cursor siguiente.
+        :param filas: Resultado evaluado de ``get_queryset`` (diccionarios de ``values()``).
+        :param eliminados: Resultado evaluado de ``get_eliminados``.
+        :return: Tupla (filas, ids eliminados, cursor, hay_mas).
+        """
+        filas, eliminados = list(filas), list(eliminados)
+        usuarios, mas_usuarios = self._avance(filas, self.usuarios, lambda f: (f['updated_at'], f['id']))
+        bajas, mas_bajas = self._avance(eliminados, self.eliminados, lambda e: (e[0], e[1]))
+        return (
+            filas[:self.page_size],
+            [user_id for _, _, user_id in eliminados[:self.page_size]],
+            codificar_since(usuarios, bajas),
+            mas_usuarios or mas_bajas,
+        )
+
+    def get_response_data(self, data, eliminados, cursor, hay_mas):
+        """
+        :return: ``{"data", "eliminados", "since", "hay_mas"}``; con ``hay_mas`` el
+            cliente vuelve a llamar de inmediato con el nuevo ``since``.
+        """
+        return {"data": data, "eliminados": eliminados, "since": cursor, "hay_mas": hay_mas}
+
+
+def cambios_para_exportar(queryset, since):
+    """
+    Modo ``since`` de la exportación: todos los usuarios cambiados después del
+    cursor, sin límite de filas. Las bajas no caben en el archivo, así que su
+    posición en el cursor no avanza y se obtienen con el listado.
+    :param queryset: QuerySet de ``User`` (ya filtrado).
+    :param since: Valor del parámetro ``since``.
+    :return: Tupla (QuerySet de los cambios, cursor para la siguiente sincronización).
+    :raises CursorInvalido: Si ``since`` no es válido.
+    """
+    usuarios, eliminados = decodificar_since(since)
+    limite = timezone.now() - timedelta(seconds=settings.USERS_SYNC_LAG)
+    queryset = _posteriores(queryset, 'updated_at', usuarios, limite)
+    return queryset, codificar_since(max(usuarios, (limite, 0)), eliminados)
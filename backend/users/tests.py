@@ -1,33 +1,108 @@
+import csv
+import gzip
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+from unittest import mock
+import tracemalloc
+import uuid
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
 import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import AsyncRequestFactory
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from http import HTTPStatus
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 from rest_framework_simplejwt.tokens import RefreshToken
-from .models import User
+from .async_views import AsyncUserListView, AsyncUserDetailView
+from .authentication import clave_usuario_autenticado
+from .models import ExportJob, User, UserTombstone
+from .pagination import UserCursorPagination
+from .parsers import ORJSONParser
+from .renderers import ORJSONRenderer
+from .serializers import UserSerializer, FastUserListSerializer
+from .hashing import hashear_passwords
+from . import compresion, esquema, exportaciones, metrics
+from .middleware import CompresionMiddleware
+from .utils import iterar_users_csv
 from django.test import TestCase
 
+@pytest.fixture(autouse=True)
+def limpiar_cache():
+    # La caché local persiste entre pruebas y los IDs se reutilizan tras cada rollback
+    cache.clear()
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def admin():
+    return User.objects.create_user(email='admin@example.com', password='testpass123')
+
+
+@pytest.fixture
+def test_user():
+    return User.objects.create_user(
+        email='test@example.com', password='testpass123', first_name='Test', last_name='User', phone='1234567890'
+    )
+
+
+@pytest.fixture
+def usuario_autenticado(admin):
+    # Usuario del token de authenticated_client; una clase lo redefine para usar otro
+    return admin
+
+
+@pytest.fixture
+def authenticated_client(usuario_autenticado):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(usuario_autenticado).access_token}')
+    return client
+
+
+@pytest.fixture
+def nuevos_usuarios():
+    """
+    Inserta usuarios ``<prefijo><i>@example.com`` con un solo ``bulk_create`` (sin
+    hashear contraseñas). Cada campo extra se asigna a todos; si es una función
+    recibe ``i``.
+    """
+    def crear(cantidad, prefijo='user', inicio=0, **campos):
+        campos.setdefault('password', '!')
+        return User.objects.bulk_create([
+            User(
+                email=f'{prefijo}{i}@example.com',
+                **{campo: valor(i) if callable(valor) else valor for campo, valor in campos.items()}
+            )
+            for i in range(inicio, inicio + cantidad)
+        ])
+    return crear
+
+
 @pytest.mark.django_db
 class TestUserEndpoints:
     @pytest.fixture
-    def api_client(self):
-        return APIClient()
-    
-    @pytest.fixture
-    def test_user(self):
-        user = User.objects.create_user(
-            email='test@example.com',
-            password='testpass123',
-            first_name='Test',
-            last_name='User',
-            phone='1234567890'
-        )
-        return user
-
-    @pytest.fixture
-    def authenticated_client(self, api_client, test_user):
-        refresh = RefreshToken.for_user(test_user)
-        api_client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
-        return api_client
+    def usuario_autenticado(self, test_user):
+        return test_user
 
     def test_create_user(self, authenticated_client):
         url = reverse('user-list')
@@ -134,4 +209,1951 @@ class TestUserEndpoints:
         # Verificar contenido del CSV
         content = response.content.decode('utf-8')
         assert 'id,email,first_name,last_name,phone,date_joined' in content
-        assert test_user.email in content
\ No newline at end of file
+        assert test_user.email in content
+
+    def test_export_users_csv_streaming(self, authenticated_client, test_user):
+        url = reverse('user-export-csv')
+        response = authenticated_client.get(url, {'stream': 'true'})
+
+        assert response.status_code == HTTPStatus.OK
+        assert response.streaming
+        assert response['Content-Type'] == 'text/csv'
+        assert 'attachment; filename="users.csv"' in response['Content-Disposition']
+
+        content = b''.join(response.streaming_content).decode('utf-8')
+        # El modo streaming conserva el mismo formato que la exportación normal
+        normal = authenticated_client.get(url).content.decode('utf-8')
+        assert content == normal
+        assert content.startswith('id,email,first_name,last_name,phone,date_joined')
+        assert test_user.email in content
+
+
+@pytest.mark.django_db
+class TestUserCSVStreaming:
+    # Filas con todas las columnas llenas, como una tabla real
+    CAMPOS = {
+        'first_name': lambda i: f'Nombre{i}',
+        'last_name': lambda i: f'Apellido{i}',
+        'phone': '5512345678',
+    }
+
+    def _pico_memoria(self, chunk_size):
+        tracemalloc.start()
+        try:
+            for _ in iterar_users_csv(User.objects.all(), chunk_size=chunk_size):
+                pass
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_memoria_acotada_al_crecer_la_tabla(self, nuevos_usuarios):
+        nuevos_usuarios(500, **self.CAMPOS)
+        pico_pequeno = self._pico_memoria(chunk_size=100)
+
+        nuevos_usuarios(9500, inicio=500, **self.CAMPOS)
+        pico_grande = self._pico_memoria(chunk_size=100)
+
+        # 20 veces más filas no deben multiplicar la memoria máxima usada
+        assert pico_grande < pico_pequeno * 2
+
+    def test_bloques_en_orden_de_id(self, nuevos_usuarios):
+        nuevos_usuarios(25, **self.CAMPOS)
+        bloques = list(iterar_users_csv(User.objects.all(), chunk_size=10))
+
+        # Encabezado + 3 bloques (10, 10 y 5 filas)
+        assert len(bloques) == 4
+        filas = list(csv.reader(io.StringIO(''.join(bloques))))
+        assert filas[0] == ['id', 'email', 'first_name', 'last_name', 'phone', 'date_joined']
+        ids = [int(fila[0]) for fila in filas[1:]]
+        assert ids == sorted(ids) and len(ids) == 25
+
+
+@pytest.mark.django_db
+class TestUserListPagination:
+    def _emails(self, response):
+        return [u['email'] for u in response.data['data']]
+
+    def test_recorre_todas_las_paginas_sin_repetir(self, authenticated_client, nuevos_usuarios):
+        nuevos_usuarios(10, prefijo='page')
+        url = reverse('user-list')
+        esperados = list(User.objects.order_by('date_joined', 'id').values_list('email', flat=True))
+
+        vistos = []
+        params = {'page_size': 3}
+        with CaptureQueriesContext(connection) as consultas:
+            while True:
+                response = authenticated_client.get(url, params)
+                assert response.status_code == HTTPStatus.OK
+                vistos += self._emails(response)
+                if not response.data['next']:
+                    break
+                params = {'page_size': 3, 'cursor': response.data['next']}
+
+        assert vistos == esperados
+        assert not any('OFFSET' in q['sql'].upper() for q in consultas.captured_queries)
+
+    def test_pagina_anterior(self, authenticated_client, nuevos_usuarios):
+        nuevos_usuarios(6, prefijo='page')
+        url = reverse('user-list')
+        primera = authenticated_client.get(url, {'page_size': 3})
+        segunda = authenticated_client.get(url, {'page_size': 3, 'cursor': primera.data['next']})
+        assert primera.data['previous'] is None
+
+        anterior = authenticated_client.get(url, {'page_size': 3, 'cursor': segunda.data['previous']})
+        assert self._emails(anterior) == self._emails(primera)
+        assert anterior.data['previous'] is None
+        assert anterior.data['next'] is not None
+
+    def test_paginas_estables_con_inserciones(self, authenticated_client, nuevos_usuarios):
+        nuevos_usuarios(6, prefijo='page')
+        url = reverse('user-list')
+        primera = authenticated_client.get(url, {'page_size': 3})
+        esperada = list(
+            User.objects.order_by('date_joined', 'id').values_list('email', flat=True)[3:6]
+        )
+
+        # Un usuario insertado antes de la posición del cursor no desplaza la siguiente página
+        nuevos_usuarios(1, prefijo='page', inicio=100, date_joined=timezone.now() - timedelta(days=365))
+        segunda = authenticated_client.get(url, {'page_size': 3, 'cursor': primera.data['next']})
+        assert self._emails(segunda) == esperada
+
+    def test_sin_cursor_conserva_el_formato(self, authenticated_client, nuevos_usuarios):
+        nuevos_usuarios(2, prefijo='page')
+        response = authenticated_client.get(reverse('user-list'))
+        assert response.status_code == HTTPStatus.OK
+        assert list(response.data.keys()) == ['data']
+        assert len(response.data['data']) == 3
+
+    def test_sin_cursor_respeta_el_tope(self, authenticated_client, settings, nuevos_usuarios):
+        settings.USERS_UNPAGINATED_LIMIT = 2
+        nuevos_usuarios(4, prefijo='page')
+        response = authenticated_client.get(reverse('user-list'))
+        assert len(response.data['data']) == 2
+        assert response.data['next']
+
+    def test_page_size_maximo(self, authenticated_client, settings, nuevos_usuarios):
+        settings.USERS_MAX_PAGE_SIZE = 2
+        nuevos_usuarios(4, prefijo='page')
+        response = authenticated_client.get(reverse('user-list'), {'page_size': 100})
+        assert len(response.data['data']) == 2
+
+    @pytest.mark.parametrize('params', [{'cursor': 'no-es-un-cursor'}, {'page_size': 'abc'}, {'page_size': 0}])
+    def test_parametros_invalidos(self, authenticated_client, params):
+        response = authenticated_client.get(reverse('user-list'), params)
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestUserBulkCreate:
+    def _fila(self, i, **extra):
+        return dict({
+            'email': f'bulk{i}@example.com',
+            'password': 'bulkpass123',
+            'first_name': 'Bulk',
+            'last_name': f'User{i}',
+        }, **extra)
+
+    def test_crea_todas_las_filas(self, authenticated_client):
+        filas = [self._fila(i) for i in range(3)]
+        response = authenticated_client.post(reverse('user-bulk'), filas, format='json')
+
+        assert response.status_code == HTTPStatus.CREATED
+        assert response.data['creados'] == 3
+        assert [r['estado'] for r in response.data['resultados']] == ['creado'] * 3
+        user = User.objects.get(email='bulk1@example.com')
+        assert user.id == response.data['resultados'][1]['id']
+        assert user.check_password('bulkpass123')
+
+    def test_reporte_por_fila(self, authenticated_client):
+        filas = [
+            self._fila(0),
+            self._fila(1, password='corta'),
+            self._fila(0),  # Duplicado dentro del lote
+            self._fila(2, email='admin@example.com'),  # Ya existe
+            'no es un objeto',
+        ]
+        response = authenticated_client.post(reverse('user-bulk'), filas, format='json')
+
+        assert response.status_code == HTTPStatus.MULTI_STATUS
+        estados = [r['estado'] for r in response.data['resultados']]
+        assert estados == ['creado', 'error', 'error', 'error', 'error']
+        assert 'password' in response.data['resultados'][1]['error']
+        assert response.data['resultados'][2]['error']['email'] == ['Error el correo ya existe']
+        assert response.data['resultados'][3]['error']['email'] == ['Error el correo ya existe']
+        assert User.objects.filter(email__startswith='bulk').count() == 1
+
+    def test_ndjson(self, authenticated_client):
+        cuerpo = '\n'.join(json.dumps(self._fila(i)) for i in range(2)) + '\n'
+        response = authenticated_client.post(
+            reverse('user-bulk'), cuerpo, content_type='application/x-ndjson'
+        )
+        assert response.status_code == HTTPStatus.CREATED
+        assert User.objects.filter(email__startswith='bulk').count() == 2
+
+    def test_ninguna_fila_valida(self, authenticated_client):
+        response = authenticated_client.post(
+            reverse('user-bulk'), [self._fila(0, email='invalido')], format='json'
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert response.data['creados'] == 0
+
+    def test_limite_de_filas(self, authenticated_client, settings):
+        settings.USERS_BULK_MAX_ROWS = 1
+        response = authenticated_client.post(
+            reverse('user-bulk'), [self._fila(0), self._fila(1)], format='json'
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert not User.objects.filter(email__startswith='bulk').exists()
+
+    def test_hasheo_en_pool_de_procesos(self, settings):
+        settings.USERS_HASH_WORKERS = 2
+        settings.USERS_HASH_POOL_MIN = 0
+        hashes = hashear_passwords(['uno12345', 'dos12345', 'tres1234'])
+        assert [check_password(p, h) for p, h in zip(['uno12345', 'dos12345', 'tres1234'], hashes)] == [True] * 3
+
+
+@pytest.mark.django_db
+class TestAsyncUserViews:
+    @pytest.fixture
+    def headers(self, test_user):
+        return {'Authorization': f'Bearer {RefreshToken.for_user(test_user).access_token}'}
+
+    def _llamar(self, vista, request, **kwargs):
+        response = async_to_sync(vista.as_view())(request, **kwargs)
+        return response, json.loads(response.content or b'{}')
+
+    def test_lista_igual_a_la_vista_sincrona(self, headers, test_user):
+        request = AsyncRequestFactory().get('/api/v1/users/', headers=headers)
+        response, data = self._llamar(AsyncUserListView, request)
+        assert response.status_code == HTTPStatus.OK
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=headers['Authorization'])
+        assert data == client.get(reverse('user-list')).json()
+
+    def test_sin_token(self):
+        request = AsyncRequestFactory().get('/api/v1/users/')
+        response, _ = self._llamar(AsyncUserListView, request)
+        assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+    def test_crear_usuario(self, headers):
+        datos = {'email': 'async@example.com', 'password': 'asyncpass123', 'first_name': 'A', 'last_name': 'B'}
+        request = AsyncRequestFactory().post(
+            '/api/v1/users/', datos, content_type='application/json', headers=headers
+        )
+        response, data = self._llamar(AsyncUserListView, request)
+        assert response.status_code == HTTPStatus.CREATED
+        assert data['data']['email'] == 'async@example.com'
+        assert User.objects.get(email='async@example.com').check_password('asyncpass123')
+
+    def test_crear_usuario_duplicado(self, headers, test_user):
+        datos = {'email': test_user.email, 'password': 'asyncpass123', 'first_name': 'A', 'last_name': 'B'}
+        request = AsyncRequestFactory().post(
+            '/api/v1/users/', datos, content_type='application/json', headers=headers
+        )
+        response, data = self._llamar(AsyncUserListView, request)
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert 'email' in data['error']
+
+    def test_actualizar_y_eliminar(self, headers, test_user):
+        otro = User.objects.create_user(email='otro@example.com', password='testpass123')
+        factory = AsyncRequestFactory()
+
+        request = factory.put(
+            f'/api/v1/users/{otro.id}/', {'first_name': 'Nuevo', 'password': 'cambiada123'},
+            content_type='application/json', headers=headers
+        )
+        response, data = self._llamar(AsyncUserDetailView, request, id=otro.id)
+        assert response.status_code == HTTPStatus.OK
+        otro.refresh_from_db()
+        assert otro.first_name == 'Nuevo'
+        assert otro.check_password('cambiada123')
+
+        request = factory.delete(f'/api/v1/users/{otro.id}/', headers=headers)
+        response, _ = self._llamar(AsyncUserDetailView, request, id=otro.id)
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        assert not User.objects.filter(id=otro.id).exists()
+
+        response, _ = self._llamar(AsyncUserDetailView, factory.delete('/', headers=headers), id=otro.id)
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
+    def test_crear_usuario_con_formulario(self, headers):
+        # Los mismos parsers que la vista síncrona: JSON, formulario y multipart
+        datos = {'email': 'form@example.com', 'password': 'formpass123', 'first_name': 'F', 'last_name': 'G'}
+        response, data = self._llamar(AsyncUserListView, AsyncRequestFactory().post('/api/v1/users/', datos, headers=headers))
+        assert response.status_code == HTTPStatus.CREATED
+        assert data['data']['email'] == 'form@example.com'
+
+        request = AsyncRequestFactory().post(
+            '/api/v1/users/', '{"email":', content_type='application/json', headers=headers
+        )
+        response, data = self._llamar(AsyncUserListView, request)
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert 'detail' in data
+
+    @pytest.fixture
+    def check_revoke_token(self):
+        from rest_framework_simplejwt import tokens
+        from . import authentication
+        # Los módulos guardan su referencia a api_settings: se cambia el objeto que usan
+        with mock.patch.object(tokens.api_settings, 'CHECK_REVOKE_TOKEN', True), \
+                mock.patch.object(authentication.api_settings, 'CHECK_REVOKE_TOKEN', True):
+            yield
+
+    def test_token_revocado_al_cambiar_la_contrasena(self, test_user, check_revoke_token):
+        headers = {'Authorization': f'Bearer {RefreshToken.for_user(test_user).access_token}'}
+        response, _ = self._llamar(AsyncUserListView, AsyncRequestFactory().get('/api/v1/users/', headers=headers))
+        assert response.status_code == HTTPStatus.OK
+
+        test_user.set_password('otrapass123')
+        test_user.save()
+        response, data = self._llamar(AsyncUserListView, AsyncRequestFactory().get('/api/v1/users/', headers=headers))
+        assert response.status_code == HTTPStatus.UNAUTHORIZED
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=headers['Authorization'])
+        assert client.get(reverse('user-list')).status_code == HTTPStatus.UNAUTHORIZED
+
+    def test_etag_compartido_con_la_vista_sincrona(self, headers):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=headers['Authorization'])
+        etag = client.get(reverse('user-list'), {'page_size': 5})['ETag']
+
+        request = AsyncRequestFactory().get('/api/v1/users/', {'page_size': 5}, headers=headers)
+        response, _ = self._llamar(AsyncUserListView, request)
+        assert response['ETag'] == etag
+
+        request = AsyncRequestFactory().get(
+            '/api/v1/users/', {'page_size': 5}, headers={**headers, 'If-None-Match': etag}
+        )
+        response, _ = self._llamar(AsyncUserListView, request)
+        assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+
+@pytest.mark.django_db
+class TestFastUserListSerializer:
+    def test_misma_salida_que_user_serializer(self):
+        User.objects.bulk_create([
+            User(email='a@example.com', password='!', first_name='Ána', last_name='Pérez', phone='5512345678'),
+            User(email='b@example.com', password='!', first_name='', last_name='', phone=''),
+        ])
+        User.objects.filter(email='b@example.com').update(
+            date_joined=datetime(2024, 3, 1, 12, 30, 0, tzinfo=dt_timezone.utc)
+        )
+        queryset = User.objects.order_by('id')
+        serializer = FastUserListSerializer()
+
+        for zona in ('UTC', 'America/Mexico_City'):
+            with timezone.override(zona):
+                esperado = UserSerializer(queryset, many=True).data
+                rapido = serializer.serializar(list(serializer.get_queryset(queryset)))
+            assert json.dumps(rapido) == json.dumps(esperado)
+
+    def test_solo_consulta_los_campos_publicos(self):
+        sql = str(FastUserListSerializer().get_queryset(User.objects.all()).query)
+        assert 'password' not in sql
+        assert 'is_superuser' not in sql
+
+
+@pytest.mark.django_db
+class TestUserListCache:
+    @pytest.fixture
+    def usuario_autenticado(self, test_user):
+        return test_user
+
+    def test_respuesta_en_cache_no_consulta_usuarios(self, authenticated_client):
+        url = reverse('user-list')
+        primera = authenticated_client.get(url)
+
+        with CaptureQueriesContext(connection) as consultas:
+            segunda = authenticated_client.get(url)
+        assert segunda.data == primera.data
+        # El usuario del token y la lista salen de la caché
+        assert len(consultas.captured_queries) == 0
+
+    def test_parametros_distintos_no_comparten_entrada(self, authenticated_client):
+        url = reverse('user-list')
+        User.objects.create_user(email='otro@example.com', password='testpass123')
+        completa = authenticated_client.get(url)
+        pagina = authenticated_client.get(url, {'page_size': 1})
+        assert len(completa.data['data']) == 2
+        assert len(pagina.data['data']) == 1
+        assert completa['ETag'] != pagina['ETag']
+
+    def test_etag_y_304(self, authenticated_client):
+        url = reverse('user-list')
+        response = authenticated_client.get(url)
+        etag = response['ETag']
+
+        no_modificado = authenticated_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert no_modificado.status_code == HTTPStatus.NOT_MODIFIED
+        assert no_modificado.content == b''
+        assert no_modificado['ETag'] == etag
+
+    def test_guardar_o_eliminar_invalida(self, authenticated_client, test_user):
+        url = reverse('user-list')
+        etag = authenticated_client.get(url)['ETag']
+
+        otro = User.objects.create_user(email='otro@example.com', password='testpass123')
+        response = authenticated_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.OK
+        assert len(response.data['data']) == 2
+
+        otro.delete()
+        response = authenticated_client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        assert response.status_code == HTTPStatus.OK
+        assert len(response.data['data']) == 1
+
+    def test_alta_masiva_invalida(self, authenticated_client):
+        url = reverse('user-list')
+        authenticated_client.get(url)
+        authenticated_client.post(reverse('user-bulk'), [{
+            'email': 'bulk@example.com', 'password': 'bulkpass123', 'first_name': 'B', 'last_name': 'U'
+        }], format='json')
+        assert len(authenticated_client.get(url).data['data']) == 2
+
+
+@pytest.mark.django_db
+class TestCachedJWTAuthentication:
+    @pytest.fixture
+    def usuario_autenticado(self, test_user):
+        return test_user
+
+    def test_usuario_se_consulta_una_sola_vez(self, authenticated_client):
+        otro = User.objects.create_user(email='otro@example.com', password='testpass123')
+        url = reverse('user-detail', kwargs={'id': otro.id})
+        with CaptureQueriesContext(connection) as primera:
+            authenticated_client.put(url, {'first_name': 'Uno'})
+        with CaptureQueriesContext(connection) as segunda:
+            authenticated_client.put(url, {'last_name': 'Dos'})
+
+        # La segunda petición ya no consulta al usuario del token
+        assert len(segunda.captured_queries) == len(primera.captured_queries) - 1
+
+    def test_desactivar_con_save_rechaza_de_inmediato(self, authenticated_client, test_user):
+        url = reverse('user-list')
+        assert authenticated_client.get(url).status_code == HTTPStatus.OK
+
+        test_user.is_active = False
+        test_user.save()
+        assert authenticated_client.get(url).status_code == HTTPStatus.UNAUTHORIZED
+
+    def test_desactivar_sin_senales_rechaza_al_vencer_el_ttl(self, authenticated_client, test_user, settings, monkeypatch):
+        settings.USERS_AUTH_CACHE_TTL = 5
+        url = reverse('user-list')
+        assert authenticated_client.get(url).status_code == HTTPStatus.OK
+
+        User.objects.filter(id=test_user.id).update(is_active=False)
+        # Dentro del TTL se sigue usando el usuario en caché
+        assert authenticated_client.get(url).status_code == HTTPStatus.OK
+
+        ahora = time.time()
+        monkeypatch.setattr('django.core.cache.backends.locmem.time.time', lambda: ahora + 6)
+        assert authenticated_client.get(url).status_code == HTTPStatus.UNAUTHORIZED
+
+    def test_guardar_last_login_no_invalida(self, authenticated_client, test_user):
+        authenticated_client.get(reverse('user-list'))
+        test_user.last_login = timezone.now()
+        test_user.save(update_fields=['last_login'])
+        assert cache.get(clave_usuario_autenticado(test_user.id)) is not None
+
+        test_user.set_password('nuevapass123')
+        test_user.save()
+        assert cache.get(clave_usuario_autenticado(test_user.id)) is None
+
+
+@pytest.mark.django_db
+class TestLogin:
+    def test_un_solo_hasheo_por_login(self, test_user):
+        with mock.patch.object(
+            PBKDF2PasswordHasher, 'verify', autospec=True, side_effect=PBKDF2PasswordHasher.verify
+        ) as verify:
+            response = APIClient().post(reverse('token_obtain_pair'), {
+                'email': 'test@example.com', 'password': 'testpass123'
+            })
+        assert response.status_code == HTTPStatus.OK
+        assert verify.call_count == 1
+
+    def test_respuesta_del_login(self, test_user):
+        response = APIClient().post(reverse('token_obtain_pair'), {
+            'email': 'test@example.com', 'password': 'testpass123'
+        })
+        assert list(response.data.keys()) == ['refresh', 'access', 'user']
+        assert response.data['user'] == {
+            'id': test_user.id, 'email': 'test@example.com', 'first_name': 'Test', 'last_name': 'User'
+        }
+
+    def test_usuario_inactivo(self, test_user):
+        test_user.is_active = False
+        test_user.save()
+        response = APIClient().post(reverse('token_obtain_pair'), {
+            'email': 'test@example.com', 'password': 'testpass123'
+        })
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+
+@pytest.mark.django_db
+class TestLoginThrottle:
+    def _login(self, email='test@example.com', password='testpass123', ip='10.0.0.1'):
+        return APIClient().post(
+            reverse('token_obtain_pair'), {'email': email, 'password': password}, REMOTE_ADDR=ip
+        )
+
+    def _contar_hasheos(self):
+        return mock.patch.object(
+            PBKDF2PasswordHasher, 'verify', autospec=True, side_effect=PBKDF2PasswordHasher.verify
+        )
+
+    def test_bucket_por_email(self, test_user, settings):
+        settings.USERS_LOGIN_EMAIL_BURST = 3
+        for i in range(3):
+            assert self._login(password='mala', ip=f'10.0.0.{i}').status_code == HTTPStatus.BAD_REQUEST
+        # Otra IP y el email con otras mayúsculas: el bucket es del email
+        with self._contar_hasheos() as verify:
+            response = self._login(email=' TEST@example.com', ip='10.0.0.99')
+        assert response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+        assert int(response['Retry-After']) >= 1
+        assert verify.call_count == 0
+        # Otro email desde la misma IP sí pasa
+        assert self._login(email='otro@example.com', ip='10.0.0.1').status_code == HTTPStatus.BAD_REQUEST
+
+    def test_bucket_por_ip(self, test_user, settings):
+        settings.USERS_LOGIN_IP_BURST = 2
+        for i in range(2):
+            assert self._login(email=f'x{i}@example.com').status_code == HTTPStatus.BAD_REQUEST
+        with self._contar_hasheos() as verify:
+            assert self._login().status_code == HTTPStatus.TOO_MANY_REQUESTS
+        assert verify.call_count == 0
+        assert self._login(ip='10.0.0.2').status_code == HTTPStatus.OK
+
+    def test_x_forwarded_for_no_cambia_el_bucket(self, test_user, settings):
+        settings.USERS_LOGIN_IP_BURST = 2
+        cliente = APIClient()
+        estados = [
+            cliente.post(
+                reverse('token_obtain_pair'), {'email': f'x{i}@example.com', 'password': 'mala'},
+                REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR=f'203.0.113.{i}',
+            ).status_code
+            for i in range(3)
+        ]
+        assert estados == [HTTPStatus.BAD_REQUEST, HTTPStatus.BAD_REQUEST, HTTPStatus.TOO_MANY_REQUESTS]
+
+    def test_bucket_se_recarga(self):
+        from .throttling import consumir_fichas
+        bucket = [('users:login:prueba', 2, 1 / 30)]
+        assert consumir_fichas(bucket, ahora=1000) == 0
+        assert consumir_fichas(bucket, ahora=1000) == 0
+        assert consumir_fichas(bucket, ahora=1000) == pytest.approx(30)
+        assert consumir_fichas(bucket, ahora=1015) == pytest.approx(15)
+        assert consumir_fichas(bucket, ahora=1030) == 0
+
+    def test_tope_de_hasheos_simultaneos(self, test_user, settings):
+        from .throttling import turno_de_hasheo
+        settings.USERS_LOGIN_MAX_HASHES = 1
+        settings.USERS_LOGIN_HASH_WAIT = 0
+        with turno_de_hasheo() as concedido:
+            assert concedido
+            with self._contar_hasheos() as verify:
+                response = self._login()
+            assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+            assert response['Retry-After'] == '1'
+            assert verify.call_count == 0
+        # Al liberar el lugar el login vuelve a funcionar
+        assert self._login().status_code == HTTPStatus.OK
+
+
+@pytest.mark.django_db
+class TestSeedUsers:
+    def _datos(self):
+        return list(User.objects.order_by('email').values_list('email', 'first_name', 'last_name', 'phone'))
+
+    def test_genera_usuarios_reproducibles(self):
+        call_command('seed_users', cantidad=50, lote=20, semilla=3, dias=30, stdout=io.StringIO())
+        primera = self._datos()
+        assert len(primera) == 50
+
+        call_command('seed_users', cantidad=50, semilla=3, dias=30, limpiar=True, stdout=io.StringIO())
+        assert self._datos() == primera
+
+    def test_conserva_la_dispersion_de_date_joined(self):
+        call_command('seed_users', cantidad=100, semilla=1, dias=10, stdout=io.StringIO())
+        fechas = list(User.objects.values_list('date_joined', flat=True))
+        assert min(fechas) >= timezone.now() - timedelta(days=10)
+        assert max(fechas) - min(fechas) > timedelta(days=1)
+        # Todos comparten el mismo hash y pueden iniciar sesión
+        assert User.objects.values('password').distinct().count() == 1
+        assert User.objects.first().check_password('cargapass123')
+
+
+@pytest.mark.django_db
+class TestInstrumentacion:
+    @pytest.fixture(autouse=True)
+    def limpiar_metricas(self):
+        for histograma in metrics.HISTOGRAMAS:
+            histograma.limpiar()
+
+    def test_server_timing_en_el_listado(self, authenticated_client):
+        response = authenticated_client.get(reverse('user-list'))
+        assert response.status_code == HTTPStatus.OK
+        timing = response['Server-Timing']
+        assert 'total;dur=' in timing
+        assert 'queries"' in timing
+        assert 'render;dur=' in timing
+
+    def test_histogramas_por_vista(self, authenticated_client):
+        authenticated_client.get(reverse('user-list'))
+        authenticated_client.get(reverse('user-list'))
+        authenticated_client.get(reverse('user-export-csv'))
+
+        response = APIClient().get(reverse('metrics'))
+        assert response.status_code == HTTPStatus.OK
+        assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+        texto = response.content.decode()
+        assert 'http_request_duration_seconds_count{view="user-list"} 2' in texto
+        assert 'http_request_duration_seconds_count{view="user-export-csv"} 1' in texto
+        assert 'http_request_db_queries_count{view="user-list"} 2' in texto
+        assert 'http_response_size_bytes_bucket{view="user-list",le="+Inf"} 2' in texto
+        # /metrics no se mide a sí mismo
+        assert 'view="metrics"' not in texto
+
+    def test_streaming_no_registra_tamano(self, authenticated_client):
+        response = authenticated_client.get(reverse('user-export-csv'), {'stream': 'true'})
+        assert 'total;dur=' in response['Server-Timing']
+        assert 'user-export-csv' not in '\n'.join(metrics.TAMANO_RESPUESTA.exportar())
+
+    def test_token_de_metricas(self, settings):
+        settings.METRICS_TOKEN = 'secreto'
+        assert APIClient().get(reverse('metrics')).status_code == HTTPStatus.UNAUTHORIZED
+        response = APIClient().get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secreto')
+        assert response.status_code == HTTPStatus.OK
+
+
+@pytest.mark.django_db
+class TestUserListFilters:
+    @pytest.fixture
+    def usuarios(self):
+        base = timezone.now() - timedelta(days=30)
+        datos = [
+            ('Maria.Lopez@example.com', 'María', 'López Pérez', True, 0),
+            ('mario@example.com', 'Mario', 'Gómez', True, 5),
+            ('ana@otro.example', 'Ana', 'Mariscal', False, 10),
+            ('luis@example.com', 'Luis', 'Hernández', True, 20),
+        ]
+        for email, nombre, apellidos, activo, dias in datos:
+            user = User.objects.create_user(
+                email=email, password='x', first_name=nombre, last_name=apellidos, is_active=activo
+            )
+            User.objects.filter(id=user.id).update(date_joined=base + timedelta(days=dias))
+
+    def _emails(self, client, **params):
+        response = client.get(reverse('user-list'), params)
+        assert response.status_code == HTTPStatus.OK
+        return sorted(u['email'] for u in response.data['data'])
+
+    def test_prefijo_de_email_sin_distinguir_mayusculas(self, authenticated_client, usuarios):
+        assert self._emails(authenticated_client, email='MARI') == ['Maria.Lopez@example.com', 'mario@example.com']
+        assert self._emails(authenticated_client, email='maria.') == ['Maria.Lopez@example.com']
+        # Los comodines de LIKE se buscan literalmente
+        assert self._emails(authenticated_client, email='mar_') == []
+
+    def test_prefijo_que_termina_en_puntuacion(self, authenticated_client):
+        for email in ('juan.perez@example.com', 'juanperez@example.com', 'juan-perez@example.com',
+                      'juan/perez@example.com', 'JUAN.Diaz@example.com'):
+            User.objects.create_user(email=email, password=None)
+        assert self._emails(authenticated_client, email='juan.') == [
+            'JUAN.Diaz@example.com', 'juan.perez@example.com'
+        ]
+        assert self._emails(authenticated_client, email='juan-') == ['juan-perez@example.com']
+
+    def test_prefijo_sin_rango_en_postgresql(self):
+        from .filters import filtrar_usuarios
+        # El rango depende de la intercalación; en PostgreSQL basta LIKE con el índice pattern_ops
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            sql = str(filtrar_usuarios(User.objects.all(), {'email': 'juan.'}).query)
+        assert 'LIKE' in sql
+        assert '>=' not in sql and '<' not in sql
+
+    def test_busqueda_por_nombre(self, authenticated_client, usuarios):
+        assert self._emails(authenticated_client, search='MARI') == ['ana@otro.example', 'mario@example.com']
+        # Cada término debe aparecer en el nombre o los apellidos
+        assert self._emails(authenticated_client, search='mar lópez') == ['Maria.Lopez@example.com']
+
+    def test_rango_de_date_joined(self, authenticated_client, usuarios):
+        base = timezone.localtime(timezone.now() - timedelta(days=30)).date()
+        emails = self._emails(
+            authenticated_client,
+            joined_after=(base + timedelta(days=4)).isoformat(),
+            joined_before=(base + timedelta(days=10)).isoformat(),
+        )
+        assert emails == ['ana@otro.example', 'mario@example.com']
+
+    def test_is_active(self, authenticated_client, usuarios):
+        assert self._emails(authenticated_client, is_active='false') == ['ana@otro.example']
+        assert 'ana@otro.example' not in self._emails(authenticated_client, is_active='true')
+
+    def test_filtros_con_paginacion(self, authenticated_client, usuarios):
+        response = authenticated_client.get(reverse('user-list'), {'search': 'mar', 'page_size': 2})
+        assert len(response.data['data']) == 2
+        siguiente = authenticated_client.get(
+            reverse('user-list'), {'search': 'mar', 'page_size': 2, 'cursor': response.data['next']}
+        )
+        assert len(siguiente.data['data']) == 1
+        assert siguiente.data['next'] is None
+
+    @pytest.mark.parametrize('params', [
+        {'is_active': 'quizas'},
+        {'joined_after': 'ayer'},
+        {'joined_before': '2024-13-01'},
+    ])
+    def test_filtro_invalido(self, authenticated_client, params):
+        response = authenticated_client.get(reverse('user-list'), params)
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert 'mensaje' in response.data
+
+    def test_filtros_en_la_vista_asincrona(self, usuarios):
+        user = User.objects.get(email='luis@example.com')
+        request = AsyncRequestFactory().get(
+            '/api/v1/users/', {'email': 'mar', 'is_active': 'true'},
+            headers={'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}'}
+        )
+        response = async_to_sync(AsyncUserListView.as_view())(request)
+        data = json.loads(response.content)['data']
+        assert sorted(u['email'] for u in data) == ['Maria.Lopez@example.com', 'mario@example.com']
+
+
+@pytest.mark.django_db
+class TestUserFilterIndexes:
+    """
+    Los filtros comunes deben resolverse con índices y no recorriendo la tabla.
+    """
+    def _plan(self, **params):
+        from .filters import filtrar_usuarios
+        paginacion = UserCursorPagination({'page_size': '50'})
+        queryset = paginacion.get_queryset(filtrar_usuarios(User.objects.all(), params))
+        return queryset.explain()
+
+    @pytest.mark.skipif(connection.vendor != 'sqlite', reason="Plan de SQLite")
+    @pytest.mark.parametrize('params, indice', [
+        ({'email': 'mari'}, 'users_user_email_lower_idx'),
+        ({'is_active': 'false'}, 'users_user_active_joined_idx'),
+        ({'joined_after': '2024-01-01'}, 'users_user_joined_id_idx'),
+    ])
+    def test_filtros_usan_indices_en_sqlite(self, params, indice):
+        plan = self._plan(**params)
+        assert f'USING INDEX {indice}' in plan or f'USING COVERING INDEX {indice}' in plan
+        assert 'SCAN users_user\n' not in plan + '\n'
+
+    @pytest.mark.skipif(connection.vendor != 'postgresql', reason="Plan de PostgreSQL")
+    @pytest.mark.parametrize('params, indice', [
+        ({'email': 'mari'}, 'users_user_email_lower_idx'),
+        ({'search': 'mari'}, 'users_user_first_name_trgm_idx'),
+    ])
+    def test_filtros_usan_indices_en_postgresql(self, params, indice):
+        with connection.cursor() as cursor:
+            # Con la tabla casi vacía el planificador prefiere un Seq Scan
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        assert indice in self._plan(**params)
+
+
+@pytest.mark.django_db
+class TestSincronizacion:
+    @pytest.fixture(autouse=True)
+    def sin_margen(self, settings):
+        settings.USERS_SYNC_LAG = 0
+
+    @pytest.fixture
+    def usuarios(self):
+        return [
+            User.objects.create_user(email=f'sync{i}@example.com', password='x', first_name='Sync', last_name=f'N{i}')
+            for i in range(4)
+        ]
+
+    def _sincronizar(self, client, since, **params):
+        response = client.get(reverse('user-list'), {'since': since, **params})
+        assert response.status_code == HTTPStatus.OK, response.data
+        return response.data
+
+    def test_entrega_solo_cambios_y_bajas(self, authenticated_client, admin, usuarios):
+        inicial = self._sincronizar(authenticated_client, '1970-01-01')
+        assert {u['id'] for u in inicial['data']} == {admin.id, *(u.id for u in usuarios)}
+        assert inicial['eliminados'] == [] and not inicial['hay_mas']
+
+        # Sin cambios no se entrega nada
+        assert self._sincronizar(authenticated_client, inicial['since'])['data'] == []
+
+        authenticated_client.put(
+            reverse('user-detail', kwargs={'id': usuarios[0].id}), {'first_name': 'Cambiado'}, format='json'
+        )
+        authenticated_client.delete(reverse('user-detail', kwargs={'id': usuarios[1].id}))
+        User.objects.create_user(email='nuevo@example.com', password='x')
+
+        cambios = self._sincronizar(authenticated_client, inicial['since'])
+        assert sorted(u['email'] for u in cambios['data']) == ['nuevo@example.com', 'sync0@example.com']
+        assert cambios['eliminados'] == [usuarios[1].id]
+        siguiente = self._sincronizar(authenticated_client, cambios['since'])
+        assert siguiente['data'] == [] and siguiente['eliminados'] == []
+
+    def test_operaciones_masivas_actualizan_updated_at(self, authenticated_client, usuarios):
+        since = self._sincronizar(authenticated_client, '1970-01-01')['since']
+        authenticated_client.patch(reverse('user-bulk'), [{'id': usuarios[0].id, 'phone': '5511111111'}], format='json')
+        authenticated_client.patch(
+            reverse('user-bulk'), {'filtro': {'ids': [usuarios[1].id]}, 'cambios': {'is_active': False}}, format='json'
+        )
+        authenticated_client.delete(reverse('user-bulk'), {'ids': [usuarios[2].id]}, format='json')
+
+        cambios = self._sincronizar(authenticated_client, since)
+        assert sorted(u['id'] for u in cambios['data']) == [usuarios[0].id, usuarios[1].id]
+        assert cambios['eliminados'] == [usuarios[2].id]
+
+    def test_paginas_con_hay_mas(self, authenticated_client, admin, usuarios):
+        since, vistos = '1970-01-01', []
+        for _ in range(10):
+            pagina = self._sincronizar(authenticated_client, since, page_size=2, fields='id')
+            vistos += [u['id'] for u in pagina['data']]
+            assert all(list(u) == ['id'] for u in pagina['data'])
+            since = pagina['since']
+            if not pagina['hay_mas']:
+                break
+        assert sorted(vistos) == sorted([admin.id, *(u.id for u in usuarios)])
+
+    def test_margen_para_transacciones_abiertas(self, authenticated_client, usuarios, settings):
+        settings.USERS_SYNC_LAG = 3600
+        respuesta = self._sincronizar(authenticated_client, '1970-01-01')
+        # Los cambios recientes no se entregan ni quedan detrás del cursor
+        assert respuesta['data'] == []
+        settings.USERS_SYNC_LAG = 0
+        assert len(self._sincronizar(authenticated_client, respuesta['since'])['data']) == 5
+
+    def test_since_invalido(self, authenticated_client):
+        response = authenticated_client.get(reverse('user-list'), {'since': 'no-es-cursor'})
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        response = authenticated_client.get(reverse('user-export-csv'), {'since': 'no-es-cursor'})
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    def test_exportacion_incremental(self, authenticated_client, usuarios):
+        response = authenticated_client.get(reverse('user-export-csv'), {'since': '1970-01-01', 'fields': 'email'})
+        assert len(response.content.decode('utf-8').splitlines()) == 6
+        cursor = response['X-Sync-Cursor']
+
+        usuarios[3].first_name = 'Otro'
+        usuarios[3].save()
+        eliminado = usuarios[2].id
+        usuarios[2].delete()
+        response = authenticated_client.get(reverse('user-export-csv'), {'since': cursor, 'fields': 'email'})
+        assert response.content.decode('utf-8').splitlines() == ['email', 'sync3@example.com']
+        # La exportación no entrega bajas: el listado las entrega con el mismo cursor
+        cambios = self._sincronizar(authenticated_client, response['X-Sync-Cursor'])
+        assert cambios['data'] == [] and cambios['eliminados'] == [eliminado]
+
+    def test_async(self, admin, usuarios):
+        since = self._sincronizar_async(admin, '1970-01-01')['since']
+        User.objects.filter(id=usuarios[0].id).delete()
+        cambios = self._sincronizar_async(admin, since)
+        assert cambios['data'] == [] and cambios['eliminados'] == [usuarios[0].id]
+
+    def _sincronizar_async(self, admin, since):
+        request = AsyncRequestFactory().get(
+            '/api/v1/users/', {'since': since},
+            headers={'Authorization': f'Bearer {RefreshToken.for_user(admin).access_token}'}
+        )
+        response = async_to_sync(AsyncUserListView.as_view())(request)
+        assert response.status_code == HTTPStatus.OK
+        return json.loads(response.content)
+
+    @pytest.mark.skipif(connection.vendor != 'sqlite', reason="Plan de SQLite")
+    def test_consultas_usan_indices(self):
+        from .sincronizacion import SincronizacionUsuarios
+        sincronizacion = SincronizacionUsuarios({'since': '2024-01-01', 'page_size': '50'})
+        plan = sincronizacion.get_queryset(User.objects.all()).explain()
+        assert 'users_user_updated_idx' in plan
+        assert 'users_tombstone_deleted_idx' in sincronizacion.get_eliminados().explain()
+
+
+@pytest.mark.django_db
+class TestSparseFieldsets:
+    @pytest.fixture
+    def usuario_autenticado(self, test_user):
+        return test_user
+
+    def test_lista_con_campos(self, authenticated_client):
+        with CaptureQueriesContext(connection) as capturadas:
+            response = authenticated_client.get(reverse('user-list'), {'fields': 'email,id'})
+        assert response.status_code == HTTPStatus.OK
+        assert response.data['data'] == [{'email': 'test@example.com', 'id': User.objects.get().id}]
+        consulta = capturadas.captured_queries[-1]['sql']
+        assert '"password"' not in consulta and '"first_name"' not in consulta
+
+    def test_lista_paginada_con_campos(self, authenticated_client):
+        for i in range(3):
+            User.objects.create_user(email=f'user{i}@example.com', password='x')
+        response = authenticated_client.get(reverse('user-list'), {'fields': 'email', 'page_size': 2})
+        assert all(list(fila) == ['email'] for fila in response.data['data'])
+        # El cursor se calcula con date_joined e id aunque no se devuelvan
+        siguiente = authenticated_client.get(
+            reverse('user-list'), {'fields': 'email', 'page_size': 2, 'cursor': response.data['next']}
+        )
+        emails = [u['email'] for u in response.data['data'] + siguiente.data['data']]
+        assert sorted(emails) == sorted(User.objects.values_list('email', flat=True))
+
+    @pytest.mark.parametrize('url', ['user-list', 'user-export-csv'])
+    def test_campo_no_permitido(self, authenticated_client, url):
+        response = authenticated_client.get(reverse(url), {'fields': 'email,password'})
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert 'password' in json.loads(response.content)['mensaje']
+
+    @pytest.mark.parametrize('stream', ['false', 'true'])
+    def test_export_csv_con_columnas(self, authenticated_client, stream):
+        with CaptureQueriesContext(connection) as capturadas:
+            response = authenticated_client.get(
+                reverse('user-export-csv'), {'fields': 'email,date_joined', 'stream': stream}
+            )
+            contenido = b''.join(response.streaming_content) if response.streaming else response.content
+        filas = list(csv.reader(io.StringIO(contenido.decode('utf-8'))))
+        assert filas[0] == ['email', 'date_joined']
+        assert filas[1][0] == 'test@example.com'
+        assert all('"password"' not in q['sql'] for q in capturadas.captured_queries)
+
+
+@pytest.mark.django_db
+class TestExportFormats:
+    @pytest.fixture(autouse=True)
+    def usuarios(self):
+        for i in range(3):
+            User.objects.create_user(
+                email=f'fmt{i}@example.com', password='x', first_name='Formato', last_name=f'Núñez{i}'
+            )
+
+    def _descargar(self, params=None, **headers):
+        response = APIClient().get(reverse('user-export-csv'), params or {}, **headers)
+        contenido = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, contenido
+
+    def test_ndjson_con_tipos(self):
+        response, contenido = self._descargar({'format': 'ndjson', 'fields': 'id,last_name,date_joined'})
+        assert response['Content-Type'] == 'application/x-ndjson'
+        assert response['Content-Disposition'] == 'attachment; filename="users.ndjson"'
+        filas = [json.loads(linea) for linea in contenido.decode('utf-8').splitlines()]
+        usuarios = User.objects.order_by('id')
+        assert [fila['id'] for fila in filas] == [u.id for u in usuarios]
+        assert filas[0]['last_name'] == 'Núñez0'
+        assert datetime.fromisoformat(filas[0]['date_joined']) == usuarios[0].date_joined
+
+    def test_formato_por_accept(self):
+        response, _ = self._descargar(HTTP_ACCEPT='application/x-ndjson, text/csv;q=0.5')
+        assert response['Content-Type'] == 'application/x-ndjson'
+        assert 'Accept' in response['Vary']
+        # Sin coincidencias se usa CSV; format tiene prioridad sobre Accept
+        response, _ = self._descargar(HTTP_ACCEPT='application/xml')
+        assert response['Content-Type'] == 'text/csv'
+        response, _ = self._descargar({'format': 'csv'}, HTTP_ACCEPT='application/x-ndjson')
+        assert response['Content-Type'] == 'text/csv'
+
+    def test_formato_desconocido(self):
+        response, contenido = self._descargar({'format': 'xlsx'})
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert 'ndjson' in json.loads(contenido)['mensaje']
+
+    def test_formato_sin_pyarrow(self):
+        with mock.patch('importlib.util.find_spec', return_value=None):
+            response, _ = self._descargar({'format': 'parquet'})
+            assert response.status_code == HTTPStatus.NOT_ACCEPTABLE
+            # Por Accept se ignora el formato no disponible
+            response, _ = self._descargar(HTTP_ACCEPT='application/vnd.apache.parquet')
+            assert response['Content-Type'] == 'text/csv'
+
+    @pytest.mark.parametrize('formato', ['parquet', 'arrow'])
+    def test_formatos_columnares(self, formato):
+        pa = pytest.importorskip('pyarrow')
+        import pyarrow.parquet as pq
+
+        response, contenido = self._descargar({'format': formato})
+        assert response.status_code == HTTPStatus.OK
+        if formato == 'parquet':
+            tabla = pq.read_table(pa.BufferReader(contenido))
+        else:
+            tabla = pa.ipc.open_file(pa.BufferReader(contenido)).read_all()
+        assert tabla.schema.field('id').type == pa.int64()
+        assert tabla.schema.field('date_joined').type == pa.timestamp('us', tz='UTC')
+        usuarios = User.objects.order_by('id')
+        assert tabla.column('email').to_pylist() == [u.email for u in usuarios]
+        assert tabla.column('date_joined').to_pylist() == [u.date_joined for u in usuarios]
+
+    def test_parquet_por_lotes(self, settings):
+        pa = pytest.importorskip('pyarrow')
+        import pyarrow.parquet as pq
+        from .utils import ExportadorParquet
+
+        with mock.patch('users.utils.PARQUET_FILAS_POR_GRUPO', 2):
+            bloques = list(ExportadorParquet(['id', 'email'], chunk_size=1).bloques(User.objects.all()))
+        archivo = pq.ParquetFile(pa.BufferReader(b''.join(bloques)))
+        assert archivo.metadata.num_row_groups == 2
+        assert archivo.metadata.num_rows == 3
+
+
+@pytest.mark.django_db
+class TestUserBulkUpdateDelete:
+    @pytest.fixture
+    def usuarios(self):
+        return [
+            User.objects.create_user(email=f'user{i}@example.com', password='x', first_name='Viejo')
+            for i in range(4)
+        ]
+
+    def test_actualiza_por_id(self, authenticated_client, usuarios):
+        cambios = [
+            {'id': usuarios[0].id, 'first_name': 'Nuevo'},
+            {'id': usuarios[1].id, 'first_name': 'Otro', 'password': 'nuevapass123'},
+            {'id': usuarios[2].id, 'is_active': False},
+        ]
+        with CaptureQueriesContext(connection) as capturadas:
+            response = authenticated_client.patch(reverse('user-bulk'), cambios, format='json')
+
+        assert response.status_code == HTTPStatus.OK
+        assert response.data['actualizados'] == 3
+        assert [r['id'] for r in response.data['resultados']] == [u.id for u in usuarios[:3]]
+        assert User.objects.get(id=usuarios[0].id).first_name == 'Nuevo'
+        segundo = User.objects.get(id=usuarios[1].id)
+        assert segundo.first_name == 'Otro'
+        assert segundo.check_password('nuevapass123')
+        assert not User.objects.get(id=usuarios[2].id).is_active
+        assert User.objects.get(id=usuarios[3].id).first_name == 'Viejo'
+        # Un UPDATE por grupo de campos, no uno por usuario más su SELECT
+        updates = [q for q in capturadas.captured_queries if q['sql'].startswith('UPDATE')]
+        assert len(updates) == 3
+
+    def test_reporte_por_id(self, authenticated_client, usuarios, admin):
+        cambios = [
+            {'id': usuarios[0].id, 'password': 'corta'},
+            {'id': 999999, 'first_name': 'Nadie'},
+            {'id': usuarios[1].id, 'email': 'admin@example.com'},
+            {'id': usuarios[2].id, 'first_name': 'Nuevo'},
+            {'id': usuarios[2].id, 'first_name': 'Repetido'},
+            {'first_name': 'Sin id'},
+        ]
+        response = authenticated_client.patch(reverse('user-bulk'), cambios, format='json')
+
+        assert response.status_code == HTTPStatus.MULTI_STATUS
+        estados = [r['estado'] for r in response.data['resultados']]
+        assert estados == ['error', 'error', 'error', 'actualizado', 'error', 'error']
+        assert 'password' in response.data['resultados'][0]['error']
+        assert response.data['resultados'][1]['error']['id'] == ['El usuario no existe']
+        assert response.data['resultados'][2]['error']['email'] == ['Error el correo ya existe']
+        assert User.objects.get(id=usuarios[2].id).first_name == 'Nuevo'
+        assert User.objects.get(id=usuarios[0].id).check_password('x')
+
+    def test_actualiza_por_filtro(self, authenticated_client, usuarios):
+        response = authenticated_client.patch(reverse('user-bulk'), {
+            'filtro': {'email': 'user', 'ids': [usuarios[0].id, usuarios[1].id, usuarios[2].id]},
+            'cambios': {'is_active': False},
+        }, format='json')
+
+        assert response.status_code == HTTPStatus.OK
+        assert sorted(r['id'] for r in response.data['resultados']) == sorted(u.id for u in usuarios[:3])
+        assert User.objects.filter(is_active=False).count() == 3
+
+    @pytest.fixture
+    def con_select_for_update(self):
+        # SQLite ignora select_for_update: se simula un motor que lo soporta, sin
+        # agregar FOR UPDATE al SQL, para que Django exija estar en una transacción
+        with mock.patch.object(connection.features, 'has_select_for_update', True), \
+                mock.patch.object(connection.ops, 'for_update_sql', return_value=''):
+            yield
+
+    @pytest.mark.django_db(transaction=True)
+    def test_por_filtro_bloquea_dentro_de_una_transaccion(self, authenticated_client, usuarios, con_select_for_update):
+        response = authenticated_client.patch(reverse('user-bulk'), {
+            'filtro': {'email': 'user'}, 'cambios': {'is_active': False},
+        }, format='json')
+        assert response.status_code == HTTPStatus.OK
+        response = authenticated_client.delete(reverse('user-bulk'), {'filtro': {'is_active': False}}, format='json')
+        assert response.status_code == HTTPStatus.OK
+        assert not User.objects.filter(email__startswith='user').exists()
+
+    @pytest.mark.parametrize('cuerpo', [
+        {'filtro': {}, 'cambios': {'is_active': False}},
+        {'filtro': {'desconocido': 1}, 'cambios': {'is_active': False}},
+        {'filtro': {'email': 'user'}, 'cambios': {'password': 'nuevapass123'}},
+        {'filtro': {'email': 'user'}, 'cambios': {'phone': '1' * 20}},
+        {'cambios': {'is_active': False}},
+    ])
+    def test_filtro_invalido(self, authenticated_client, usuarios, cuerpo):
+        response = authenticated_client.patch(reverse('user-bulk'), cuerpo, format='json')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert User.objects.filter(is_active=False).count() == 0
+
+    def test_desactivar_invalida_la_autenticacion(self, admin, usuarios):
+        otro = usuarios[0]
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(otro).access_token}')
+        assert client.get(reverse('user-list'), {'page_size': 1}).status_code == HTTPStatus.OK
+
+        admin_client = APIClient()
+        admin_client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(admin).access_token}')
+        admin_client.patch(reverse('user-bulk'), [{'id': otro.id, 'is_active': False}], format='json')
+        assert client.get(reverse('user-list'), {'page_size': 1}).status_code == HTTPStatus.UNAUTHORIZED
+
+    def test_actualizar_invalida_el_listado(self, authenticated_client, usuarios):
+        authenticated_client.get(reverse('user-list'))
+        authenticated_client.patch(
+            reverse('user-bulk'), [{'id': usuarios[0].id, 'first_name': 'Nuevo'}], format='json'
+        )
+        response = authenticated_client.get(reverse('user-list'))
+        assert 'Nuevo' in [u['first_name'] for u in response.data['data']]
+
+    def test_elimina_por_id(self, authenticated_client, usuarios):
+        ids = [usuarios[0].id, usuarios[1].id, 999999]
+        response = authenticated_client.delete(reverse('user-bulk'), {'ids': ids}, format='json')
+
+        assert response.status_code == HTTPStatus.MULTI_STATUS
+        assert [r['estado'] for r in response.data['resultados']] == ['eliminado', 'eliminado', 'error']
+        assert not User.objects.filter(id__in=ids).exists()
+        assert User.objects.filter(email__startswith='user').count() == 2
+
+    def test_elimina_por_filtro(self, authenticated_client, usuarios):
+        User.objects.filter(id=usuarios[3].id).update(is_active=False)
+        response = authenticated_client.delete(
+            reverse('user-bulk'), {'filtro': {'is_active': False}}, format='json'
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert response.data['eliminados'] == 1
+        assert not User.objects.filter(id=usuarios[3].id).exists()
+
+    def test_una_transaccion_por_peticion(self, settings, usuarios):
+        from . import bulk
+        settings.USERS_BULK_BATCH_SIZE = 2
+        cambios = [{'id': usuario.id, 'first_name': 'Nuevo'} for usuario in usuarios]
+        original = bulk._actualizar_grupo
+        llamadas = []
+
+        def falla_en_el_segundo_lote(*args):
+            llamadas.append(args)
+            if len(llamadas) == 2:
+                raise RuntimeError("falla")
+            return original(*args)
+
+        with mock.patch.object(bulk, '_actualizar_grupo', side_effect=falla_en_el_segundo_lote):
+            with pytest.raises(RuntimeError):
+                bulk.actualizar_usuarios_en_lote(cambios)
+        # El primer lote también se revierte
+        assert not User.objects.filter(first_name='Nuevo').exists()
+
+        with mock.patch.object(UserTombstone.objects, 'bulk_create', side_effect=[[], RuntimeError("falla")]):
+            with pytest.raises(RuntimeError):
+                bulk.eliminar_usuarios([usuario.id for usuario in usuarios])
+        assert User.objects.filter(email__startswith='user').count() == 4
+
+    def test_eliminar_en_lotes(self, settings, authenticated_client, usuarios, nuevos_usuarios):
+        settings.USERS_BULK_BATCH_SIZE = 50
+        nuevos_usuarios(200, prefijo='masivo')
+        ids = list(User.objects.filter(email__startswith='masivo').values_list('id', flat=True))
+        authenticated_client.get(reverse('user-list'), {'page_size': 1})
+
+        with CaptureQueriesContext(connection) as capturadas, \
+                mock.patch('users.bulk.invalidar_listado') as invalidar, \
+                mock.patch('users.signals.invalidar_listado') as invalidar_signal:
+            response = authenticated_client.delete(reverse('user-bulk'), {'ids': ids}, format='json')
+
+        assert response.status_code == HTTPStatus.OK
+        assert not User.objects.filter(id__in=ids).exists()
+        assert set(UserTombstone.objects.values_list('user_id', flat=True)) == set(ids)
+        # Ids existentes por lote y, al borrar cada lote: instancias, admin log, grupos,
+        # permisos, exportaciones, DELETE y marcas de baja (antes además un INSERT por
+        # usuario: 210 consultas)
+        inserts = [q for q in capturadas.captured_queries if 'INSERT INTO "users_usertombstone"' in q['sql']]
+        assert len(inserts) == 4
+        consultas = [q for q in capturadas.captured_queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        assert len(consultas) == 4 + 4 * 7
+        assert invalidar.call_count == 4 and invalidar_signal.call_count == 0
+
+    def test_eliminar_uno_registra_la_baja(self, usuarios):
+        id = usuarios[0].id
+        usuarios[0].delete()
+        assert list(UserTombstone.objects.values_list('user_id', flat=True)) == [id]
+
+    @pytest.mark.parametrize('cuerpo', [{}, {'ids': []}, {'ids': ['a']}, {'ids': [True]}])
+    def test_eliminar_cuerpo_invalido(self, authenticated_client, usuarios, cuerpo):
+        response = authenticated_client.delete(reverse('user-bulk'), cuerpo, format='json')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert User.objects.count() == 5
+
+
+@pytest.mark.django_db
+class TestUserCSVImport:
+    @pytest.fixture(autouse=True)
+    def carpeta_reportes(self, settings, tmp_path):
+        settings.USERS_IMPORT_DIR = str(tmp_path)
+        settings.USERS_BULK_BATCH_SIZE = 3
+
+    def _importar(self, client, contenido, **params):
+        url = reverse('user-import-csv')
+        if params:
+            url += '?' + '&'.join(f'{k}={v}' for k, v in params.items())
+        return client.post(url, contenido.encode('utf-8'), content_type='text/csv')
+
+    def test_importa_lo_que_exporta(self, authenticated_client):
+        fecha = datetime(2020, 5, 17, 10, 30, tzinfo=dt_timezone.utc)
+        for i in range(5):
+            user = User.objects.create_user(
+                email=f'legado{i}@example.com', password='x', first_name='Legado', last_name=f'N{i}', phone='5512345678'
+            )
+            User.objects.filter(id=user.id).update(date_joined=fecha)
+        exportado = authenticated_client.get(reverse('user-export-csv')).content.decode('utf-8')
+        User.objects.filter(email__startswith='legado').delete()
+
+        contenido = '\n'.join(
+            linea for linea in exportado.splitlines() if 'admin@example.com' not in linea
+        )
+        response = self._importar(authenticated_client, contenido)
+
+        assert response.status_code == HTTPStatus.CREATED
+        assert response.data['creados'] == 5
+        assert response.data['reporte_errores'] is None
+        importados = User.objects.filter(email__startswith='legado')
+        assert importados.count() == 5
+        assert all(u.date_joined == fecha for u in importados)
+        assert all(u.phone == '5512345678' for u in importados)
+        # Sin columna password la contraseña no es utilizable
+        assert not importados.first().has_usable_password()
+
+    def test_reporte_de_errores(self, authenticated_client):
+        contenido = (
+            '\ufeffemail,first_name,last_name,password\n'
+            'uno@example.com,Uno,Apellido,unopass123\n'
+            'invalido,Dos,Apellido,\n'
+            'admin@example.com,Tres,Apellido,\n'
+            'cuatro@example.com,Cuatro,Apellido,corta\n'
+            'uno@example.com,Cinco,Repetido,\n'
+        )
+        response = self._importar(authenticated_client, contenido)
+
+        assert response.status_code == HTTPStatus.MULTI_STATUS
+        assert (response.data['filas'], response.data['creados'], response.data['errores']) == (5, 1, 4)
+        assert User.objects.get(email='uno@example.com').check_password('unopass123')
+
+        descarga = authenticated_client.get(response.data['reporte_errores'])
+        assert descarga.status_code == HTTPStatus.OK
+        filas = list(csv.DictReader(io.StringIO(b''.join(descarga.streaming_content).decode('utf-8'))))
+        assert [f['linea'] for f in filas] == ['3', '4', '5', '6']
+        assert 'email' in json.loads(filas[0]['errores'])
+        assert 'password' in json.loads(filas[2]['errores'])
+        # El duplicado del primer bloque se detecta en el segundo contra la base de datos
+        assert filas[3]['first_name'] == 'Cinco'
+
+    def test_reporte_solo_para_quien_importa(self, authenticated_client):
+        response = self._importar(authenticated_client, 'email,first_name,last_name,password\ninvalido,X,Y,secreta123\n')
+        otro = User.objects.create_user(email='otro@example.com', password=None)
+        otro_cliente = APIClient()
+        otro_cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(otro).access_token}')
+        assert otro_cliente.get(response.data['reporte_errores']).status_code == HTTPStatus.NOT_FOUND
+        assert authenticated_client.get(response.data['reporte_errores']).status_code == HTTPStatus.OK
+
+    def test_dry_run(self, authenticated_client):
+        contenido = 'email,first_name,last_name\nprueba@example.com,Prueba,Apellido\ninvalido,X,Y\n'
+        response = self._importar(authenticated_client, contenido, dry_run='true')
+
+        assert response.status_code == HTTPStatus.OK
+        assert response.data['dry_run'] is True
+        assert (response.data['creados'], response.data['errores']) == (1, 1)
+        assert response.data['reporte_errores']
+        assert not User.objects.filter(email='prueba@example.com').exists()
+
+    def test_confirma_cada_bloque(self):
+        from .bulk import crear_usuarios
+        from .importacion import importar_usuarios_csv
+
+        contenido = 'email,first_name,last_name\n' + ''.join(f'bloque{i}@example.com,B,{i}\n' for i in range(6))
+        llamadas = []
+
+        def fallar_en_el_segundo(validas):
+            llamadas.append(validas)
+            if len(llamadas) == 2:
+                raise RuntimeError('falla en el segundo bloque')
+            return crear_usuarios(validas)
+
+        # Falla el segundo bloque: el primero ya está confirmado (ver users.sincronizacion)
+        with mock.patch('users.importacion.crear_usuarios', side_effect=fallar_en_el_segundo), \
+                pytest.raises(RuntimeError):
+            importar_usuarios_csv(io.StringIO(contenido))
+        assert User.objects.filter(email__startswith='bloque').count() == 3
+
+    def test_archivo_invalido_a_la_mitad(self, authenticated_client, settings):
+        settings.USERS_BULK_BATCH_SIZE = 100
+        # Más de un bloque de decodificación (8 KiB) antes del byte inválido
+        contenido = (
+            b'email,first_name,last_name\n'
+            + b'invalido,X,Y\n'
+            + b''.join(f'parcial{i}@example.com,P,{i}\n'.encode() for i in range(400))
+            + b'roto@example.com,\xff\xfe,Y\n'
+        )
+        response = authenticated_client.post(reverse('user-import-csv'), contenido, content_type='text/csv')
+
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert 'UTF-8' in response.data['mensaje']
+        # Los bloques completos anteriores al error se guardaron y la respuesta lo informa
+        guardados = User.objects.filter(email__startswith='parcial').count()
+        assert guardados > 0 and response.data['filas'] % 100 == 0
+        assert (response.data['creados'], response.data['errores']) == (guardados, 1)
+        assert response.data['filas'] == guardados + 1
+        assert authenticated_client.get(response.data['reporte_errores']).status_code == HTTPStatus.OK
+
+    def test_multipart(self, authenticated_client):
+        archivo = io.BytesIO(b'email,first_name,last_name\nmulti@example.com,Multi,Parte\n')
+        archivo.name = 'usuarios.csv'
+        response = authenticated_client.post(reverse('user-import-csv'), {'file': archivo}, format='multipart')
+        assert response.status_code == HTTPStatus.CREATED
+        assert User.objects.filter(email='multi@example.com').exists()
+
+    @pytest.mark.parametrize('contenido', [
+        '',
+        'email,first_name\nx@example.com,X\n',
+        'email,first_name,last_name,is_superuser\nx@example.com,X,Y,1\n',
+    ])
+    def test_encabezado_invalido(self, authenticated_client, contenido):
+        response = self._importar(authenticated_client, contenido)
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert User.objects.count() == 1
+
+    def test_archivo_que_no_es_utf8(self, authenticated_client):
+        response = authenticated_client.post(
+            reverse('user-import-csv'),
+            'email,first_name,last_name\nñ@example.com,José,Núñez\n'.encode('latin-1'),
+            content_type='text/csv'
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert User.objects.count() == 1
+
+    def test_reporte_inexistente(self, authenticated_client):
+        for token in ['no-es-un-token', '0' * 32]:
+            response = authenticated_client.get(reverse('user-import-csv-errores', kwargs={'token': token}))
+            assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestUserExportJobs:
+    @pytest.fixture(autouse=True)
+    def carpeta_exportaciones(self, settings, tmp_path):
+        settings.USERS_EXPORT_DIR = str(tmp_path)
+        settings.USERS_EXPORT_SYNC = True
+
+    @pytest.fixture(autouse=True)
+    def usuarios(self):
+        for i in range(5):
+            User.objects.create_user(email=f'exp{i}@example.com', password='x', first_name='Exp', last_name=f'N{i}')
+
+    def _descargar(self, client, job_id, **headers):
+        response = client.get(reverse('user-export-job-descarga', kwargs={'id': job_id}), **headers)
+        return response, b''.join(response.streaming_content) if response.streaming else response.content
+
+    def test_exportacion_completa(self, authenticated_client):
+        response = authenticated_client.post(reverse('user-export-jobs') + '?fields=email&email=exp')
+        assert response.status_code == HTTPStatus.ACCEPTED
+        assert response.data['status'] == ExportJob.DONE
+        assert response.data['progress'] == response.data['total'] == 5
+        assert response['Location'].endswith(reverse('user-export-job', kwargs={'id': response.data['id']}))
+
+        estado = authenticated_client.get(response['Location'])
+        assert estado.status_code == HTTPStatus.OK
+        assert estado.data['descarga']
+
+        descarga, contenido = self._descargar(authenticated_client, response.data['id'])
+        assert descarga.status_code == HTTPStatus.OK
+        assert descarga['Content-Type'] == 'application/gzip'
+        assert descarga['Accept-Ranges'] == 'bytes'
+        filas = list(csv.reader(io.StringIO(gzip.decompress(contenido).decode('utf-8'))))
+        assert filas[0] == ['email']
+        assert sorted(fila[0] for fila in filas[1:]) == [f'exp{i}@example.com' for i in range(5)]
+
+    def test_parametros_invalidos(self, authenticated_client):
+        for query in ['?fields=password', '?is_active=quizas']:
+            response = authenticated_client.post(reverse('user-export-jobs') + query)
+            assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert not ExportJob.objects.exists()
+
+    def test_peticiones_identicas_comparten_trabajo(self, authenticated_client, settings):
+        settings.USERS_EXPORT_SYNC = False
+        with mock.patch.object(exportaciones, 'encolar') as encolar:
+            primera = authenticated_client.post(reverse('user-export-jobs') + '?email=exp&fields=id,email')
+            # Mismos parámetros en otro orden
+            segunda = authenticated_client.post(reverse('user-export-jobs') + '?fields=id,email&email=exp')
+            distinta = authenticated_client.post(reverse('user-export-jobs') + '?email=exp1')
+        assert primera.data['id'] == segunda.data['id']
+        assert not primera.data['compartido'] and segunda.data['compartido']
+        assert distinta.data['id'] != primera.data['id']
+        assert ExportJob.objects.count() == 2
+        # Sin terminar no hay descarga
+        response, _ = self._descargar(authenticated_client, primera.data['id'])
+        assert response.status_code == HTTPStatus.CONFLICT
+        assert encolar.call_count == 0  # on_commit no se ejecuta dentro de la transacción de la prueba
+
+    def test_trabajos_de_cada_usuario(self, authenticated_client, settings):
+        settings.USERS_EXPORT_SYNC = False
+        otro = User.objects.create_user(email='otro@example.com', password=None)
+        otro_cliente = APIClient()
+        otro_cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(otro).access_token}')
+        with mock.patch.object(exportaciones, 'encolar'):
+            propio = authenticated_client.post(reverse('user-export-jobs') + '?email=exp')
+            ajeno = otro_cliente.post(reverse('user-export-jobs') + '?email=exp')
+        # Los mismos parámetros de otro usuario crean otro trabajo
+        assert not ajeno.data['compartido'] and ajeno.data['id'] != propio.data['id']
+
+        exportaciones.ejecutar_exportacion(propio.data['id'])
+        assert otro_cliente.get(reverse('user-export-job', kwargs={'id': propio.data['id']})).status_code == HTTPStatus.NOT_FOUND
+        response, _ = self._descargar(otro_cliente, propio.data['id'])
+        assert response.status_code == HTTPStatus.NOT_FOUND
+        response, _ = self._descargar(authenticated_client, propio.data['id'])
+        assert response.status_code == HTTPStatus.OK
+
+    def test_descarga_por_rangos(self, authenticated_client):
+        job_id = authenticated_client.post(reverse('user-export-jobs')).data['id']
+        _, completo = self._descargar(authenticated_client, job_id)
+        tamano = len(completo)
+
+        response, parte = self._descargar(authenticated_client, job_id, HTTP_RANGE='bytes=10-19')
+        assert response.status_code == HTTPStatus.PARTIAL_CONTENT
+        assert response['Content-Range'] == f'bytes 10-19/{tamano}'
+        assert parte == completo[10:20]
+
+        # Reanudar desde un byte hasta el final y pedir un sufijo
+        response, parte = self._descargar(authenticated_client, job_id, HTTP_RANGE='bytes=20-')
+        assert parte == completo[20:]
+        response, parte = self._descargar(authenticated_client, job_id, HTTP_RANGE='bytes=-5')
+        assert parte == completo[-5:]
+
+        # If-Range con otro ETag envía el archivo completo
+        response, parte = self._descargar(
+            authenticated_client, job_id, HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"otro"'
+        )
+        assert response.status_code == HTTPStatus.OK and parte == completo
+
+        response, _ = self._descargar(authenticated_client, job_id, HTTP_RANGE=f'bytes={tamano}-')
+        assert response.status_code == HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE
+        assert response['Content-Range'] == f'bytes */{tamano}'
+
+    def test_archivo_borrado(self, authenticated_client):
+        job_id = authenticated_client.post(reverse('user-export-jobs')).data['id']
+        os.remove(ExportJob.objects.get(id=job_id).file_path)
+        response, _ = self._descargar(authenticated_client, job_id)
+        assert response.status_code == HTTPStatus.GONE
+
+    def test_comando_retoma_interrumpidas_y_limpia(self, settings):
+        params = exportaciones.parametros_exportacion({})
+        interrumpido = ExportJob.objects.create(
+            fingerprint=exportaciones.huella(params), params=params, status=ExportJob.RUNNING
+        )
+        ExportJob.objects.filter(id=interrumpido.id).update(updated_at=timezone.now() - timedelta(hours=1))
+        vencido = ExportJob.objects.create(
+            fingerprint='x', params=params, status=ExportJob.DONE,
+            finished_at=timezone.now() - timedelta(seconds=settings.USERS_EXPORT_TTL + 1)
+        )
+
+        salida = io.StringIO()
+        call_command('procesar_exportaciones', stdout=salida)
+
+        interrumpido.refresh_from_db()
+        assert interrumpido.status == ExportJob.DONE
+        assert os.path.exists(interrumpido.file_path)
+        assert not ExportJob.objects.filter(id=vencido.id).exists()
+        assert 'Se ejecutaron 1 exportaciones y se borraron 1 vencidas' in salida.getvalue()
+
+
+@pytest.mark.django_db(databases=['default', 'replica'])
+class TestReplica:
+    """
+    Usa dos bases de datos SQLite: la de pruebas como primario y un archivo aparte
+    como réplica, con datos distintos para saber de dónde se leyó.
+    """
+    @pytest.fixture(scope='class', autouse=True)
+    def base_replica(self, tmp_path_factory, django_db_setup, django_db_blocker):
+        # Con alcance de clase para que el alias exista antes de preparar la prueba
+        from django.db import connections
+        ruta = tmp_path_factory.mktemp('replica') / 'replica.sqlite3'
+        connections.settings['replica'] = {
+            **connections.settings['default'], 'NAME': str(ruta),
+            'TEST': {**connections.settings['default']['TEST'], 'NAME': str(ruta)},
+        }
+        try:
+            with django_db_blocker.unblock():
+                call_command('migrate', database='replica', verbosity=0)
+            yield
+        finally:
+            connections['replica'].close()
+            del connections['replica']
+            del connections.settings['replica']
+
+    @pytest.fixture(autouse=True)
+    def replica(self, settings):
+        settings.USERS_READ_REPLICA = 'replica'
+
+    @pytest.fixture
+    def admin(self, admin):
+        User.objects.using('replica').create(id=admin.id, email=admin.email, password=admin.password)
+        User.objects.using('replica').create(email='solo-replica@example.com', password='!')
+        return admin
+
+    def _cliente(self, admin):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(admin).access_token}')
+        return client
+
+    def _emails(self, response):
+        return sorted(u['email'] for u in response.data['data'])
+
+    def test_listado_y_exportacion_leen_de_la_replica(self, admin):
+        client = self._cliente(admin)
+        response = client.get(reverse('user-list'))
+        assert self._emails(response) == ['admin@example.com', 'solo-replica@example.com']
+        # Las respuestas de la réplica no llevan ETag
+        assert 'ETag' not in response
+
+        for stream in ('false', 'true'):
+            response = client.get(reverse('user-export-csv'), {'stream': stream, 'fields': 'email'})
+            contenido = b''.join(response.streaming_content) if response.streaming else response.content
+            assert 'solo-replica@example.com' in contenido.decode('utf-8')
+
+    def test_otras_vistas_y_escrituras_van_al_primario(self, admin):
+        client = self._cliente(admin)
+        replica_id = User.objects.using('replica').get(email='solo-replica@example.com').id
+        response = client.put(reverse('user-detail', kwargs={'id': replica_id}), {'first_name': 'X'}, format='json')
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
+        response = client.post(reverse('user-list'), {
+            'email': 'nuevo@example.com', 'password': 'testpass123', 'first_name': 'N', 'last_name': 'U'
+        }, format='json')
+        assert response.status_code == HTTPStatus.CREATED
+        assert User.objects.filter(email='nuevo@example.com').exists()
+        assert not User.objects.using('replica').filter(email='nuevo@example.com').exists()
+
+    def test_tras_escribir_el_cliente_lee_del_primario(self, admin, settings):
+        escritor, otro = self._cliente(admin), self._cliente(admin)
+        otro.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(admin).access_token}x')
+        escritor.post(reverse('user-list'), {
+            'email': 'nuevo@example.com', 'password': 'testpass123', 'first_name': 'N', 'last_name': 'U'
+        }, format='json')
+
+        assert self._emails(escritor.get(reverse('user-list'))) == ['admin@example.com', 'nuevo@example.com']
+        assert 'ETag' in escritor.get(reverse('user-list'))
+
+        # Otro cliente sigue en la réplica (su token inválido basta para distinguirlo)
+        from .middleware import clave_primario
+        from django.test import RequestFactory
+        peticion = RequestFactory().get('/', HTTP_AUTHORIZATION=otro._credentials['HTTP_AUTHORIZATION'])
+        assert cache.get(clave_primario(peticion)) is None
+
+        # Al vencer la ventana vuelve a la réplica
+        cache.clear()
+        assert 'solo-replica@example.com' in self._emails(escritor.get(reverse('user-list')))
+
+    def test_escritura_fallida_no_fija_al_primario(self, admin):
+        client = self._cliente(admin)
+        response = client.post(reverse('user-list'), {'email': 'no-es-email'}, format='json')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert 'solo-replica@example.com' in self._emails(client.get(reverse('user-list')))
+
+    def test_sincronizacion_lee_del_primario(self, admin, settings):
+        settings.USERS_SYNC_LAG = 0
+        response = self._cliente(admin).get(reverse('user-list'), {'since': '1970-01-01'})
+        assert self._emails(response) == ['admin@example.com']
+
+    def test_router(self):
+        from django.db import router
+        from .routers import lecturas_en_replica
+        assert router.db_for_read(User) == 'default'
+        with lecturas_en_replica():
+            assert router.db_for_read(User) == 'replica'
+            assert router.db_for_write(User) == 'default'
+        assert router.db_for_read(User) == 'default'
+
+
+
+@pytest.mark.django_db
+class TestEsquemaOpenAPI:
+    @pytest.fixture(autouse=True)
+    def esquema_limpio(self):
+        esquema.reiniciar_esquema()
+        yield
+        esquema.reiniciar_esquema()
+
+    def test_archivo_coincide_con_las_vistas(self):
+        # Si falla: python manage.py generar_esquema
+        call_command('generar_esquema', '--check', stdout=io.StringIO())
+
+    def test_check_detecta_archivo_desactualizado(self, tmp_path):
+        ruta = tmp_path / 'openapi.json'
+        call_command('generar_esquema', '--archivo', str(ruta), stdout=io.StringIO())
+        call_command('generar_esquema', '--archivo', str(ruta), '--check', stdout=io.StringIO())
+        ruta.write_bytes(ruta.read_bytes().replace(b'"v1"', b'"v0"'))
+        with pytest.raises(CommandError):
+            call_command('generar_esquema', '--archivo', str(ruta), '--check', stdout=io.StringIO())
+        with pytest.raises(CommandError):
+            call_command('generar_esquema', '--archivo', str(tmp_path / 'no.json'), '--check')
+
+    def test_servido_desde_memoria_con_validadores(self, settings):
+        client = APIClient()
+        response = client.get(reverse('schema-json'))
+        assert response.status_code == HTTPStatus.OK
+        assert response.content == open(settings.API_SCHEMA_FILE, 'rb').read()
+        assert response['ETag'] and response['Last-Modified']
+        assert 'Accept-Encoding' in response['Vary']
+
+        assert client.get(reverse('schema-json'), HTTP_IF_NONE_MATCH=response['ETag']).status_code == HTTPStatus.NOT_MODIFIED
+        assert client.get(
+            reverse('schema-json'), HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        ).status_code == HTTPStatus.NOT_MODIFIED
+
+        comprimido = client.get(reverse('schema-json'), HTTP_ACCEPT_ENCODING='gzip, br')
+        assert comprimido['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(comprimido.content) == response.content
+
+    def test_interfaces_usan_el_esquema_precalculado(self, settings, tmp_path):
+        # Sin archivo el esquema se genera una sola vez por proceso
+        settings.API_SCHEMA_FILE = str(tmp_path / 'no-existe.json')
+        client = APIClient()
+        with mock.patch.object(esquema, 'generar_esquema', wraps=esquema.generar_esquema) as generar:
+            for url in ('schema-swagger-ui', 'schema-redoc', 'schema-swagger-ui'):
+                response = client.get(reverse(url), {'format': 'openapi'})
+                assert response.status_code == HTTPStatus.OK
+                assert json.loads(response.content)['info']['title'] == 'API Documentation'
+        assert generar.call_count == 1
+
+        # La página HTML de la interfaz sigue a cargo de drf_yasg
+        response = client.get(reverse('schema-swagger-ui'))
+        assert response.status_code == HTTPStatus.OK
+        assert response['Content-Type'].startswith('text/html')
+
+    def test_modo_en_vivo(self, settings):
+        settings.API_SCHEMA_PRECOMPUTED = False
+        with mock.patch.object(esquema, 'obtener_esquema') as obtener:
+            response = APIClient().get(reverse('schema-swagger-ui'), {'format': 'openapi'})
+        assert response.status_code == HTTPStatus.OK
+        assert json.loads(response.content)['host'] == 'testserver'
+        obtener.assert_not_called()
+
+
+class TestDocumentacionDiferida:
+    def test_argumentos_se_evaluan_al_aplicar(self):
+        from .documentacion import aplicar_documentacion, documentar
+
+        llamadas = []
+
+        def argumentos():
+            llamadas.append(1)
+            return dict(operation_summary="Prueba")
+
+        @documentar(argumentos)
+        def get(self, request):
+            pass
+
+        assert not llamadas and not hasattr(get, '_swagger_auto_schema')
+        aplicar_documentacion()
+        assert llamadas == [1]
+        assert get._swagger_auto_schema == {'operation_summary': "Prueba"}
+
+    @pytest.mark.parametrize('docs', ['True', 'False'])
+    def test_cargar_urls_no_importa_drf_yasg(self, docs):
+        # Proceso nuevo: en este drf_yasg ya está importado por otras pruebas
+        codigo = (
+            "import sys, django; django.setup(); import backend.urls; "
+            "from django.urls import reverse, NoReverseMatch\n"
+            "try:\n    reverse('schema-swagger-ui'); rutas = True\n"
+            "except NoReverseMatch:\n    rutas = False\n"
+            "print(any(m.startswith('drf_yasg.') for m in sys.modules), rutas)"
+        )
+        entorno = dict(os.environ, API_DOCS_ENABLED=docs, DJANGO_SETTINGS_MODULE='backend.settings')
+        proceso = subprocess.run([sys.executable, '-c', codigo], env=entorno, capture_output=True, text=True,
+                                 cwd=os.path.dirname(os.path.dirname(__file__)))
+        assert proceso.returncode == 0, proceso.stderr
+        # Con la documentación activa las rutas existen, pero drf_yasg se importa en su primera petición
+        assert proceso.stdout.split() == ['False', docs]
+
+
+@pytest.mark.django_db
+class TestDirectorio:
+    @pytest.fixture(autouse=True)
+    def directorio_activo(self, settings):
+        from .directorio import directorio
+        settings.USERS_DIRECTORY = True
+        settings.USERS_SYNC_LAG = 0
+        # El directorio es del proceso y los IDs se reutilizan tras cada rollback
+        directorio.reiniciar()
+        yield directorio
+        directorio.reiniciar()
+
+    @pytest.fixture
+    def usuarios(self):
+        base = timezone.now() - timedelta(days=30)
+        nombres = ['María', 'Mario', 'Ana', 'Luis', 'Marisol']
+        for i in range(25):
+            user = User.objects.create_user(
+                email=f'{nombres[i % 5].lower()}{i}@example.com', password=None,
+                first_name=nombres[i % 5], last_name=f'Apellido{i % 3}', is_active=i % 4 != 0,
+            )
+            # Fechas repetidas para que el desempate por id entre en juego
+            User.objects.filter(id=user.id).update(date_joined=base + timedelta(days=i // 2))
+
+    def _paginas(self, client, params):
+        paginas, cursor = [], None
+        while True:
+            response = client.get(reverse('user-list'), {**params, **({'cursor': cursor} if cursor else {})})
+            assert response.status_code == HTTPStatus.OK, response.data
+            paginas.append(response.data)
+            cursor = response.data.get('next')
+            if not cursor:
+                return paginas
+
+    @pytest.mark.parametrize('params', [
+        {},
+        {'page_size': 4},
+        {'page_size': 3, 'search': 'mar'},
+        {'page_size': 5, 'email': 'MARI', 'is_active': 'true'},
+        {'page_size': 2, 'is_active': 'false', 'fields': 'email'},
+        {'page_size': 4, 'joined_after': 'DIA:5', 'joined_before': 'DIA:9'},
+        {'page_size': 3, 'joined_after': 'HORA:2', 'joined_before': 'HORA:8'},
+    ])
+    def test_coincide_con_la_base_de_datos(self, settings, authenticated_client, usuarios, params):
+        # Las fechas se indican en días desde el alta más antigua (ver ``usuarios``)
+        base = timezone.localtime(timezone.now() - timedelta(days=30))
+        params = dict(params)
+        for clave, valor in params.items():
+            if str(valor).startswith('DIA:'):
+                params[clave] = (base + timedelta(days=int(valor[4:]))).date().isoformat()
+            elif str(valor).startswith('HORA:'):
+                params[clave] = (base + timedelta(days=int(valor[5:]))).isoformat()
+        desde_directorio = self._paginas(authenticated_client, params)
+        settings.USERS_DIRECTORY = False
+        cache.clear()
+        assert self._paginas(authenticated_client, params) == desde_directorio
+
+    @pytest.mark.parametrize('params', [{'page_size': 4}, {'page_size': 3, 'is_active': 'true'}])
+    def test_coincide_hacia_atras(self, settings, authenticated_client, usuarios, params):
+        paginas = self._paginas(authenticated_client, params)
+        respuestas = {}
+        for usar_directorio in (True, False):
+            settings.USERS_DIRECTORY = usar_directorio
+            cache.clear()
+            response = authenticated_client.get(
+                reverse('user-list'), {**params, 'cursor': paginas[-1]['previous']}
+            )
+            respuestas[usar_directorio] = response.data
+        assert respuestas[True] == respuestas[False]
+        assert respuestas[True]['data'] == paginas[-2]['data']
+
+    def test_no_consulta_la_base_de_datos(self, authenticated_client, usuarios):
+        authenticated_client.get(reverse('user-list'), {'search': 'mar'})
+        # Otros parámetros no están en la caché del listado
+        with CaptureQueriesContext(connection) as consultas:
+            response = authenticated_client.get(reverse('user-list'), {'search': 'mario', 'page_size': 2})
+        assert response.status_code == HTTPStatus.OK
+        assert len(response.data['data']) == 2
+        assert not [q for q in consultas.captured_queries if 'ORDER BY' in q['sql']]
+
+    def test_refresco_incremental(self, directorio_activo, authenticated_client, usuarios):
+        authenticated_client.get(reverse('user-list'))
+        assert len(directorio_activo.columnas()) == 26
+
+        cambiado = User.objects.get(email='ana2@example.com')
+        authenticated_client.put(reverse('user-detail', kwargs={'id': cambiado.id}), {'first_name': 'Anabel'}, format='json')
+        authenticated_client.delete(reverse('user-detail', kwargs={'id': User.objects.get(email='luis3@example.com').id}))
+        User.objects.create_user(email='nuevo@example.com', password=None, first_name='Nuevo')
+
+        with mock.patch.object(directorio_activo, 'cargar', side_effect=AssertionError('recarga completa')):
+            response = authenticated_client.get(reverse('user-list'))
+        emails = {u['email']: u for u in response.data['data']}
+        assert emails['ana2@example.com']['first_name'] == 'Anabel'
+        assert 'luis3@example.com' not in emails
+        assert 'nuevo@example.com' in emails
+        assert len(directorio_activo.columnas()) == 26
+        # Ya no hay nada nuevo después de las marcas
+        assert directorio_activo.refrescar() == (0, 0)
+
+    def test_muchos_cambios_se_reordenan(self, directorio_activo, usuarios, nuevos_usuarios):
+        directorio_activo.columnas()
+        ahora = timezone.now()
+        nuevos_usuarios(300, prefijo='masivo', first_name='Masivo', date_joined=lambda i: ahora - timedelta(days=i))
+        assert directorio_activo.refrescar() == (300, 0)
+        c = directorio_activo.columnas()
+        claves = list(zip(c.fechas, c.ids))
+        assert claves == sorted(claves) and len(claves) == 325
+        assert set(c.ids) == set(User.objects.values_list('id', flat=True))
+
+    def test_vista_asincrona(self, admin, usuarios):
+        request = AsyncRequestFactory().get(
+            '/api/v1/users/', {'email': 'mari', 'is_active': 'true'},
+            headers={'Authorization': f'Bearer {RefreshToken.for_user(admin).access_token}'}
+        )
+        response = async_to_sync(AsyncUserListView.as_view())(request)
+        emails = sorted(u['email'] for u in json.loads(response.content)['data'])
+        esperados = sorted(
+            User.objects.filter(email__istartswith='mari', is_active=True).values_list('email', flat=True)
+        )
+        assert emails == esperados and emails
+
+
+class TestORJSON:
+    datos = {
+        'data': [
+            {'id': 1, 'email': 'ána@example.com', 'date_joined': datetime(2024, 3, 1, 12, 30, tzinfo=dt_timezone.utc)},
+            {'id': 2, 'fecha': datetime(2024, 3, 1, 12, 30, 0, 250, tzinfo=dt_timezone(timedelta(hours=-6)))},
+        ],
+        'mensaje': 'línea separada',
+        'otros': [Decimal('1.50'), uuid.UUID(int=7), date(2024, 1, 2), None, True, 1.5, {3: 'clave entera'}],
+        'grande': 2 ** 70,
+    }
+
+    def test_misma_salida_que_drf(self):
+        pytest.importorskip('orjson')
+        esperado = JSONRenderer().render(self.datos)
+        assert ORJSONRenderer().render(self.datos) == esperado
+        # Sin el entero de 70 bits no hace falta volver al renderer de DRF
+        datos = {clave: valor for clave, valor in self.datos.items() if clave != 'grande'}
+        with mock.patch.object(JSONRenderer, 'render', side_effect=AssertionError('sin orjson')):
+            rapido = ORJSONRenderer().render(datos)
+        assert rapido == esperado.replace(b',"grande":1180591620717411303424', b'')
+
+    def test_sin_orjson(self):
+        with mock.patch('users.renderers.orjson', None):
+            assert ORJSONRenderer().render(self.datos) == JSONRenderer().render(self.datos)
+        with mock.patch('users.parsers.orjson', None):
+            assert ORJSONParser().parse(io.BytesIO(b'{"a": [1, 2]}')) == {'a': [1, 2]}
+
+    def test_indentado_usa_drf(self):
+        renderer = ORJSONRenderer()
+        assert renderer.render({'a': 1}, 'application/json; indent=2') == b'{\n  "a": 1\n}'
+
+    @pytest.mark.parametrize('cuerpo', [b'{"a": ', b'[NaN]', b''])
+    def test_parser_mismo_error_que_drf(self, cuerpo):
+        with pytest.raises(ParseError) as esperado:
+            JSONParser().parse(io.BytesIO(cuerpo))
+        with pytest.raises(ParseError) as rapido:
+            ORJSONParser().parse(io.BytesIO(cuerpo))
+        assert str(rapido.value) == str(esperado.value)
+
+    def test_parser(self):
+        assert ORJSONParser().parse(io.BytesIO('{"nombre": "Ána", "n": [1, 2.5]}'.encode())) == {
+            'nombre': 'Ána', 'n': [1, 2.5]
+        }
+
+    @pytest.mark.django_db
+    def test_endpoints_usan_orjson(self):
+        orjson = pytest.importorskip('orjson')
+        user = User.objects.create_user(email='admin@example.com', password=None, first_name='Ána')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        with mock.patch('users.renderers.orjson.dumps', wraps=orjson.dumps) as dumps, \
+                mock.patch('users.parsers.orjson.loads', wraps=orjson.loads) as loads:
+            response = client.put(
+                reverse('user-detail', kwargs={'id': user.id}), {'last_name': 'Pérez'}, format='json'
+            )
+            assert response.status_code == HTTPStatus.OK
+            listado = client.get(reverse('user-list'))
+        assert loads.called and dumps.call_count == 2
+        assert json.loads(listado.content)['data'][0]['last_name'] == 'Pérez'
+
+
+@pytest.mark.django_db
+class TestCompresion:
+    @pytest.fixture
+    def usuarios(self, nuevos_usuarios):
+        nuevos_usuarios(200, prefijo='usuario', first_name='Nombre', last_name=lambda i: f'Apellido {i}')
+
+    def _middleware(self, response):
+        return CompresionMiddleware(lambda request: response)
+
+    def test_listado_con_gzip(self, authenticated_client, usuarios):
+        plano = authenticated_client.get(reverse('user-list'))
+        assert 'Content-Encoding' not in plano
+        assert 'Accept-Encoding' in plano['Vary']
+
+        response = authenticated_client.get(reverse('user-list'), HTTP_ACCEPT_ENCODING='br;q=0.5, gzip')
+        assert response['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.content) == plano.content
+        assert int(response['Content-Length']) == len(response.content) < len(plano.content) / 4
+        # El ETag débil sigue sirviendo para el 304
+        assert response['ETag'] == 'W/' + plano['ETag']
+        no_modificado = authenticated_client.get(
+            reverse('user-list'), HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        assert no_modificado.status_code == HTTPStatus.NOT_MODIFIED
+
+    def test_respuestas_chicas_sin_comprimir(self, authenticated_client, admin):
+        response = authenticated_client.get(reverse('user-list'), {'page_size': 1}, HTTP_ACCEPT_ENCODING='gzip')
+        assert response.status_code == HTTPStatus.OK
+        assert len(response.content) < 1024
+        assert 'Content-Encoding' not in response
+
+    def test_csv_streaming(self, authenticated_client, usuarios):
+        url = reverse('user-export-csv')
+        plano = b''.join(authenticated_client.get(url, {'stream': 'true'}).streaming_content)
+        response = authenticated_client.get(url, {'stream': 'true'}, HTTP_ACCEPT_ENCODING='gzip')
+        assert response['Content-Encoding'] == 'gzip'
+        assert not response.has_header('Content-Length')
+        assert gzip.decompress(b''.join(response.streaming_content)) == plano
+
+    def test_streaming_asincrono(self):
+        async def bloques():
+            for i in range(100):
+                yield f'fila {i}\n'.encode()
+
+        async def vista(request):
+            return StreamingHttpResponse(bloques(), content_type='text/csv')
+
+        middleware = CompresionMiddleware(vista)
+        request = AsyncRequestFactory().get('/', headers={'Accept-Encoding': 'gzip'})
+
+        async def leer():
+            response = await middleware(request)
+            return response, b''.join([bloque async for bloque in response])
+
+        response, contenido = async_to_sync(leer)()
+        assert response['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(contenido) == b''.join(f'fila {i}\n'.encode() for i in range(100))
+
+    @pytest.mark.parametrize('preparar', [
+        lambda r: r.__setitem__('Content-Encoding', 'gzip'),
+        lambda r: r.__setitem__('Accept-Ranges', 'bytes'),
+        lambda r: setattr(r, 'status_code', 206),
+        lambda r: r.__setitem__('Content-Type', 'application/gzip'),
+        lambda r: r.__setitem__('Cache-Control', 'no-transform'),
+    ])
+    def test_respuestas_excluidas(self, rf, preparar):
+        response = HttpResponse(b'a,b\n' * 1000, content_type='text/csv')
+        preparar(response)
+        resultado = self._middleware(response)(rf.get('/', headers={'Accept-Encoding': 'gzip'}))
+        assert resultado.content == b'a,b\n' * 1000
+        assert resultado.get('Content-Encoding') in (None, 'gzip') and 'Vary' not in resultado
+
+    @pytest.mark.parametrize('accept_encoding, esperada', [
+        ('gzip, br, zstd', 'zstd'),
+        ('gzip, br', 'br'),
+        ('gzip;q=1, br;q=0.5', 'gzip'),
+        ('*', 'zstd'),
+        ('gzip;q=0, *;q=0.1', 'zstd'),
+        ('identity', None),
+        ('gzip;q=0', None),
+        ('', None),
+    ])
+    def test_negociacion(self, accept_encoding, esperada):
+        with mock.patch.object(compresion.Zstd, 'disponible', return_value=True), \
+                mock.patch.object(compresion.Brotli, 'disponible', return_value=True):
+            elegida = compresion.elegir_codificacion(accept_encoding)
+        assert (elegida.nombre if elegida else None) == esperada
+
+    def test_nivel_segun_tamano(self):
+        assert compresion.Gzip.nivel(10 * 1024) == 9
+        assert compresion.Gzip.nivel(512 * 1024) == 6
+        assert compresion.Gzip.nivel(8 * 1024 * 1024) == 3
+        assert compresion.Gzip.nivel(None) == 3
+
+    @pytest.mark.parametrize('codificacion, modulo', [('Brotli', 'brotli'), ('Zstd', 'zstandard')])
+    def test_codificaciones_opcionales(self, codificacion, modulo):
+        pytest.importorskip(modulo)
+        clase = getattr(compresion, codificacion)
+        datos = b'id,email\n' + b''.join(b'%d,usuario%d@example.com\n' % (i, i) for i in range(5000))
+        completo = clase(len(datos)).comprimir(datos)
+        por_bloques = b''.join(clase().comprimir_bloques([datos[:1000], datos[1000:]]))
+        if modulo == 'brotli':
+            import brotli
+            descomprimir = brotli.decompress
+        else:
+            import zstandard
+            descomprimir = lambda d: zstandard.ZstdDecompressor().decompressobj().decompress(d)
+        assert descomprimir(completo) == datos == descomprimir(por_bloques)
@@ -0,0 +1,132 @@
+"""
+Límites del endpoint de login (``/api/token/``).
+
+Cada intento de login ejecuta un PBKDF2 completo a propósito. Sin límites, una
+ráfaga de credential stuffing ocupa todos los núcleos y deja sin CPU al resto de
+la API. Hay dos protecciones, y las dos rechazan antes de hashear:
+
+- ``LoginRateThrottle``: token buckets por email y por IP en la caché de Django
+  (en memoria del proceso con LocMemCache; compartidos con Redis/Memcached).
+  Frena los reintentos sobre una cuenta y los clientes que mandan demasiados
+  intentos.
+- ``turno_de_hasheo``: tope de hasheos simultáneos en el proceso. Frena las
+  ráfagas distribuidas entre muchas IPs y emails, que no agotan ningún bucket.
+
+Con una caché compartida, la lectura y la escritura de un bucket no son atómicas
+entre procesos. Dos intentos simultáneos pueden consumir la misma ficha, así que
+el límite es aproximado por arriba.
+"""
+import hashlib
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+_buckets_lock = threading.Lock()
+
+_hasheos_en_curso = 0
+_hasheos_condicion = threading.Condition()
+
+
+def clave_bucket(tipo, valor):
+    """
+    Clave de caché del bucket; el email o la IP se guardan como hash.
+    """
+    digest = hashlib.sha256(valor.encode('utf-8')).hexdigest()[:32]
+    return f'users:login:{tipo}:{digest}'
+
+
+def consumir_fichas(buckets, ahora=None):
+    """
+    Consume una ficha de cada bucket, o de ninguno si alguno está vacío.
+    :param buckets: Lista de tuplas (clave, capacidad, fichas por segundo).
+    :param ahora: Timestamp actual (por defecto ``time.time()``).
+    :return: 0 si se consumieron las fichas; si no, segundos hasta que haya una
+        ficha en todos los buckets.
+    """
+    ahora = time.time() if ahora is None else ahora
+    with _buckets_lock:
+        guardados = cache.get_many([clave for clave, _, _ in buckets])
+        nuevos = {}
+        espera = 0.0
+        for clave, capacidad, tasa in buckets:
+            fichas, ultimo = guardados.get(clave, (capacidad, ahora))
+            # Recarga proporcional al tiempo transcurrido, sin pasar de la capacidad
+            fichas = min(capacidad, fichas + max(0.0, ahora - ultimo) * tasa)
+            if fichas < 1:
+                espera = max(espera, (1 - fichas) / tasa)
+            nuevos[clave] = (fichas - 1, ahora, math.ceil(capacidad / tasa))
+        if espera:
+            return espera
+        for clave, (fichas, marca, ttl) in nuevos.items():
+            # El bucket se borra solo cuando ya estaría lleno otra vez
+            cache.set(clave, (fichas, marca), ttl + 1)
+        return 0
+
+
+class LoginRateThrottle(BaseThrottle):
+    """
+    Throttle de DRF para ``CustomTokenObtainPairView`` con un bucket por email y
+    otro por IP. DRF lo evalúa en ``initial()``, antes de validar el serializer.
+
+    Un bucket con capacidad 0 queda desactivado.
+    """
+    def get_buckets(self, request):
+        buckets = []
+        if settings.USERS_LOGIN_IP_BURST:
+            buckets.append((
+                clave_bucket('ip', self.get_ident(request) or ''),
+                settings.USERS_LOGIN_IP_BURST, settings.USERS_LOGIN_IP_PER_MINUTE / 60,
+            ))
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if settings.USERS_LOGIN_EMAIL_BURST and isinstance(email, str) and email.strip():
+            buckets.append((
+                clave_bucket('email', email.strip().lower()),
+                settings.USERS_LOGIN_EMAIL_BURST, settings.USERS_LOGIN_EMAIL_PER_MINUTE / 60,
+            ))
+        return buckets
+
+    def allow_request(self, request, view):
+        buckets = self.get_buckets(request)
+        self.espera = consumir_fichas(buckets) if buckets else 0
+        return not self.espera
+
+    def wait(self):
+        return self.espera
+
+
+def limite_hasheos():
+    """
+    Hasheos de login simultáneos permitidos en el proceso (0 = núcleos disponibles).
+    """
+    return settings.USERS_LOGIN_MAX_HASHES or os.cpu_count() or 1
+
+
+@contextmanager
+def turno_de_hasheo():
+    """
+    Reserva un lugar para hashear una contraseña de login.
+
+    Espera hasta ``USERS_LOGIN_HASH_WAIT`` segundos a que se libere uno.
+    :return: Context manager que entrega True si se obtuvo el lugar.
+    """
+    global _hasheos_en_curso
+    limite = limite_hasheos()
+    with _hasheos_condicion:
+        concedido = _hasheos_condicion.wait_for(
+            lambda: _hasheos_en_curso < limite, timeout=settings.USERS_LOGIN_HASH_WAIT
+        )
+        if concedido:
+            _hasheos_en_curso += 1
+    try:
+        yield concedido
+    finally:
+        if concedido:
+            with _hasheos_condicion:
+                _hasheos_en_curso -= 1
+                _hasheos_condicion.notify()
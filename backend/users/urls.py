@@ -1,10 +1,32 @@
+from django.conf import settings
 from django.urls import path
-from .views import UserListView, UserDetailView, UserCSVExportView
+from .views import (
+    UserListView, UserDetailView, UserCSVExportView, UserBulkView,
+    UserCSVImportView, UserCSVImportErrorsView,
+    UserExportJobView, UserExportJobDetailView, UserExportJobDownloadView
+)
+from .async_views import AsyncUserListView, AsyncUserDetailView
+
+# En el despliegue ASGI las rutas principales usan las vistas asíncronas
+if settings.USERS_ASYNC_VIEWS:
+    ListView, DetailView = AsyncUserListView, AsyncUserDetailView
+else:
+    ListView, DetailView = UserListView, UserDetailView
 
 urlpatterns = [
-    path('users/', UserListView.as_view(), name='user-list'),
-    path('users/<int:id>/', UserDetailView.as_view(), name='user-detail'),
+    path('users/', ListView.as_view(), name='user-list'),
+    path('users/<int:id>/', DetailView.as_view(), name='user-detail'),
+    path('users/bulk/', UserBulkView.as_view(), name='user-bulk'),
 
     # Ruta para descargar el CSV de usuarios
     path('users/export/csv/', UserCSVExportView.as_view(), name='user-export-csv'),
+
+    # Exportaciones en segundo plano: solicitud, estado y descarga del archivo gzip
+    path('users/export/jobs/', UserExportJobView.as_view(), name='user-export-jobs'),
+    path('users/export/jobs/<uuid:id>/', UserExportJobDetailView.as_view(), name='user-export-job'),
+    path('users/export/jobs/<uuid:id>/descarga/', UserExportJobDownloadView.as_view(), name='user-export-job-descarga'),
+
+    # Importación CSV y descarga de las filas rechazadas
+    path('users/import/csv/', UserCSVImportView.as_view(), name='user-import-csv'),
+    path('users/import/csv/<str:token>/errores/', UserCSVImportErrorsView.as_view(), name='user-import-csv-errores'),
 ]
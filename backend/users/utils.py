@@ -1,30 +1,505 @@
 import csv
+import importlib.util
+import json
+import os
+import re
+from datetime import timezone as dt_timezone
 from io import StringIO
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
 
-def generar_users_csv(users):
+# Columnas del archivo users.csv (en este orden)
+CSV_COLUMNAS = ['id', 'email', 'first_name', 'last_name', 'phone', 'date_joined']
+
+# Filas que se leen de la base de datos por cada viaje al cursor
+CSV_CHUNK_SIZE = 2000
+
+# Filas por row group de los archivos Parquet
+PARQUET_FILAS_POR_GRUPO = 64 * 1024
+
+
+def _texto(valor):
+    return valor or ''
+
+
+def _fecha_csv(valor):
+    return valor.strftime('%Y-%m-%d %H:%M:%S') if valor else ''
+
+
+# Formato de cada columna; las no listadas se escriben tal cual (vacío si no hay valor)
+CSV_FORMATOS = {
+    'date_joined': _fecha_csv,
+}
+
+
+def _formatos(columnas):
+    return [CSV_FORMATOS.get(columna, _texto) for columna in columnas]
+
+
+def _fila_csv(formatos, valores):
+    """
+    Da formato a una fila del CSV con las mismas reglas para ambos modos de exportación.
+    """
+    return [formato(valor) for formato, valor in zip(formatos, valores)]
+
+
+class _Eco:
+    """
+    Objeto con interfaz de archivo que devuelve lo escrito en lugar de guardarlo,
+    para que csv.writer genere texto sin acumularlo en memoria.
+    """
+    def write(self, value):
+        return value
+
+
+def _lotes(users, columnas, chunk_size):
+    """
+    Recorre las filas con un cursor del lado del servidor (``iterator``) y las agrupa.
+    :return: Generador de listas de tuplas ordenadas por id, de hasta ``chunk_size`` filas.
+    """
+    filas = users.order_by('id').values_list(*columnas).iterator(chunk_size=chunk_size)
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= chunk_size:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def iterar_users_csv(users, chunk_size=CSV_CHUNK_SIZE, columnas=CSV_COLUMNAS, al_avanzar=None):
+    """
+    Genera el contenido del CSV por bloques sin cargar toda la tabla en memoria.
+
+    Solo se consultan las columnas exportadas y se recorren con un cursor del lado
+    del servidor (``iterator``), por lo que la memoria usada depende de ``chunk_size``
+    y no del número de usuarios.
+    :param users: QuerySet de usuarios a exportar.
+    :param chunk_size: Filas leídas por viaje a la base de datos y emitidas por bloque.
+    :param columnas: Columnas a exportar (subconjunto de ``CSV_COLUMNAS``).
+    :param al_avanzar: Función opcional que recibe el total de filas emitidas tras cada bloque.
+    :return: Generador de cadenas con bloques del CSV.
+    """
+    writer = csv.writer(_Eco())
+    formatos = _formatos(columnas)
+    yield writer.writerow(columnas)
+
+    total = 0
+    for lote in _lotes(users, columnas, chunk_size):
+        yield ''.join([writer.writerow(_fila_csv(formatos, fila)) for fila in lote])
+        total += len(lote)
+        if al_avanzar:
+            al_avanzar(total)
+
+
+# Formatos de exportación registrados, por nombre (parámetro ``format``)
+EXPORTADORES = {}
+
+
+class FormatoInvalido(ValueError):
+    """Se pidió un formato de exportación que no existe."""
+
+
+class FormatoNoDisponible(FormatoInvalido):
+    """El formato existe pero falta la dependencia opcional que lo genera."""
+
+
+def registrar_exportador(cls):
+    """
+    Registra una subclase de ``Exportador`` con el nombre de su ``formato``.
+    """
+    EXPORTADORES[cls.formato] = cls
+    return cls
+
+
+class Exportador:
+    """
+    Base de los formatos de exportación de usuarios.
+
+    Cada formato genera el archivo por bloques a partir de lotes de filas de
+    ``values_list``, así que la memoria usada no depende del número de usuarios.
+    """
+    formato = None
+    content_type = None
+    extension = None
+    # Filas leídas por viaje a la base de datos (y por bloque emitido)
+    chunk_size = CSV_CHUNK_SIZE
+
+    def __init__(self, columnas=CSV_COLUMNAS, chunk_size=None):
+        self.columnas = list(columnas)
+        if chunk_size:
+            self.chunk_size = chunk_size
+
+    @classmethod
+    def disponible(cls):
+        return True
+
+    def bloques(self, users, al_avanzar=None):
+        """
+        :param users: QuerySet de usuarios a exportar.
+        :param al_avanzar: Función opcional que recibe el total de filas emitidas tras cada bloque.
+        :return: Generador de bloques del archivo (str o bytes).
+        """
+        raise NotImplementedError
+
+    def respuesta(self, users):
+        """
+        :return: StreamingHttpResponse con el archivo como descarga.
+        """
+        response = StreamingHttpResponse(self.bloques(users), content_type=self.content_type)
+        response['Content-Disposition'] = f'attachment; filename="users.{self.extension}"'
+        return response
+
+
+@registrar_exportador
+class ExportadorCSV(Exportador):
+    formato = 'csv'
+    content_type = 'text/csv'
+    extension = 'csv'
+
+    def bloques(self, users, al_avanzar=None):
+        return iterar_users_csv(users, self.chunk_size, self.columnas, al_avanzar)
+
+
+def _fecha_iso(valor):
+    # ISO 8601 en UTC con 'Z', como el listado de la API con TIME_ZONE='UTC'
+    if not valor:
+        return None
+    return valor.astimezone(dt_timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+@registrar_exportador
+class ExportadorNDJSON(Exportador):
+    """
+    Un objeto JSON por línea: ``id`` como número y ``date_joined`` como ISO 8601.
+    """
+    formato = 'ndjson'
+    content_type = 'application/x-ndjson'
+    extension = 'ndjson'
+    conversores = {
+        'date_joined': _fecha_iso,
+    }
+
+    def bloques(self, users, al_avanzar=None):
+        columnas = self.columnas
+        conversiones = [
+            (indice, self.conversores[columna])
+            for indice, columna in enumerate(columnas) if columna in self.conversores
+        ]
+        codificar = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+        total = 0
+        for lote in _lotes(users, columnas, self.chunk_size):
+            lineas = []
+            for fila in lote:
+                if conversiones:
+                    fila = list(fila)
+                    for indice, conversor in conversiones:
+                        fila[indice] = conversor(fila[indice])
+                lineas.append(codificar(dict(zip(columnas, fila))))
+            lineas.append('')
+            yield '\n'.join(lineas)
+            total += len(lote)
+            if al_avanzar:
+                al_avanzar(total)
+
+
+class _Salida:
+    """
+    Archivo de solo escritura que acumula lo que escribe pyarrow hasta que se vacía,
+    para enviar el archivo por partes sin guardarlo completo.
+    """
+    closed = False
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes = []
+        return datos
+
+
+class ExportadorArrow(Exportador):
+    """
+    Base de los formatos columnares. Requieren ``pyarrow`` (dependencia opcional), que
+    se importa al exportar para no cargarlo al iniciar el proceso.
+
+    Las columnas conservan su tipo: ``id`` es int64 y ``date_joined`` un timestamp
+    en UTC, así que no hay que volver a interpretar texto al cargar el archivo.
+    """
+    @classmethod
+    def disponible(cls):
+        return importlib.util.find_spec('pyarrow') is not None
+
+    def esquema(self, pa):
+        tipos = {
+            'id': pa.int64(),
+            'date_joined': pa.timestamp('us', tz='UTC'),
+        }
+        return pa.schema([
+            pa.field(columna, tipos.get(columna, pa.string()), nullable=columna != 'id')
+            for columna in self.columnas
+        ])
+
+    def lotes_arrow(self, pa, esquema, users, al_avanzar):
+        """
+        Convierte cada lote de filas en un ``RecordBatch`` con el esquema tipado.
+        """
+        total = 0
+        for lote in _lotes(users, self.columnas, self.chunk_size):
+            yield pa.RecordBatch.from_arrays(
+                [pa.array(valores, type=campo.type) for valores, campo in zip(zip(*lote), esquema)],
+                schema=esquema,
+            )
+            total += len(lote)
+            if al_avanzar:
+                al_avanzar(total)
+
+    def abrir(self, pa, salida, esquema):
+        raise NotImplementedError
+
+    def escribir(self, escritor, lote):
+        escritor.write_batch(lote)
+
+    def bloques(self, users, al_avanzar=None):
+        import pyarrow as pa
+
+        esquema = self.esquema(pa)
+        salida = _Salida()
+        escritor = self.abrir(pa, salida, esquema)
+        try:
+            for lote in self.lotes_arrow(pa, esquema, users, al_avanzar):
+                self.escribir(escritor, lote)
+                datos = salida.vaciar()
+                if datos:
+                    yield datos
+        finally:
+            escritor.close()
+        yield salida.vaciar()
+
+
+@registrar_exportador
+class ExportadorArrowIPC(ExportadorArrow):
+    """
+    Archivo Arrow IPC (Feather v2): se carga con ``pyarrow.ipc.open_file`` o
+    ``pandas.read_feather`` casi sin conversión.
+    """
+    formato = 'arrow'
+    content_type = 'application/vnd.apache.arrow.file'
+    extension = 'arrow'
+
+    def abrir(self, pa, salida, esquema):
+        return pa.ipc.new_file(salida, esquema)
+
+
+@registrar_exportador
+class ExportadorParquet(ExportadorArrow):
+    """
+    Archivo Parquet comprimido con Snappy. Las filas se agrupan en row groups de
+    ``PARQUET_FILAS_POR_GRUPO`` para que el archivo no quede con miles de grupos
+    pequeños; la memoria usada depende de ese tamaño.
+    """
+    formato = 'parquet'
+    content_type = 'application/vnd.apache.parquet'
+    extension = 'parquet'
+
+    def abrir(self, pa, salida, esquema):
+        import pyarrow.parquet as pq
+
+        return pq.ParquetWriter(salida, esquema)
+
+    def lotes_arrow(self, pa, esquema, users, al_avanzar):
+        pendientes = []
+        filas = 0
+        for lote in super().lotes_arrow(pa, esquema, users, al_avanzar):
+            pendientes.append(lote)
+            filas += lote.num_rows
+            if filas >= PARQUET_FILAS_POR_GRUPO:
+                yield pa.Table.from_batches(pendientes, schema=esquema)
+                pendientes = []
+                filas = 0
+        if pendientes:
+            yield pa.Table.from_batches(pendientes, schema=esquema)
+
+    def escribir(self, escritor, tabla):
+        escritor.write_table(tabla, row_group_size=tabla.num_rows)
+
+
+def elegir_exportador(request):
+    """
+    Elige el formato de exportación con el parámetro ``format`` o, si no se envía,
+    con el header ``Accept``. Sin coincidencias se usa CSV.
+    :return: Subclase de ``Exportador``.
+    :raises FormatoInvalido: Si ``format`` no es un formato conocido.
+    :raises FormatoNoDisponible: Si el formato pedido necesita una dependencia que no está instalada.
+    """
+    formato = request.GET.get('format', '').strip().lower()
+    if formato:
+        exportador = EXPORTADORES.get(formato)
+        if exportador is None:
+            raise FormatoInvalido(
+                f"Formato desconocido: {formato}. Formatos disponibles: {', '.join(EXPORTADORES)}"
+            )
+        if not exportador.disponible():
+            raise FormatoNoDisponible(f"El formato {formato} requiere instalar pyarrow")
+        return exportador
+
+    disponibles = {cls.content_type: cls for cls in EXPORTADORES.values() if cls.disponible()}
+    preferido = request.get_preferred_type(list(disponibles))
+    return disponibles.get(preferido, ExportadorCSV)
+
+
+def generar_users_csv_streaming(users, chunk_size=CSV_CHUNK_SIZE, columnas=CSV_COLUMNAS):
+    """
+    Genera una respuesta CSV en streaming a partir de un QuerySet de usuarios.
+    :param users: QuerySet de usuarios a exportar.
+    :param chunk_size: Filas leídas por viaje a la base de datos.
+    :param columnas: Columnas a exportar (subconjunto de ``CSV_COLUMNAS``).
+    :return: StreamingHttpResponse con el contenido del CSV.
+    """
+    return ExportadorCSV(columnas, chunk_size).respuesta(users)
+
+
+def generar_users_csv(users, columnas=CSV_COLUMNAS):
     """
     Genera un archivo CSV a partir de una lista de usuarios.
     :param users: QuerySet o lista de objetos User de Django.
+    :param columnas: Columnas a exportar (subconjunto de ``CSV_COLUMNAS``).
     :return: HttpResponse con el contenido del CSV.
     """
     output = StringIO()
     writer = csv.writer(output)
-    
+    formatos = _formatos(columnas)
+
     # Escribir encabezados
-    writer.writerow(['id', 'email', 'first_name', 'last_name', 'phone', 'date_joined'])
-    
+    writer.writerow(columnas)
+
+    # Con un QuerySet solo se cargan las columnas exportadas
+    if hasattr(users, 'only'):
+        users = users.only(*columnas)
+
     # Escribir datos de los usuarios
     for user in users:
-        writer.writerow([
-            user.id or '',
-            user.email or '',
-            user.first_name or '',
-            user.last_name or '',
-            user.phone or '',
-            user.date_joined.strftime('%Y-%m-%d %H:%M:%S') if user.date_joined else ''
-        ])
-    
+        writer.writerow(_fila_csv(formatos, [getattr(user, columna) for columna in columnas]))
+
     response = HttpResponse(output.getvalue(), content_type='text/csv')
     response['Content-Disposition'] = 'attachment; filename="users.csv"'
-    return response
\ No newline at end of file
+    return response
+
+
+# Bloques leídos del disco al enviar un rango de un archivo
+BLOQUE_DESCARGA = 64 * 1024
+
+_RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangoNoSatisfacible(ValueError):
+    """El rango pedido empieza después del final del archivo."""
+
+
+def interpretar_rango(header, tamano):
+    """
+    Interpreta un header ``Range`` de un solo rango de bytes (RFC 9110).
+    :param header: Valor del header, por ejemplo ``bytes=100-`` o ``bytes=-500``.
+    :param tamano: Tamaño del archivo en bytes.
+    :return: Tupla (inicio, fin) inclusiva, o None si el header no es válido o pide
+        varios rangos (en ese caso se envía el archivo completo).
+    :raises RangoNoSatisfacible: Si el rango queda fuera del archivo.
+    """
+    coincidencia = _RANGO.match(header.strip())
+    if not coincidencia:
+        return None
+    inicio, fin = coincidencia.groups()
+    if not inicio:
+        # bytes=-N: los últimos N bytes
+        if not fin:
+            return None
+        sufijo = int(fin)
+        if sufijo == 0 or tamano == 0:
+            raise RangoNoSatisfacible()
+        return max(0, tamano - sufijo), tamano - 1
+    inicio = int(inicio)
+    if fin and int(fin) < inicio:
+        return None
+    if inicio >= tamano:
+        raise RangoNoSatisfacible()
+    fin = int(fin) if fin else tamano - 1
+    return inicio, min(fin, tamano - 1)
+
+
+def _leer_rango(archivo, inicio, longitud):
+    try:
+        archivo.seek(inicio)
+        restante = longitud
+        while restante > 0:
+            datos = archivo.read(min(BLOQUE_DESCARGA, restante))
+            if not datos:
+                break
+            restante -= len(datos)
+            yield datos
+    finally:
+        archivo.close()
+
+
+def respuesta_archivo(request, ruta, content_type, nombre, etag):
+    """
+    Envía un archivo del disco como descarga con soporte de ``Range`` para poder
+    reanudar transferencias interrumpidas.
+
+    Con un rango válido se responde 206 con solo esos bytes; con ``If-Range``
+    distinto del ``ETag`` actual se envía el archivo completo.
+    :param ruta: Ruta del archivo.
+    :param nombre: Nombre sugerido para guardar el archivo.
+    :param etag: ETag del contenido (entre comillas).
+    :return: FileResponse (200), StreamingHttpResponse (206) o HttpResponse (416).
+    :raises FileNotFoundError: Si el archivo no existe.
+    """
+    archivo = open(ruta, 'rb')
+    tamano = os.fstat(archivo.fileno()).st_size
+
+    rango = None
+    header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if header and (if_range is None or if_range == etag):
+        try:
+            rango = interpretar_rango(header, tamano)
+        except RangoNoSatisfacible:
+            archivo.close()
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{tamano}'
+            return response
+
+    if rango is None:
+        response = FileResponse(archivo, as_attachment=True, filename=nombre, content_type=content_type)
+    else:
+        inicio, fin = rango
+        longitud = fin - inicio + 1
+        response = StreamingHttpResponse(
+            _leer_rango(archivo, inicio, longitud), status=206, content_type=content_type
+        )
+        response['Content-Range'] = f'bytes {inicio}-{fin}/{tamano}'
+        response['Content-Length'] = str(longitud)
+        response['Content-Disposition'] = content_disposition_header(True, nombre)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    return response
+
@@ -1,19 +1,43 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import MultiPartParser
+from rest_framework.exceptions import Throttled
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.views import View
+from django.http import JsonResponse, FileResponse
+from django.urls import reverse
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.cache import patch_vary_headers
 
+import io
 from http import HTTPStatus
-from .serializers import UserSerializer, CustomTokenObtainPairSerializer
-from .models import User
+from .serializers import UserSerializer, CustomTokenObtainPairSerializer, FastUserListSerializer, ExportJobSerializer
+from .models import ExportJob, User
+from .pagination import UserCursorPagination, CursorInvalido
+from .sincronizacion import SincronizacionUsuarios, cambios_para_exportar
+from .routers import alias_lectura, lecturas_en_replica
+from .filters import filtrar_usuarios, leer_filtros, aplicar_filtros, campos_solicitados, FiltroInvalido
+from .directorio import directorio
+from .parsers import NDJSONParser, ORJSONParser
+from .throttling import LoginRateThrottle, turno_de_hasheo
+from .bulk import (
+    crear_usuarios_en_lote, actualizar_usuarios_en_lote, actualizar_usuarios_por_filtro,
+    eliminar_usuarios, eliminar_usuarios_por_filtro, leer_ids, LoteInvalido
+)
+from .cache import CacheListadoUsuarios
+from .importacion import importar_usuarios_csv, abrir_texto, ruta_reporte, ArchivoInvalido
+from .exportaciones import parametros_exportacion, solicitar_exportacion
 
-# Documentación Swagger
-from drf_yasg.utils import swagger_auto_schema
-from drf_yasg import openapi
+# Documentación Swagger (drf_yasg se importa solo al generar el esquema)
+from .documentacion import documentar, openapi
 
 # Exportamos la funcion de crear el csv
-from .utils import generar_users_csv
+from .utils import (
+    CSV_COLUMNAS, ExportadorCSV, FormatoInvalido, FormatoNoDisponible,
+    elegir_exportador, generar_users_csv, respuesta_archivo
+)
 
 class UserListView(APIView):
     """
@@ -24,6 +48,7 @@ class UserListView(APIView):
     - Crear nuevos usuarios
     """
     permission_classes = [IsAuthenticated]  # Requiere autenticación para acceder a los endpoints
+    lecturas_en_replica = True  # GET se lee de la réplica si hay una (ver ReplicaMiddleware)
     # Esquema para documentación Swagger de la respuesta de la lista de usuarios
     user_response_schema = {
         "type": "object",
@@ -41,39 +66,181 @@ class UserListView(APIView):
                         "date_joined": {"type": "string", "format": "date-time"}
                     }
                 }
-            }
+            },
+            "next": {"type": "string", "nullable": True},
+            "previous": {"type": "string", "nullable": True}
         }
     }
-    @swagger_auto_schema(
+    @documentar(lambda: dict(
         operation_summary="Listar usuarios",
         operation_description="Obtiene una lista de todos los usuarios registrados",
+        manual_parameters=[
+            openapi.Parameter(
+                'cursor',
+                openapi.IN_QUERY,
+                description="Cursor opaco devuelto en 'next' o 'previous'",
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+            openapi.Parameter(
+                'page_size',
+                openapi.IN_QUERY,
+                description="Cantidad de usuarios por página",
+                type=openapi.TYPE_INTEGER,
+                required=False
+            ),
+            openapi.Parameter(
+                'fields',
+                openapi.IN_QUERY,
+                description="Campos a devolver separados por comas (id, email, first_name, last_name, phone, date_joined)",
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+            openapi.Parameter(
+                'email',
+                openapi.IN_QUERY,
+                description="Prefijo del email (sin distinguir mayúsculas)",
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+            openapi.Parameter(
+                'search',
+                openapi.IN_QUERY,
+                description="Texto a buscar en el nombre o los apellidos (sin distinguir mayúsculas)",
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+            openapi.Parameter(
+                'joined_after',
+                openapi.IN_QUERY,
+                description="Usuarios registrados desde esta fecha (ISO 8601)",
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+            openapi.Parameter(
+                'joined_before',
+                openapi.IN_QUERY,
+                description="Usuarios registrados hasta esta fecha (ISO 8601, una fecha incluye todo el día)",
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+            openapi.Parameter(
+                'is_active',
+                openapi.IN_QUERY,
+                description="Filtra por usuarios activos (true) o inactivos (false)",
+                type=openapi.TYPE_BOOLEAN,
+                required=False
+            ),
+            openapi.Parameter(
+                'since',
+                openapi.IN_QUERY,
+                description=(
+                    "Sincronización incremental: cursor 'since' de la respuesta anterior o una "
+                    "fecha ISO 8601 para empezar. Devuelve los usuarios creados o modificados "
+                    "y los ids eliminados después del cursor, con el cursor nuevo"
+                ),
+                type=openapi.TYPE_STRING,
+                required=False
+            )
+        ],
         responses={
             HTTPStatus.OK.value: openapi.Response(
                 description="Lista de usuarios recuperada exitosamente",
-                schema=openapi.Schema(**user_response_schema)
+                schema=openapi.Schema(**UserListView.user_response_schema)
             ),
+            HTTPStatus.NOT_MODIFIED.value: "La lista no cambió desde el ETag enviado",
+            HTTPStatus.BAD_REQUEST.value: "Cursor, tamaño de página, filtro o campos inválidos",
             HTTPStatus.UNAUTHORIZED.value: "No autorizado"
         },
         tags=['Usuarios']
-    )
+    ))
         
     def get(self, request):
         """
         Obtiene una lista de todos los usuarios.
 
+        La lista se pagina por cursor ordenando por ``(date_joined, id)``. Sin
+        ``cursor`` ni ``page_size`` se devuelve la lista completa hasta
+        ``USERS_UNPAGINATED_LIMIT`` usuarios.
+
+        Acepta los filtros ``email``, ``search``, ``joined_after``, ``joined_before``
+        e ``is_active`` (ver ``users.filters``) y ``fields`` para consultar y devolver
+        solo algunos campos.
+
+        Las respuestas se guardan en caché por versión de la tabla y parámetros, y
+        llevan ``ETag``: con ``If-None-Match`` vigente se responde 304 sin cuerpo.
+
+        Con ``since`` se responden solo los cambios posteriores a ese cursor (ver
+        ``users.sincronizacion``), sin caché.
+
         Args:
             request: Objeto de solicitud HTTP.
 
         Returns:
             Response: Una respuesta JSON que contiene:
                 - data: Lista de objetos usuario serializados
-                - status: HTTP 200 OK
+                - next / previous: Cursores de las páginas vecinas
+                - status: HTTP 200 OK, 304 NOT MODIFIED o 400 BAD REQUEST
         """
-        users = User.objects.all()
-        serializer = UserSerializer(users, many=True)
-        return Response({"data": serializer.data}, status=HTTPStatus.OK)
+        if request.query_params.get('since'):
+            return self._sincronizar(request)
+
+        cache_listado = CacheListadoUsuarios(request)
+        if cache_listado.no_modificado():
+            return Response(status=HTTPStatus.NOT_MODIFIED, headers=cache_listado.headers())
+
+        data = cache_listado.obtener()
+        if data is None:
+            try:
+                paginacion = UserCursorPagination(request.query_params)
+                filtros = leer_filtros(request.query_params)
+                campos = campos_solicitados(request.query_params, FastUserListSerializer.campos)
+            except (CursorInvalido, FiltroInvalido) as e:
+                return Response({
+                    "mensaje": str(e)
+                }, status=HTTPStatus.BAD_REQUEST)
+
+            serializer = FastUserListSerializer(campos, adicionales=paginacion.orden)
+            if settings.USERS_DIRECTORY:
+                # Desde el directorio en memoria del proceso (ver users.directorio)
+                filas = directorio.filas(filtros, paginacion, serializer.columnas)
+            else:
+                users = aplicar_filtros(User.objects.all(), filtros)
+                filas = paginacion.get_queryset(serializer.get_queryset(users))
+            users, siguiente, anterior = paginacion.get_page(filas)
+            data = paginacion.get_response_data(serializer.serializar(users), siguiente, anterior)
+            cache_listado.guardar(data)
+
+        return Response(data, status=HTTPStatus.OK, headers=cache_listado.headers())
     
-    @swagger_auto_schema(
+    def _sincronizar(self, request):
+        """
+        Responde los usuarios cambiados y eliminados después del cursor ``since``.
+
+        Se lee del primario: con una réplica atrasada más que ``USERS_SYNC_LAG`` el
+        cursor avanzaría sobre cambios que todavía no llegaron.
+        """
+        try:
+            sincronizacion = SincronizacionUsuarios(request.query_params)
+            users = filtrar_usuarios(User.objects.all(), request.query_params)
+            campos = campos_solicitados(request.query_params, FastUserListSerializer.campos)
+        except (CursorInvalido, FiltroInvalido) as e:
+            return Response({
+                "mensaje": str(e)
+            }, status=HTTPStatus.BAD_REQUEST)
+
+        serializer = FastUserListSerializer(campos, adicionales=sincronizacion.orden)
+        with lecturas_en_replica(False):
+            filas, eliminados, cursor, hay_mas = sincronizacion.get_page(
+                sincronizacion.get_queryset(serializer.get_queryset(users)),
+                sincronizacion.get_eliminados(),
+            )
+        return Response(
+            sincronizacion.get_response_data(serializer.serializar(filas), eliminados, cursor, hay_mas),
+            status=HTTPStatus.OK
+        )
+
+    @documentar(lambda: dict(
         operation_summary="Crear usuario",
         operation_description="Crea un nuevo usuario en el sistema",
         request_body=openapi.Schema(
@@ -102,7 +269,7 @@ class UserListView(APIView):
             HTTPStatus.UNAUTHORIZED.value: "No autorizado"
         },
         tags=['Usuarios']
-    )
+    ))
     
     def post(self, request):
         """
@@ -149,7 +316,7 @@ class UserDetailView(APIView):
     """
     permission_classes = [IsAuthenticated]  # Requiere autenticación para acceder a los endpoints
 
-    @swagger_auto_schema(
+    @documentar(lambda: dict(
         operation_summary="Actualizar usuario",
         operation_description="Actualiza los datos de un usuario existente",
         manual_parameters=[
@@ -186,7 +353,7 @@ class UserDetailView(APIView):
             HTTPStatus.UNAUTHORIZED.value: "No autorizado"
         },
         tags=['Usuarios']
-    )
+    ))
     
     def put(self, request, id):
         """
@@ -224,7 +391,7 @@ class UserDetailView(APIView):
                 "mensaje": "El usuario no existe"
             }, status=HTTPStatus.NOT_FOUND)     
 
-    @swagger_auto_schema(
+    @documentar(lambda: dict(
         operation_summary="Eliminar usuario",
         operation_description="Elimina un usuario existente",
         manual_parameters=[
@@ -242,7 +409,7 @@ class UserDetailView(APIView):
             HTTPStatus.UNAUTHORIZED.value: "No autorizado"
         },
         tags=['Usuarios']
-    )
+    ))
     def delete(self, request, id):
         """
         Elimina un usuario existente.
@@ -270,35 +437,636 @@ class UserDetailView(APIView):
                 "mensaje": "El usuario no existe"
             }, status=HTTPStatus.NOT_FOUND)
             
+class UserBulkView(APIView):
+    """
+    Vista API para operaciones masivas sobre usuarios.
+
+    Esta vista proporciona endpoints para:
+    - Crear muchos usuarios en una sola petición
+    - Actualizar muchos usuarios por id o por filtro
+    - Eliminar muchos usuarios por id o por filtro
+    """
+    permission_classes = [IsAuthenticated]  # Requiere autenticación para acceder a los endpoints
+    parser_classes = [ORJSONParser, NDJSONParser]
+
+    @documentar(lambda: dict(
+        operation_summary="Crear usuarios en lote",
+        operation_description=(
+            "Crea varios usuarios a partir de un arreglo JSON o de un cuerpo NDJSON "
+            "(application/x-ndjson). Devuelve un reporte por fila."
+        ),
+        request_body=openapi.Schema(
+            type=openapi.TYPE_ARRAY,
+            items=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                required=['email', 'password', 'first_name', 'last_name'],
+                properties={
+                    'email': openapi.Schema(type=openapi.TYPE_STRING),
+                    'password': openapi.Schema(type=openapi.TYPE_STRING),
+                    'first_name': openapi.Schema(type=openapi.TYPE_STRING),
+                    'last_name': openapi.Schema(type=openapi.TYPE_STRING),
+                    'phone': openapi.Schema(type=openapi.TYPE_STRING),
+                }
+            )
+        ),
+        responses={
+            HTTPStatus.CREATED.value: "Todos los usuarios se crearon",
+            HTTPStatus.MULTI_STATUS.value: "Algunas filas tuvieron errores",
+            HTTPStatus.BAD_REQUEST.value: "Ninguna fila se pudo crear",
+            HTTPStatus.UNAUTHORIZED.value: "No autorizado"
+        },
+        tags=['Usuarios']
+    ))
+    def post(self, request):
+        """
+        Crea usuarios en lote.
+
+        Las filas se validan con las reglas de ``UserSerializer``, las contraseñas se
+        hashean en paralelo y los usuarios se insertan con ``bulk_create``.
+
+        Args:
+            request: Objeto de solicitud HTTP con un arreglo de usuarios.
+
+        Returns:
+            Response: Una respuesta JSON que contiene:
+                - mensaje: Resumen de la operación
+                - creados / errores: Totales
+                - resultados: Reporte por fila (estado, id o error)
+                - status: HTTP 201 CREATED, 207 MULTI STATUS o 400 BAD REQUEST
+        """
+        filas = request.data
+        if not isinstance(filas, list) or not filas:
+            return Response({
+                "mensaje": "Se esperaba un arreglo de usuarios"
+            }, status=HTTPStatus.BAD_REQUEST)
+        if len(filas) > settings.USERS_BULK_MAX_ROWS:
+            return Response({
+                "mensaje": f"Se permiten como máximo {settings.USERS_BULK_MAX_ROWS} usuarios por petición"
+            }, status=HTTPStatus.BAD_REQUEST)
+
+        resultados = crear_usuarios_en_lote(filas)
+        creados = sum(1 for r in resultados if r["estado"] == "creado")
+        errores = len(resultados) - creados
+
+        if not errores:
+            status = HTTPStatus.CREATED
+        elif creados:
+            status = HTTPStatus.MULTI_STATUS
+        else:
+            status = HTTPStatus.BAD_REQUEST
+        return Response({
+            "mensaje": f"Se crearon {creados} de {len(resultados)} usuarios",
+            "creados": creados,
+            "errores": errores,
+            "resultados": resultados
+        }, status=status)
+
+    @staticmethod
+    def _status(correctos, errores):
+        if not errores:
+            return HTTPStatus.OK
+        if correctos:
+            return HTTPStatus.MULTI_STATUS
+        return HTTPStatus.BAD_REQUEST
+
+    @staticmethod
+    def _error_lote(error):
+        respuesta = {"mensaje": str(error)}
+        if error.errores:
+            respuesta["error"] = error.errores
+        return Response(respuesta, status=HTTPStatus.BAD_REQUEST)
+
+    @documentar(lambda: dict(
+        operation_summary="Actualizar usuarios en lote",
+        operation_description=(
+            "Recibe un arreglo (JSON o NDJSON) con el id y los campos a cambiar de cada "
+            "usuario, o un objeto {\"filtro\": {...}, \"cambios\": {...}} para aplicar los "
+            "mismos cambios a todos los usuarios que cumplen el filtro (ids, email, search, "
+            "joined_after, joined_before, is_active). Devuelve un reporte por usuario."
+        ),
+        request_body=openapi.Schema(
+            type=openapi.TYPE_ARRAY,
+            items=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                required=['id'],
+                properties={
+                    'id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'email': openapi.Schema(type=openapi.TYPE_STRING),
+                    'password': openapi.Schema(type=openapi.TYPE_STRING),
+                    'first_name': openapi.Schema(type=openapi.TYPE_STRING),
+                    'last_name': openapi.Schema(type=openapi.TYPE_STRING),
+                    'phone': openapi.Schema(type=openapi.TYPE_STRING),
+                    'is_active': openapi.Schema(type=openapi.TYPE_BOOLEAN),
+                }
+            )
+        ),
+        responses={
+            HTTPStatus.OK.value: "Todos los usuarios se actualizaron",
+            HTTPStatus.MULTI_STATUS.value: "Algunos usuarios tuvieron errores",
+            HTTPStatus.BAD_REQUEST.value: "Ningún usuario se pudo actualizar",
+            HTTPStatus.UNAUTHORIZED.value: "No autorizado"
+        },
+        tags=['Usuarios']
+    ))
+    def patch(self, request):
+        """
+        Actualiza usuarios en lote.
+
+        Los cambios se validan con las reglas de ``UserSerializer`` y se aplican con
+        ``bulk_update`` o ``QuerySet.update`` en una sola transacción; las contraseñas
+        se hashean como en la actualización individual.
+
+        Args:
+            request: Objeto de solicitud HTTP con un arreglo de cambios o un filtro.
+
+        Returns:
+            Response: Una respuesta JSON que contiene:
+                - mensaje: Resumen de la operación
+                - actualizados / errores: Totales
+                - resultados: Reporte por usuario (id, estado o error)
+                - status: HTTP 200 OK, 207 MULTI STATUS o 400 BAD REQUEST
+        """
+        datos = request.data
+        try:
+            if isinstance(datos, list) and datos:
+                if len(datos) > settings.USERS_BULK_MAX_ROWS:
+                    raise LoteInvalido(
+                        f"Se permiten como máximo {settings.USERS_BULK_MAX_ROWS} usuarios por petición"
+                    )
+                resultados = actualizar_usuarios_en_lote(datos)
+            elif isinstance(datos, dict) and 'filtro' in datos:
+                resultados = actualizar_usuarios_por_filtro(datos['filtro'], datos.get('cambios'))
+            else:
+                raise LoteInvalido("Se esperaba un arreglo de cambios o un objeto con filtro y cambios")
+        except LoteInvalido as e:
+            return self._error_lote(e)
+
+        actualizados = sum(1 for r in resultados if r["estado"] == "actualizado")
+        errores = len(resultados) - actualizados
+        return Response({
+            "mensaje": f"Se actualizaron {actualizados} de {len(resultados)} usuarios",
+            "actualizados": actualizados,
+            "errores": errores,
+            "resultados": resultados
+        }, status=self._status(actualizados, errores))
+
+    @documentar(lambda: dict(
+        operation_summary="Eliminar usuarios en lote",
+        operation_description=(
+            "Elimina los usuarios indicados con {\"ids\": [...]} o todos los que cumplen "
+            "{\"filtro\": {...}}. Devuelve un reporte por usuario."
+        ),
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'ids': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER)),
+                'filtro': openapi.Schema(type=openapi.TYPE_OBJECT),
+            }
+        ),
+        responses={
+            HTTPStatus.OK.value: "Todos los usuarios se eliminaron",
+            HTTPStatus.MULTI_STATUS.value: "Algunos usuarios no existían",
+            HTTPStatus.BAD_REQUEST.value: "Ningún usuario se pudo eliminar",
+            HTTPStatus.UNAUTHORIZED.value: "No autorizado"
+        },
+        tags=['Usuarios']
+    ))
+    def delete(self, request):
+        """
+        Elimina usuarios en lote en una sola transacción.
+
+        Args:
+            request: Objeto de solicitud HTTP con ``ids`` o ``filtro``.
+
+        Returns:
+            Response: Una respuesta JSON que contiene:
+                - mensaje: Resumen de la operación
+                - eliminados / errores: Totales
+                - resultados: Reporte por usuario (id, estado o error)
+                - status: HTTP 200 OK, 207 MULTI STATUS o 400 BAD REQUEST
+        """
+        datos = request.data
+        try:
+            if isinstance(datos, dict) and 'ids' in datos:
+                resultados = eliminar_usuarios(leer_ids(datos['ids']))
+            elif isinstance(datos, dict) and 'filtro' in datos:
+                resultados = eliminar_usuarios_por_filtro(datos['filtro'])
+            else:
+                raise LoteInvalido("Se esperaba un objeto con ids o filtro")
+        except LoteInvalido as e:
+            return self._error_lote(e)
+
+        eliminados = sum(1 for r in resultados if r["estado"] == "eliminado")
+        errores = len(resultados) - eliminados
+        return Response({
+            "mensaje": f"Se eliminaron {eliminados} de {len(resultados)} usuarios",
+            "eliminados": eliminados,
+            "errores": errores,
+            "resultados": resultados
+        }, status=self._status(eliminados, errores))
+
 # clase para la vista del JWT personalizada
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
-    
+    # Buckets por IP y por email: se evalúan antes de validar (y hashear) la contraseña
+    throttle_classes = [LoginRateThrottle]
+
+    def throttled(self, request, wait):
+        raise Throttled(wait, detail="Demasiados intentos de inicio de sesión, intenta más tarde")
+
+    def post(self, request, *args, **kwargs):
+        # Las credenciales solo se validan si hay un lugar libre para hashear la contraseña
+        with turno_de_hasheo() as concedido:
+            if not concedido:
+                return Response(
+                    {"mensaje": "El servicio de inicio de sesión está saturado, intenta más tarde"},
+                    status=HTTPStatus.SERVICE_UNAVAILABLE,
+                    headers={'Retry-After': '1'},
+                )
+            return super().post(request, *args, **kwargs)
+
+
 class UserCSVExportView(View):
     """
     Vista para exportar usuarios a un archivo CSV.
     
     Esta vista maneja la generación y descarga de un archivo CSV con los datos de los usuarios.
+    También genera NDJSON y, con ``pyarrow`` instalado, Parquet y Arrow IPC con
+    columnas tipadas (ver ``users.utils.EXPORTADORES``).
     """
-    @swagger_auto_schema(
+    lecturas_en_replica = True  # Se lee de la réplica si hay una (ver ReplicaMiddleware)
+
+    @documentar(lambda: dict(
         operation_summary="Exportar usuarios a CSV",
-        operation_description="Descarga un archivo CSV con todos los usuarios",
+        operation_description=(
+            "Descarga un archivo con todos los usuarios. El formato se elige con 'format' "
+            "o con el header Accept (text/csv, application/x-ndjson, "
+            "application/vnd.apache.parquet, application/vnd.apache.arrow.file); por "
+            "defecto CSV"
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                'format',
+                openapi.IN_QUERY,
+                description="Formato del archivo: csv, ndjson, parquet o arrow (los dos últimos requieren pyarrow)",
+                type=openapi.TYPE_STRING,
+                enum=['csv', 'ndjson', 'parquet', 'arrow'],
+                required=False
+            ),
+            openapi.Parameter(
+                'stream',
+                openapi.IN_QUERY,
+                description="Si es 'true' el CSV se envía en streaming con memoria constante (los demás formatos siempre)",
+                type=openapi.TYPE_BOOLEAN,
+                required=False
+            ),
+            openapi.Parameter(
+                'fields',
+                openapi.IN_QUERY,
+                description="Columnas a exportar separadas por comas (id, email, first_name, last_name, phone, date_joined)",
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+            openapi.Parameter(
+                'since',
+                openapi.IN_QUERY,
+                description=(
+                    "Exporta solo los usuarios creados o modificados después de este cursor o "
+                    "fecha ISO 8601; el cursor siguiente va en el header X-Sync-Cursor"
+                ),
+                type=openapi.TYPE_STRING,
+                required=False
+            )
+        ],
         responses={
-            HTTPStatus.OK.value: "Archivo CSV generado exitosamente",
-            HTTPStatus.UNAUTHORIZED.value: "No autorizado"
+            HTTPStatus.OK.value: "Archivo generado exitosamente",
+            HTTPStatus.BAD_REQUEST.value: "Campos o formato inválidos",
+            HTTPStatus.UNAUTHORIZED.value: "No autorizado",
+            HTTPStatus.NOT_ACCEPTABLE.value: "El formato pedido no está disponible en el servidor"
         },
         tags=['Usuarios']
-    )
+    ))
     def get(self, request):
         """
-        Maneja la solicitud GET para generar y descargar el archivo CSV.
+        Maneja la solicitud GET para generar y descargar el archivo.
         
         Args:
             request: Objeto de solicitud HTTP.
         
+        Con ``?stream=true`` el archivo se genera por bloques desde la base de datos
+        para que exportaciones grandes no se carguen completas en memoria. Con
+        ``?fields=`` solo se consultan y exportan las columnas indicadas. Con
+        ``?since=`` solo se exportan los cambios posteriores al cursor y el cursor
+        siguiente se envía en el header ``X-Sync-Cursor``.
+
         Returns:
-            HttpResponse: Archivo CSV con la información de los usuarios.
+            HttpResponse: Archivo con la información de los usuarios.
         """
-        
-        users = User.objects.all()
-        return generar_users_csv(users)
\ No newline at end of file
+        # La base de datos se fija ahora: en streaming el archivo se genera cuando
+        # ReplicaMiddleware ya restableció el contexto. La sincronización incremental
+        # lee del primario (ver UserListView._sincronizar)
+        since = request.GET.get('since')
+        users = User.objects.using(DEFAULT_DB_ALIAS if since else alias_lectura())
+        cursor = None
+        try:
+            columnas = campos_solicitados(request.GET, CSV_COLUMNAS)
+            exportador = elegir_exportador(request)
+            if since:
+                users, cursor = cambios_para_exportar(users, since)
+        except FormatoNoDisponible as e:
+            return JsonResponse({"mensaje": str(e)}, status=HTTPStatus.NOT_ACCEPTABLE)
+        except (FiltroInvalido, FormatoInvalido, CursorInvalido) as e:
+            return JsonResponse({"mensaje": str(e)}, status=HTTPStatus.BAD_REQUEST)
+
+        if exportador is not ExportadorCSV or request.GET.get('stream', '').lower() in ('1', 'true'):
+            response = exportador(columnas).respuesta(users)
+        else:
+            response = generar_users_csv(users, columnas=columnas)
+        if cursor:
+            response['X-Sync-Cursor'] = cursor
+        # El contenido depende del header Accept
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+class UserCSVImportView(APIView):
+    """
+    Vista API para importar usuarios desde un archivo CSV.
+
+    Acepta el mismo formato que genera la exportación CSV, enviado como cuerpo
+    ``text/csv`` o como el campo ``file`` de un formulario multipart.
+    """
+    permission_classes = [IsAuthenticated]  # Requiere autenticación para acceder a los endpoints
+    parser_classes = [MultiPartParser]
+
+    @documentar(lambda: dict(
+        operation_summary="Importar usuarios desde CSV",
+        operation_description=(
+            "Crea usuarios a partir de un CSV con las columnas de la exportación "
+            "(email, first_name y last_name obligatorias; phone, date_joined y password "
+            "opcionales; id se ignora). Sin password el usuario queda con una contraseña "
+            "no utilizable. Las filas rechazadas se pueden descargar como CSV."
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                'dry_run',
+                openapi.IN_QUERY,
+                description="Si es 'true' se valida todo el archivo sin guardar usuarios",
+                type=openapi.TYPE_BOOLEAN,
+                required=False
+            )
+        ],
+        responses={
+            HTTPStatus.OK.value: "Validación sin guardar (dry_run)",
+            HTTPStatus.CREATED.value: "Todas las filas se importaron",
+            HTTPStatus.MULTI_STATUS.value: "Algunas filas fueron rechazadas",
+            HTTPStatus.BAD_REQUEST.value: (
+                "Archivo inválido o ninguna fila válida. Si el archivo resultó inválido a la "
+                "mitad, la respuesta incluye los totales de lo que ya se importó"
+            ),
+            HTTPStatus.UNAUTHORIZED.value: "No autorizado"
+        },
+        tags=['Usuarios']
+    ))
+    def post(self, request):
+        """
+        Importa usuarios desde un CSV leído como flujo.
+
+        Args:
+            request: Objeto de solicitud HTTP con el CSV.
+
+        Returns:
+            Response: Una respuesta JSON que contiene:
+                - mensaje: Resumen de la operación
+                - dry_run, filas, creados, errores: Totales
+                - reporte_errores: URL del CSV con las filas rechazadas (o null)
+                - status: HTTP 200 OK (dry_run), 201 CREATED, 207 MULTI STATUS o 400 BAD REQUEST
+                  (con los totales si el archivo falló después de guardar algunos bloques)
+        """
+        dry_run = request.query_params.get('dry_run', '').lower() in ('1', 'true')
+        if request.content_type.startswith('multipart/'):
+            archivo = request.FILES.get('file')
+            if archivo is None:
+                return Response({
+                    "mensaje": "Se esperaba el archivo en el campo 'file'"
+                }, status=HTTPStatus.BAD_REQUEST)
+            origen = archivo.file
+        else:
+            # El cuerpo se lee por bloques del flujo de la petición, sin request.body
+            origen = request.stream or io.BytesIO()
+
+        texto = abrir_texto(origen)
+        try:
+            resultado = importar_usuarios_csv(texto, dry_run=dry_run, usuario=request.user)
+        except ArchivoInvalido as e:
+            if e.resultado is None:
+                return Response({"mensaje": str(e)}, status=HTTPStatus.BAD_REQUEST)
+            # Inválido a la mitad: los bloques anteriores ya se guardaron
+            return Response(
+                self._cuerpo(request, str(e), dry_run, e.resultado), status=HTTPStatus.BAD_REQUEST
+            )
+        finally:
+            texto.detach()
+
+        if dry_run:
+            status = HTTPStatus.OK
+            mensaje = f"{resultado['creados']} de {resultado['filas']} filas son válidas (no se guardó nada)"
+        else:
+            if not resultado['errores']:
+                status = HTTPStatus.CREATED
+            elif resultado['creados']:
+                status = HTTPStatus.MULTI_STATUS
+            else:
+                status = HTTPStatus.BAD_REQUEST
+            mensaje = f"Se importaron {resultado['creados']} de {resultado['filas']} usuarios"
+        return Response(self._cuerpo(request, mensaje, dry_run, resultado), status=status)
+
+    def _cuerpo(self, request, mensaje, dry_run, resultado):
+        reporte = None
+        if resultado['reporte']:
+            reporte = request.build_absolute_uri(
+                reverse('user-import-csv-errores', kwargs={'token': resultado['reporte']})
+            )
+        return {
+            "mensaje": mensaje,
+            "dry_run": dry_run,
+            "filas": resultado['filas'],
+            "creados": resultado['creados'],
+            "errores": resultado['errores'],
+            "reporte_errores": reporte
+        }
+
+
+class UserCSVImportErrorsView(APIView):
+    """
+    Vista API para descargar el reporte de filas rechazadas de una importación.
+    """
+    permission_classes = [IsAuthenticated]  # Requiere autenticación para acceder a los endpoints
+
+    @documentar(lambda: dict(
+        operation_summary="Descargar errores de importación",
+        operation_description=(
+            "Descarga el CSV con las filas rechazadas y el motivo de cada una. Solo el "
+            "usuario que hizo la importación puede descargarlo."
+        ),
+        responses={
+            HTTPStatus.OK.value: "Reporte CSV",
+            HTTPStatus.NOT_FOUND.value: "El reporte no existe o ya venció",
+            HTTPStatus.UNAUTHORIZED.value: "No autorizado"
+        },
+        tags=['Usuarios']
+    ))
+    def get(self, request, token):
+        """
+        Devuelve el reporte de errores generado por ``UserCSVImportView``.
+        """
+        # Solo quien hizo la importación: el reporte de otro usuario no se encuentra
+        ruta = ruta_reporte(token, request.user)
+        try:
+            archivo = open(ruta, 'rb') if ruta else None
+        except FileNotFoundError:
+            archivo = None
+        if archivo is None:
+            return Response({
+                "mensaje": "El reporte no existe o ya venció"
+            }, status=HTTPStatus.NOT_FOUND)
+        return FileResponse(
+            archivo, as_attachment=True, filename='errores_importacion.csv', content_type='text/csv'
+        )
+
+
+class UserExportJobView(APIView):
+    """
+    Vista API para pedir una exportación CSV en segundo plano.
+    """
+    permission_classes = [IsAuthenticated]  # Requiere autenticación para acceder a los endpoints
+
+    @documentar(lambda: dict(
+        operation_summary="Solicitar exportación en segundo plano",
+        operation_description=(
+            "Registra una exportación CSV comprimida con gzip con los mismos parámetros "
+            "que la exportación directa (fields) y los filtros del listado. Si el usuario ya "
+            "tiene una exportación activa con los mismos parámetros se devuelve esa. Solo "
+            "quien pidió la exportación puede consultarla y descargarla."
+        ),
+        manual_parameters=[
+            openapi.Parameter('fields', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=False,
+                              description="Columnas a exportar separadas por comas"),
+            openapi.Parameter('email', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=False,
+                              description="Prefijo del email"),
+            openapi.Parameter('search', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=False,
+                              description="Texto en el nombre o los apellidos"),
+            openapi.Parameter('joined_after', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=False,
+                              description="Registrados desde esta fecha (ISO 8601)"),
+            openapi.Parameter('joined_before', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=False,
+                              description="Registrados hasta esta fecha (ISO 8601)"),
+            openapi.Parameter('is_active', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN, required=False,
+                              description="Filtrar por usuarios activos o inactivos"),
+        ],
+        responses={
+            HTTPStatus.ACCEPTED.value: ExportJobSerializer,
+            HTTPStatus.BAD_REQUEST.value: "Campos o filtros inválidos",
+            HTTPStatus.UNAUTHORIZED.value: "No autorizado"
+        },
+        tags=['Usuarios']
+    ))
+    def post(self, request):
+        """
+        Registra la exportación y devuelve su estado.
+
+        Args:
+            request: Objeto de solicitud HTTP; los parámetros van en la query.
+
+        Returns:
+            Response: El trabajo de exportación (HTTP 202 ACCEPTED) con el header
+                ``Location`` apuntando a su estado.
+        """
+        try:
+            params = parametros_exportacion(request.query_params)
+        except FiltroInvalido as e:
+            return Response({"mensaje": str(e)}, status=HTTPStatus.BAD_REQUEST)
+
+        job, creado = solicitar_exportacion(params, usuario=request.user)
+        data = ExportJobSerializer(job, context={'request': request}).data
+        data['compartido'] = not creado
+        return Response(data, status=HTTPStatus.ACCEPTED, headers={
+            'Location': request.build_absolute_uri(reverse('user-export-job', kwargs={'id': job.id}))
+        })
+
+
+class UserExportJobDetailView(APIView):
+    """
+    Vista API para consultar el avance de una exportación.
+    """
+    permission_classes = [IsAuthenticated]  # Requiere autenticación para acceder a los endpoints
+
+    @documentar(lambda: dict(
+        operation_summary="Estado de una exportación",
+        operation_description="Devuelve el estado, las filas exportadas y la URL de descarga cuando termina",
+        responses={
+            HTTPStatus.OK.value: ExportJobSerializer,
+            HTTPStatus.NOT_FOUND.value: "La exportación no existe o ya venció",
+            HTTPStatus.UNAUTHORIZED.value: "No autorizado"
+        },
+        tags=['Usuarios']
+    ))
+    def get(self, request, id):
+        """
+        Devuelve el estado de la exportación con el id indicado.
+        """
+        try:
+            # Los trabajos de otros usuarios se responden como inexistentes
+            job = ExportJob.objects.get(id=id, requested_by=request.user)
+        except ExportJob.DoesNotExist:
+            return Response({
+                "mensaje": "La exportación no existe o ya venció"
+            }, status=HTTPStatus.NOT_FOUND)
+        return Response(ExportJobSerializer(job, context={'request': request}).data, status=HTTPStatus.OK)
+
+
+class UserExportJobDownloadView(APIView):
+    """
+    Vista API para descargar el archivo de una exportación terminada.
+    """
+    permission_classes = [IsAuthenticated]  # Requiere autenticación para acceder a los endpoints
+
+    @documentar(lambda: dict(
+        operation_summary="Descargar una exportación",
+        operation_description=(
+            "Descarga el CSV comprimido con gzip. Admite el header Range (un solo rango "
+            "de bytes) e If-Range para reanudar descargas interrumpidas."
+        ),
+        responses={
+            HTTPStatus.OK.value: "Archivo users.csv.gz",
+            HTTPStatus.PARTIAL_CONTENT.value: "Parte del archivo indicada en Range",
+            HTTPStatus.CONFLICT.value: "La exportación todavía no termina o falló",
+            HTTPStatus.NOT_FOUND.value: "La exportación no existe",
+            HTTPStatus.GONE.value: "El archivo ya no está disponible",
+            HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE.value: "Rango fuera del archivo",
+            HTTPStatus.UNAUTHORIZED.value: "No autorizado"
+        },
+        tags=['Usuarios']
+    ))
+    def get(self, request, id):
+        """
+        Envía el archivo de la exportación, completo o el rango pedido.
+        """
+        try:
+            # Los trabajos de otros usuarios se responden como inexistentes
+            job = ExportJob.objects.get(id=id, requested_by=request.user)
+        except ExportJob.DoesNotExist:
+            return Response({
+                "mensaje": "La exportación no existe"
+            }, status=HTTPStatus.NOT_FOUND)
+        if job.status != ExportJob.DONE:
+            return Response({
+                "mensaje": f"La exportación no está lista (estado: {job.status})"
+            }, status=HTTPStatus.CONFLICT)
+        try:
+            return respuesta_archivo(
+                request, job.file_path, 'application/gzip', 'users.csv.gz', f'"{job.id.hex}-{job.size}"'
+            )
+        except FileNotFoundError:
+            return Response({
+                "mensaje": "El archivo de la exportación ya no está disponible"
+            }, status=HTTPStatus.GONE)
+